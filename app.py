@@ -0,0 +1,43 @@
+"""ASGI entry point: `gunicorn --config gunicorn.conf.py app:app`, or `python app.py`.
+
+The system is written as notebook cells that share one namespace. This
+module runs the definitions of the cells the service needs (imports,
+functions, classes and upper-case or underscore module constants) and
+skips their demo sections, then serves the catalog snapshot. Set
+REDIS_URL to share cached rankings and cursor snapshots between workers.
+"""
+import ast
+import os
+
+SERVICE_CELLS = ('script_1.py', 'script_2.py', 'script_3.py', 'script_4.py', 'script_6.py', 'script_10.py')
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def _is_definition(node: ast.stmt) -> bool:
+    if isinstance(node, (ast.Import, ast.ImportFrom, ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef, ast.Try)):
+        return True  # Try blocks at cell level are optional-import guards
+    if isinstance(node, (ast.Assign, ast.AnnAssign)):
+        targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+        return all(isinstance(target, ast.Name) and (target.id.isupper() or target.id.startswith('_')) for target in targets)
+    return False
+
+def load_service_namespace(cells=SERVICE_CELLS) -> dict:
+    """Namespace holding the definitions of `cells`, run in order"""
+    namespace = {'__name__': 'skinseoul_service'}
+    for cell in cells:
+        path = os.path.join(BASE_DIR, cell)
+        with open(path) as f:
+            tree = ast.parse(f.read(), path)
+        tree.body = [node for node in tree.body if _is_definition(node)]
+        exec(compile(tree, path, 'exec'), namespace)
+    return namespace
+
+service = load_service_namespace()
+service['products'] = service['load_catalog']()  # Default catalog of MerchandisingAPI
+
+redis_url = os.environ.get('REDIS_URL')
+cache = service['TieredCache'](shared=service['connect_shared_cache'](redis_url)) if redis_url else None
+api = service['MerchandisingAPI'](cache=cache)
+app = service['create_app'](api)
+
+if __name__ == '__main__':
+    service['serve'](api, port=int(os.environ.get('API_PORT', 8000)))
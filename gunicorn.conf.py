@@ -0,0 +1,20 @@
+import os
+import shutil
+
+from prometheus_client import multiprocess
+
+# The service is an ASGI app (app.py); run it on uvicorn workers
+worker_class = 'uvicorn.workers.UvicornWorker'
+
+def on_starting(server):
+    # Start every deployment with an empty metrics directory; without one, each worker reports its own metrics
+    multiproc_dir = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if not multiproc_dir:
+        return
+    shutil.rmtree(multiproc_dir, ignore_errors=True)
+    os.makedirs(multiproc_dir)
+
+def child_exit(server, worker):
+    # Drop live gauges of workers that exited
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        multiprocess.mark_process_dead(worker.pid)
@@ -11,49 +11,34 @@ import os
 if not os.path.exists('visualizations'):
     os.makedirs('visualizations')
 
-# Load and process the dataset
-df = pd.read_excel('Mock_Skincare_Dataset.xlsx')
-
-# Calculate key metrics for visualization
-df['Profit Margin'] = ((df['Price (USD)'] - df['COGS (USD)']) / df['Price (USD)']) * 100
-df['Conversion Rate'] = (df['Volume Sold Last Month'] / df['Views Last Month']) * 100
-df['Revenue'] = df['Price (USD)'] * df['Volume Sold Last Month']
+# Load the dataset from the memory-mapped catalog snapshot (derived metrics are precomputed)
+catalog = load_catalog()
 
 # Create a MerchandisingEngine instance to get scores
 engine = MerchandisingEngine(TOUCHPOINT_CONFIGS[TouchpointType.HOMEPAGE_CAROUSEL])
 
-# Calculate scores for all products
-product_scores = []
-for _, row in df.iterrows():
-    product = Product(row)
-    score = engine.calculate_composite_score(product)
-    
-    # Calculate individual component scores
-    sales_velocity_score = engine.calculate_sales_velocity_score(product)
-    profit_margin_score = engine.calculate_profit_margin_score(product)
-    inventory_health_score = engine.calculate_inventory_health_score(product)
-    brand_tier_score = engine.calculate_brand_tier_score(product)
-    engagement_score = engine.calculate_engagement_score(product)
-    
-    product_scores.append({
-        'Product Name': product.name,
-        'Brand': product.brand,
-        'Brand Tier': product.brand_tier,
-        'Price': product.price,
-        'Profit Margin': product.profit_margin,
-        'Days Inventory': product.days_inventory,
-        'Units Stock': product.units_stock,
-        'Views': product.views_last_month,
-        'Volume Sold': product.volume_sold_last_month,
-        'Composite Score': score,
-        'Sales Velocity Score': sales_velocity_score,
-        'Profit Margin Score': profit_margin_score,
-        'Inventory Health Score': inventory_health_score,
-        'Brand Tier Score': brand_tier_score,
-        'Engagement Score': engagement_score
-    })
-
-scores_df = pd.DataFrame(product_scores)
+# Calculate composite and individual component scores for all products at once
+columns = catalog.columns()
+component_scores = engine.calculate_component_scores_batch(columns)
+composite_scores = engine.calculate_composite_scores_batch(columns, component_scores)
+
+scores_df = pd.DataFrame({
+    'Product Name': columns['name'],
+    'Brand': columns['brand'],
+    'Brand Tier': columns['brand_tier'],
+    'Price': catalog.price,
+    'Profit Margin': catalog.profit_margin,
+    'Days Inventory': catalog.days_inventory,
+    'Units Stock': catalog.units_stock,
+    'Views': catalog.views_last_month,
+    'Volume Sold': catalog.volume_sold_last_month,
+    'Composite Score': composite_scores,
+    'Sales Velocity Score': component_scores['sales_velocity'],
+    'Profit Margin Score': component_scores['profit_margin'],
+    'Inventory Health Score': component_scores['inventory_health'],
+    'Brand Tier Score': component_scores['brand_tier'],
+    'Engagement Score': component_scores['engagement_score']
+})
 
 # Apply the same filters as the engine
 filtered_df = scores_df.copy()
@@ -78,6 +63,9 @@ top_products.to_csv('visualizations/top_merchandised_products.csv', index=False)
 # Export the data for charts later
 filtered_df.to_csv('visualizations/all_scored_products.csv', index=False)
 
+# Typed columnar export of the full scored catalog (every product, every touchpoint)
+export_manager.export_scored_catalog('visualizations/scored_catalog')
+
 # Create visualization 1: Brand Tier Distribution in Top Products
 plt.figure(figsize=(10, 6))
 tier_counts = top_products['Brand Tier'].value_counts().sort_index()
@@ -162,10 +150,11 @@ print("   4. Price vs. Merchandising Score by Brand Tier (price_vs_score.png)")
 print("\n✅ Data Files Created:")
 print("   1. Top Merchandised Products (top_merchandised_products.csv)")
 print("   2. All Scored Products (all_scored_products.csv)")
+print("   3. Scored Catalog, columnar (scored_catalog/, read with open_scored_catalog)")
 
 # Create final results summary
 print("\n🔍 Final Analysis Summary:")
-print(f"   Total products analyzed: {len(df)}")
+print(f"   Total products analyzed: {len(catalog)}")
 print(f"   Products qualifying for homepage carousel: {len(filtered_df)}")
 print(f"   Average merchandising score: {filtered_df['Composite Score'].mean():.2f}")
 print(f"   Top brand in results: {top_products['Brand'].value_counts().index[0]}")
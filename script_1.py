@@ -1,6 +1,20 @@
 # Create the main merchandising system architecture
 
 # 1. Data Models and Core Classes
+import csv
+import fcntl
+import itertools
+import json
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from typing import Dict, Iterator, List, Optional, Tuple
+
 class Product:
     def __init__(self, product_data):
         self.name = product_data['Product Name']
@@ -18,7 +32,7 @@ class Product:
         self.conversion_rate = (self.volume_sold_last_month / self.views_last_month * 100) if self.views_last_month > 0 else 0
         self.revenue_last_month = self.volume_sold_last_month * self.price
         self.sell_through_rate = (self.volume_sold_last_month / (self.units_stock + self.volume_sold_last_month) * 100) if (self.units_stock + self.volume_sold_last_month) > 0 else 0
-        
+    
     def to_dict(self):
         return {
             'name': self.name,
@@ -36,16 +50,730 @@ class Product:
             'volume_sold_last_month': self.volume_sold_last_month
         }
 
-# Initialize products from dataset
-products = []
-for _, row in df.iterrows():
-    products.append(Product(row))
+def products_to_columns(products) -> dict:
+    """Convert a list of Product objects into per-attribute NumPy columns"""
+    if isinstance(products, ProductCatalog):
+        return products.columns()
+    
+    return {
+        'name': np.array([p.name for p in products], dtype=object),
+        'brand': np.array([p.brand for p in products], dtype=object),
+        'brand_tier': np.array([p.brand_tier for p in products], dtype=object),
+        'price': np.array([p.price for p in products], dtype=np.float64),
+        'cogs': np.array([p.cogs for p in products], dtype=np.float64),
+        'days_inventory': np.array([p.days_inventory for p in products], dtype=np.int64),
+        'units_stock': np.array([p.units_stock for p in products], dtype=np.int64),
+        'views_last_month': np.array([p.views_last_month for p in products], dtype=np.int64),
+        'volume_sold_last_month': np.array([p.volume_sold_last_month for p in products], dtype=np.int64),
+        'profit_margin': np.array([p.profit_margin for p in products], dtype=np.float64),
+        'conversion_rate': np.array([p.conversion_rate for p in products], dtype=np.float64),
+        'revenue_last_month': np.array([p.revenue_last_month for p in products], dtype=np.float64),
+        'sell_through_rate': np.array([p.sell_through_rate for p in products], dtype=np.float64)
+    }
+
+def _column_property(column: str, cast):
+    return property(lambda self: cast(getattr(self._catalog, column)[self._row]))
+
+class ProductView:
+    """Read-only Product-like view onto one row of a ProductCatalog"""
+    __slots__ = ('_catalog', '_row')
+    
+    def __init__(self, catalog: 'ProductCatalog', row: int):
+        self._catalog = catalog
+        self._row = row
+    
+    name = _column_property('names', str)
+    price = _column_property('price', float)
+    cogs = _column_property('cogs', float)
+    days_inventory = _column_property('days_inventory', int)
+    units_stock = _column_property('units_stock', int)
+    views_last_month = _column_property('views_last_month', int)
+    volume_sold_last_month = _column_property('volume_sold_last_month', int)
+    profit_margin = _column_property('profit_margin', float)
+    conversion_rate = _column_property('conversion_rate', float)
+    revenue_last_month = _column_property('revenue_last_month', float)
+    sell_through_rate = _column_property('sell_through_rate', float)
+    
+    @property
+    def row(self) -> int:
+        return self._row
+    
+    @property
+    def brand(self) -> str:
+        return self._catalog.brand_categories[self._catalog.brand_codes[self._row]]
+    
+    @property
+    def brand_tier(self) -> str:
+        return self._catalog.brand_tier_categories[self._catalog.brand_tier_codes[self._row]]
+    
+    to_dict = Product.to_dict
+    
+    def __repr__(self):
+        return f"ProductView(row={self._row}, name={self.name!r})"
+
+class FilterIndex:
+    """Sorted indexes over the FilterCriteria threshold columns of a catalog.
+    
+    Each indexed column keeps its values in sorted order together with the
+    matching rows, so a threshold resolves to a contiguous range by binary
+    search. A FilterCriteria is resolved by taking the narrowest range and
+    probing the remaining thresholds only on those rows. Indexes are kept
+    sorted in place as rows are updated.
+    """
+    COLUMNS = ('units_stock', 'days_inventory', 'profit_margin', 'views_last_month')
+    
+    def __init__(self, catalog: 'ProductCatalog'):
+        self.catalog = catalog
+        self.order = {}
+        self.sorted_values = {}
+        for column in self.COLUMNS:
+            values = getattr(catalog, column)
+            self.order[column] = np.argsort(values, kind='stable')
+            self.sorted_values[column] = values[self.order[column]]
+    
+    def range_bounds(self, column: str, lower=None, upper=None) -> Tuple[int, int]:
+        """Start/stop positions in the sorted index for lower <= value <= upper"""
+        values = self.sorted_values[column]
+        start = 0 if lower is None else int(np.searchsorted(values, lower, 'left'))
+        stop = len(values) if upper is None else int(np.searchsorted(values, upper, 'right'))
+        return start, max(start, stop)
+    
+    def candidates(self, criteria: 'FilterCriteria') -> np.ndarray:
+        """Boolean mask of rows satisfying the numeric thresholds of `criteria`"""
+        ranges = [
+            ('days_inventory', None, criteria.max_days_inventory),
+            ('profit_margin', criteria.min_profit_margin, None),
+            ('views_last_month', criteria.min_views_threshold, None)
+        ]
+        if criteria.exclude_out_of_stock:
+            ranges.append(('units_stock', criteria.min_stock_units, None))
+        
+        bounds = [self.range_bounds(column, lower, upper) for column, lower, upper in ranges]
+        narrowest = min(range(len(ranges)), key=lambda i: bounds[i][1] - bounds[i][0])
+        start, stop = bounds[narrowest]
+        rows = self.order[ranges[narrowest][0]][start:stop]
+        
+        for i, (column, lower, upper) in enumerate(ranges):
+            if i == narrowest:
+                continue
+            values = getattr(self.catalog, column)[rows]
+            if lower is not None:
+                rows = rows[values >= lower]
+            else:
+                rows = rows[values <= upper]
+        
+        mask = np.zeros(len(self.catalog), dtype=bool)
+        mask[rows] = True
+        return mask
+    
+    def update(self, column: str, row: int, old_value, new_value):
+        """Move `row` to its new sorted position after its value changed"""
+        values = self.sorted_values[column]
+        order = self.order[column]
+        
+        lo, hi = np.searchsorted(values, old_value, 'left'), np.searchsorted(values, old_value, 'right')
+        position = int(lo + np.flatnonzero(order[lo:hi] == row)[0])
+        
+        if new_value >= old_value:
+            # Shift the rows in between one slot left and insert after them
+            target = int(np.searchsorted(values, new_value, 'right')) - 1
+            values[position:target] = values[position + 1:target + 1]
+            order[position:target] = order[position + 1:target + 1]
+        else:
+            # Shift the rows in between one slot right and insert before them
+            target = int(np.searchsorted(values, new_value, 'left'))
+            values[target + 1:position + 1] = values[target:position]
+            order[target + 1:position + 1] = order[target:position]
+        
+        values[target] = new_value
+        order[target] = row
+
+class ProductCatalog:
+    """Struct-of-arrays product store.
+    
+    Each field is one typed contiguous array, brand and brand tier are stored
+    as categorical codes, and the derived metrics are computed column-wise
+    once. Iterating or indexing yields ProductView rows, so code written
+    against a list of Product objects keeps working unchanged.
+    """
+    
+    def __init__(self, names, brands, brand_tiers, price, cogs, days_inventory,
+                 units_stock, views_last_month, volume_sold_last_month):
+        self._names = np.asarray(names, dtype=object)
+        self._encoded_names = None
+        self.brand_categories, self.brand_codes = self._encode_categories(brands)
+        self.brand_tier_categories, self.brand_tier_codes = self._encode_categories(brand_tiers)
+        self.price = np.asarray(price, dtype=np.float64)
+        self.cogs = np.asarray(cogs, dtype=np.float64)
+        self.days_inventory = np.asarray(days_inventory, dtype=np.int64)
+        self.units_stock = np.asarray(units_stock, dtype=np.int64)
+        self.views_last_month = np.asarray(views_last_month, dtype=np.int64)
+        self.volume_sold_last_month = np.asarray(volume_sold_last_month, dtype=np.int64)
+        
+        self._compute_derived_metrics()
+        self._name_index = None
+        self._filter_index = None
+    
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame) -> 'ProductCatalog':
+        """Build a catalog from the product sheet without per-row iteration"""
+        return cls(
+            names=df['Product Name'].to_numpy(dtype=object, copy=True),
+            brands=df['Brand'].to_numpy(dtype=object, copy=True),
+            brand_tiers=df['Brand Tier'].to_numpy(dtype=object, copy=True),
+            price=df['Price (USD)'].to_numpy(dtype=np.float64, copy=True),
+            cogs=df['COGS (USD)'].to_numpy(dtype=np.float64, copy=True),
+            days_inventory=df['Days of Inventory'].to_numpy().astype(np.int64),
+            units_stock=df['Units in Stock'].to_numpy().astype(np.int64),
+            views_last_month=df['Views Last Month'].to_numpy().astype(np.int64),
+            volume_sold_last_month=df['Volume Sold Last Month'].to_numpy().astype(np.int64)
+        )
+    
+    @classmethod
+    def from_products(cls, products: List[Product]) -> 'ProductCatalog':
+        """Build a catalog from existing Product objects"""
+        columns = products_to_columns(products)
+        return cls(
+            names=columns['name'],
+            brands=columns['brand'],
+            brand_tiers=columns['brand_tier'],
+            price=columns['price'],
+            cogs=columns['cogs'],
+            days_inventory=columns['days_inventory'],
+            units_stock=columns['units_stock'],
+            views_last_month=columns['views_last_month'],
+            volume_sold_last_month=columns['volume_sold_last_month']
+        )
+    
+    # Columns persisted in catalog snapshots, with their on-disk dtypes
+    STORED_COLUMNS = {
+        'brand_codes': '<i4',
+        'brand_tier_codes': '<i4',
+        'price': '<f8',
+        'cogs': '<f8',
+        'days_inventory': '<i8',
+        'units_stock': '<i8',
+        'views_last_month': '<i8',
+        'volume_sold_last_month': '<i8',
+        'profit_margin': '<f8',
+        'conversion_rate': '<f8',
+        'revenue_last_month': '<f8',
+        'sell_through_rate': '<f8'
+    }
+    
+    @classmethod
+    def open_snapshot(cls, snapshot_dir: str, mode: str = 'c') -> 'ProductCatalog':
+        """Open a catalog snapshot with every column memory-mapped.
+        
+        Nothing is parsed or recomputed; only product names are decoded to
+        build the name index. The default copy-on-write mode shares pages
+        with other processes until a row is updated. Every file comes from
+        one published version; if that version is pruned by later publishes
+        before it is mapped, the current one is opened instead.
+        """
+        for attempt in range(3):
+            version_dir = resolve_snapshot_dir(snapshot_dir)
+            if version_dir is None:
+                raise FileNotFoundError(f'No catalog snapshot published in {snapshot_dir}')
+            try:
+                return cls._open_version(version_dir, mode)
+            except FileNotFoundError:
+                if version_dir == snapshot_dir or attempt == 2:
+                    raise
+    
+    @classmethod
+    def _open_version(cls, snapshot_dir: str, mode: str) -> 'ProductCatalog':
+        with open(os.path.join(snapshot_dir, 'manifest.json')) as f:
+            manifest = json.load(f)
+        rows = manifest['rows']
+        
+        def map_column(file_name, dtype, length):
+            if length == 0:
+                return np.empty(0, dtype=dtype)
+            return np.memmap(os.path.join(snapshot_dir, file_name), dtype=dtype, mode=mode, shape=(length,))
+        
+        catalog = cls.__new__(cls)
+        for column, spec in manifest['columns'].items():
+            setattr(catalog, column, map_column(spec['file'], spec['dtype'], rows))
+        catalog.brand_categories = np.array(manifest['categories']['brand'], dtype=object)
+        catalog.brand_tier_categories = np.array(manifest['categories']['brand_tier'], dtype=object)
+        
+        # Names stay encoded until something needs them
+        offsets = map_column(manifest['names']['offsets'], '<i8', rows + 1) if rows else np.zeros(1, dtype=np.int64)
+        catalog._names = None
+        catalog._encoded_names = (map_column(manifest['names']['data'], np.uint8, int(offsets[-1])), offsets)
+        
+        catalog._name_index = None
+        catalog._filter_index = None
+        return catalog
+    
+    def save_snapshot(self, snapshot_dir: str):
+        """Write the catalog as a columnar snapshot (see CatalogSnapshotWriter)"""
+        with CatalogSnapshotWriter(snapshot_dir) as writer:
+            writer.append(self)
+    
+    @staticmethod
+    def _encode_categories(values):
+        categories, codes = np.unique(np.asarray(values, dtype=str), return_inverse=True)
+        return categories.astype(object), codes.astype(np.int32)
+    
+    def _compute_derived_metrics(self, rows=slice(None)):
+        """Column-wise equivalent of the calculated metrics in Product.__init__"""
+        price = self.price[rows]
+        views = self.views_last_month[rows]
+        volume = self.volume_sold_last_month[rows]
+        stock_plus_sold = self.units_stock[rows] + volume
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            derived = {
+                'profit_margin': np.where(price > 0, ((price - self.cogs[rows]) / price) * 100, 0.0),
+                'conversion_rate': np.where(views > 0, volume / views * 100, 0.0),
+                'revenue_last_month': volume * price,
+                'sell_through_rate': np.where(stock_plus_sold > 0, volume / stock_plus_sold * 100, 0.0)
+            }
+        
+        for column, values in derived.items():
+            if isinstance(rows, slice):
+                setattr(self, column, values)
+            else:
+                getattr(self, column)[rows] = values
+    
+    UPDATABLE_COLUMNS = {
+        'price': float,
+        'cogs': float,
+        'days_inventory': int,
+        'units_stock': int,
+        'views_last_month': int,
+        'volume_sold_last_month': int
+    }
+    
+    def update_product(self, row: int, **changes):
+        """Update raw metrics of one row in place and recompute its derived metrics"""
+        for column in changes:
+            if column not in self.UPDATABLE_COLUMNS:
+                raise ValueError(f"Cannot update catalog column '{column}'")
+        
+        indexed_before = {column: getattr(self, column)[row] for column in FilterIndex.COLUMNS}
+        
+        for column, value in changes.items():
+            getattr(self, column)[row] = self.UPDATABLE_COLUMNS[column](value)
+        self._compute_derived_metrics(np.array([row]))
+        
+        # Keep the filter indexes sorted
+        if self._filter_index is not None:
+            for column, old_value in indexed_before.items():
+                new_value = getattr(self, column)[row]
+                if new_value != old_value:
+                    self._filter_index.update(column, row, old_value, new_value)
+    
+    @property
+    def filter_index(self) -> FilterIndex:
+        """Sorted filter-column indexes, built on first use"""
+        if self._filter_index is None:
+            self._filter_index = FilterIndex(self)
+        return self._filter_index
+    
+    @property
+    def names(self) -> np.ndarray:
+        """Product names as an object array (decoded from the snapshot on first use)"""
+        if self._names is None:
+            name_bytes, offsets = self._encoded_names
+            name_bytes = name_bytes.tobytes()
+            self._names = np.array(
+                [name_bytes[start:stop].decode('utf-8') for start, stop in zip(offsets[:-1].tolist(), offsets[1:].tolist())],
+                dtype=object
+            )
+        return self._names
+    
+    @property
+    def name_index(self) -> Dict[str, int]:
+        """Product name -> first row, built on first use"""
+        if self._name_index is None:
+            self._build_name_index()
+        return self._name_index
+    
+    def _build_name_index(self):
+        """Map product name -> first row; duplicated names also keep all their rows"""
+        names = pd.Series(self.names)
+        first_rows = ~names.duplicated(keep='first').to_numpy()
+        self._name_index = dict(zip(self.names[first_rows], np.flatnonzero(first_rows).tolist()))
+        
+        duplicated = names.duplicated(keep=False).to_numpy()
+        self._duplicate_rows: Dict[str, List[int]] = {}
+        for row in np.flatnonzero(duplicated).tolist():
+            self._duplicate_rows.setdefault(self.names[row], []).append(row)
+    
+    def rows_for_name(self, name: str) -> List[int]:
+        """All rows carrying a product name (names are not unique in the feed)"""
+        row = self.name_index.get(name)
+        if name in self._duplicate_rows:
+            return self._duplicate_rows[name]
+        return [] if row is None else [row]
+    
+    def get(self, name: str) -> 'ProductView':
+        """Row view for a product name, or None if it is not in the catalog"""
+        row = self.name_index.get(name)
+        return None if row is None else ProductView(self, row)
+    
+    def columns(self, rows: Optional[np.ndarray] = None, include_text: bool = True) -> Dict[str, np.ndarray]:
+        """Columns keyed by Product attribute name, as used by batch scoring.
+        
+        If `rows` is given, only those rows are returned (in that order).
+        `include_text=False` leaves out name, brand and brand tier strings,
+        which numeric scoring does not need.
+        """
+        take = (lambda column: column) if rows is None else (lambda column: column[rows])
+        brand_tier_codes = take(self.brand_tier_codes)
+        columns = {
+            'brand_tier_categories': self.brand_tier_categories,
+            'brand_tier_codes': brand_tier_codes,
+            'price': take(self.price),
+            'cogs': take(self.cogs),
+            'days_inventory': take(self.days_inventory),
+            'units_stock': take(self.units_stock),
+            'views_last_month': take(self.views_last_month),
+            'volume_sold_last_month': take(self.volume_sold_last_month),
+            'profit_margin': take(self.profit_margin),
+            'conversion_rate': take(self.conversion_rate),
+            'revenue_last_month': take(self.revenue_last_month),
+            'sell_through_rate': take(self.sell_through_rate)
+        }
+        if include_text:
+            columns.update({
+                'name': take(self.names),
+                'brand': self.brand_categories[take(self.brand_codes)],
+                'brand_tier': self.brand_tier_categories[brand_tier_codes]
+            })
+        return columns
+    
+    def row_fingerprints(self, rows=slice(None)) -> np.ndarray:
+        """64-bit content hash of each row's stored columns (names excluded).
+        
+        Built only from column bit patterns, so it is the same in every
+        process and for a snapshot of the same data.
+        """
+        fingerprints = np.full(len(self.price[rows]), 0xcbf29ce484222325, dtype=np.uint64)
+        for column in self.STORED_COLUMNS:
+            values = np.ascontiguousarray(getattr(self, column)[rows])
+            bits = values.view(np.uint64) if values.dtype.itemsize == 8 else values.astype(np.int64).view(np.uint64)
+            fingerprints = (fingerprints ^ bits) * np.uint64(0x100000001b3)
+        
+        # Final avalanche so similar rows get unrelated fingerprints
+        fingerprints ^= fingerprints >> np.uint64(33)
+        fingerprints *= np.uint64(0xff51afd7ed558ccd)
+        fingerprints ^= fingerprints >> np.uint64(33)
+        return fingerprints
+    
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory held by the catalog columns"""
+        numeric = sum(
+            getattr(self, column).nbytes for column in (
+                'brand_codes', 'brand_tier_codes', 'price', 'cogs', 'days_inventory', 'units_stock',
+                'views_last_month', 'volume_sold_last_month', 'profit_margin', 'conversion_rate',
+                'revenue_last_month', 'sell_through_rate'
+            )
+        )
+        return numeric + self.names.nbytes + sum(map(len, self.names))
+    
+    def __len__(self) -> int:
+        return len(self.price)
+    
+    def __iter__(self) -> Iterator[ProductView]:
+        for row in range(len(self)):
+            yield ProductView(self, row)
+    
+    def __getitem__(self, row: int) -> ProductView:
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError('catalog row out of range')
+        return ProductView(self, row)
+
+SNAPSHOT_POINTER = 'CURRENT'  # File naming the published version directory of a snapshot
+
+def resolve_snapshot_dir(snapshot_dir: str) -> Optional[str]:
+    """Directory of the published version of a snapshot, or None if there is none.
+    Snapshots written before versioning (manifest.json at the top) are still read."""
+    try:
+        with open(os.path.join(snapshot_dir, SNAPSHOT_POINTER)) as f:
+            return os.path.join(snapshot_dir, f.read().strip())
+    except FileNotFoundError:
+        pass
+    return snapshot_dir if os.path.exists(os.path.join(snapshot_dir, 'manifest.json')) else None
+
+class CatalogSnapshotWriter:
+    """Write ProductCatalog chunks into a columnar snapshot directory.
+    
+    Layout: one raw little-endian file per column in STORED_COLUMNS, product
+    names as a UTF-8 blob plus int64 offsets, and manifest.json with row count,
+    dtypes and the brand / brand tier categories. Brand codes are remapped to
+    snapshot-wide categories as chunks arrive. Every write goes into a new
+    version directory, published on close by atomically replacing the
+    CURRENT pointer file, so readers see one complete version or the other.
+    An aborted write removes its version directory. Publishing holds an
+    exclusive lock on the snapshot directory, so overlapping writers
+    publish one at a time and the last to close wins; each publish keeps
+    its own and the previously current version and removes the other
+    published ones. Processes that still map a removed version keep their
+    pages, since unlinked files stay mapped.
+    """
+    
+    def __init__(self, snapshot_dir: str):
+        self.snapshot_dir = snapshot_dir
+        self.version = f'v{datetime.now():%Y%m%dT%H%M%S%f}-{uuid.uuid4().hex[:8]}'
+        self.version_dir = os.path.join(snapshot_dir, self.version)
+        os.makedirs(self.version_dir)
+        
+        self.rows = 0
+        self.categories = {'brand': {}, 'brand_tier': {}}  # category -> snapshot-wide code
+        self._name_bytes = 0
+        self._files = {}
+        try:
+            for file_name in [f'{column}.bin' for column in ProductCatalog.STORED_COLUMNS] + ['names.utf8', 'names.offsets.bin']:
+                self._files[file_name] = open(os.path.join(self.version_dir, file_name), 'wb')
+            self._files['names.offsets.bin'].write(np.zeros(1, dtype='<i8').tobytes())
+        except BaseException:
+            self.discard()
+            raise
+    
+    def _remap_codes(self, kind: str, categories: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        snapshot_codes = self.categories[kind]
+        lookup = np.array(
+            [snapshot_codes.setdefault(category, len(snapshot_codes)) for category in categories],
+            dtype=np.int32
+        )
+        return lookup[codes] if len(codes) else codes
+    
+    def append(self, catalog: ProductCatalog):
+        """Append every row of `catalog` to the snapshot"""
+        remapped = {
+            'brand_codes': self._remap_codes('brand', catalog.brand_categories, catalog.brand_codes),
+            'brand_tier_codes': self._remap_codes('brand_tier', catalog.brand_tier_categories, catalog.brand_tier_codes)
+        }
+        for column, dtype in ProductCatalog.STORED_COLUMNS.items():
+            values = remapped[column] if column in remapped else getattr(catalog, column)
+            self._files[f'{column}.bin'].write(np.ascontiguousarray(values, dtype=dtype).tobytes())
+        
+        encoded_names = [name.encode('utf-8') for name in catalog.names]
+        offsets = self._name_bytes + np.cumsum([len(name) for name in encoded_names], dtype=np.int64)
+        self._files['names.utf8'].write(b''.join(encoded_names))
+        self._files['names.offsets.bin'].write(offsets.astype('<i8').tobytes())
+        
+        self._name_bytes = int(offsets[-1]) if len(offsets) else self._name_bytes
+        self.rows += len(catalog)
+    
+    def close(self):
+        """Write the manifest and publish this version"""
+        for f in self._files.values():
+            f.close()
+        
+        manifest = {
+            'format_version': 1,
+            'rows': self.rows,
+            'created_at': datetime.now().isoformat(),
+            'columns': {
+                column: {'file': f'{column}.bin', 'dtype': dtype}
+                for column, dtype in ProductCatalog.STORED_COLUMNS.items()
+            },
+            'categories': {kind: list(codes) for kind, codes in self.categories.items()},
+            'names': {'data': 'names.utf8', 'offsets': 'names.offsets.bin'}
+        }
+        # The manifest marks a version complete, so it is only written under the
+        # publish lock: another writer never prunes a finished but unpublished version
+        with open(os.path.join(self.snapshot_dir, '.publish.lock'), 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            with open(os.path.join(self.version_dir, 'manifest.json'), 'w') as f:
+                json.dump(manifest, f, indent=2)
+            
+            previous = resolve_snapshot_dir(self.snapshot_dir)
+            pointer_temp = os.path.join(self.snapshot_dir, f'{SNAPSHOT_POINTER}.{self.version}.tmp')
+            with open(pointer_temp, 'w') as f:
+                f.write(self.version)
+            os.replace(pointer_temp, os.path.join(self.snapshot_dir, SNAPSHOT_POINTER))
+            
+            keep = {self.version, os.path.basename(previous) if previous not in (None, self.snapshot_dir) else None}
+            self._remove_versions(keep)
+    
+    def _remove_versions(self, keep: set):
+        """Delete published versions not in `keep`; unfinished writes have no manifest yet.
+        The caller holds the publish lock."""
+        for entry in os.scandir(self.snapshot_dir):
+            if (entry.is_dir() and entry.name.startswith('v') and entry.name not in keep
+                    and os.path.exists(os.path.join(entry.path, 'manifest.json'))):
+                shutil.rmtree(entry.path, ignore_errors=True)
+    
+    def discard(self):
+        """Abandon the write and remove its version directory"""
+        for f in self._files.values():
+            f.close()
+        shutil.rmtree(self.version_dir, ignore_errors=True)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+CATALOG_SNAPSHOT_DIR = 'data/catalog_snapshot'
+
+FEED_TEXT_COLUMNS = ('Product Name', 'Brand', 'Brand Tier')
+FEED_NUMERIC_COLUMNS = {
+    'Price (USD)': float,
+    'COGS (USD)': float,
+    'Days of Inventory': int,
+    'Units in Stock': int,
+    'Views Last Month': int,
+    'Volume Sold Last Month': int
+}
+
+def _parse_numeric(values) -> np.ndarray:
+    """Parse a column of numeric strings; unparseable entries become NaN"""
+    try:
+        return np.array(values, dtype=np.float64)
+    except ValueError:
+        return pd.to_numeric(pd.Series(values, dtype=object), errors='coerce').to_numpy(dtype=np.float64)
+
+def _validate_feed_chunk(rows: List[List[str]], header: List[str]) -> Tuple[Dict[str, np.ndarray], np.ndarray]:
+    """Convert one chunk of raw feed rows; returns typed columns and a per-row reject reason (None if valid)"""
+    reasons = np.full(len(rows), None, dtype=object)
+    
+    # Rows with the wrong number of fields are padded so the chunk stays rectangular
+    padded = []
+    for i, fields in enumerate(rows):
+        if len(fields) != len(header):
+            reasons[i] = f'expected {len(header)} fields, got {len(fields)}'
+            fields = (fields + [''] * len(header))[:len(header)]
+        padded.append(fields)
+    raw = dict(zip(header, zip(*padded)))
+    
+    def reject(invalid, reason):
+        reasons[invalid & (reasons == None)] = reason  # noqa: E711
+    
+    chunk = {}
+    for column in FEED_TEXT_COLUMNS:
+        chunk[column] = np.array([value.strip() for value in raw[column]], dtype=object)
+        reject(chunk[column] == '', f'missing {column}')
+    
+    for column, kind in FEED_NUMERIC_COLUMNS.items():
+        values = _parse_numeric(raw[column])
+        with np.errstate(invalid='ignore'):
+            reject(~np.isfinite(values), f'non-numeric {column}')
+            reject(values < 0, f'negative {column}')
+            if kind is int:
+                reject(values % 1 != 0, f'non-integer {column}')
+        chunk[column] = values
+    
+    return chunk, reasons
+
+def ingest_product_feed(source: str, snapshot_dir: str = CATALOG_SNAPSHOT_DIR, chunk_size: int = 100_000,
+                        rejects_path: Optional[str] = None, progress=None) -> dict:
+    """Stream a product feed CSV into a catalog snapshot with bounded memory.
+    
+    The feed is read `chunk_size` rows at a time; each chunk is validated and
+    converted column-wise, its derived metrics are computed, and it is appended
+    to the snapshot before the next chunk is read. Malformed rows are written
+    to `rejects_path` (default: next to the snapshot) with their line number
+    and reason instead of aborting the load. `progress`, if given, is called
+    with the running report after every chunk.
+    """
+    rejects_path = rejects_path or os.path.join(snapshot_dir, 'rejected_rows.csv')
+    report = {'source': source, 'rows_read': 0, 'rows_loaded': 0, 'rows_rejected': 0}
+    start_time = time.perf_counter()
+    
+    os.makedirs(snapshot_dir, exist_ok=True)
+    with open(source, newline='', encoding='utf-8-sig') as feed, \
+            open(rejects_path, 'w', newline='', encoding='utf-8') as rejects_file, \
+            CatalogSnapshotWriter(snapshot_dir) as writer:
+        reader = csv.reader(feed)
+        header = [column.strip() for column in next(reader)]
+        missing = [column for column in (*FEED_TEXT_COLUMNS, *FEED_NUMERIC_COLUMNS) if column not in header]
+        if missing:
+            raise ValueError(f"Product feed is missing required columns: {', '.join(missing)}")
+        
+        rejects = csv.writer(rejects_file)
+        rejects.writerow(['line_number', 'reject_reason', *header])
+        
+        line_number = 1
+        while True:
+            rows = list(itertools.islice(reader, chunk_size))
+            if not rows:
+                break
+            
+            chunk, reasons = _validate_feed_chunk(rows, header)
+            valid = reasons == None  # noqa: E711
+            for i in np.flatnonzero(~valid).tolist():
+                rejects.writerow([line_number + 1 + i, reasons[i], *rows[i]])
+            
+            if valid.any():
+                writer.append(ProductCatalog(
+                    names=chunk['Product Name'][valid],
+                    brands=chunk['Brand'][valid],
+                    brand_tiers=chunk['Brand Tier'][valid],
+                    price=chunk['Price (USD)'][valid],
+                    cogs=chunk['COGS (USD)'][valid],
+                    days_inventory=chunk['Days of Inventory'][valid].astype(np.int64),
+                    units_stock=chunk['Units in Stock'][valid].astype(np.int64),
+                    views_last_month=chunk['Views Last Month'][valid].astype(np.int64),
+                    volume_sold_last_month=chunk['Volume Sold Last Month'][valid].astype(np.int64)
+                ))
+            
+            line_number += len(rows)
+            report['rows_read'] += len(rows)
+            report['rows_loaded'] += int(valid.sum())
+            report['rows_rejected'] += int((~valid).sum())
+            report['elapsed_seconds'] = time.perf_counter() - start_time
+            report['rows_per_second'] = report['rows_read'] / max(report['elapsed_seconds'], 1e-9)
+            if progress is not None:
+                progress(report)
+    
+    report['elapsed_seconds'] = time.perf_counter() - start_time
+    report['rows_per_second'] = report['rows_read'] / max(report['elapsed_seconds'], 1e-9)
+    report['rejects_path'] = rejects_path
+    return report
+
+def import_catalog(source: str, snapshot_dir: str = CATALOG_SNAPSHOT_DIR) -> int:
+    """Import a product sheet (Excel or CSV) into a catalog snapshot; returns rows written"""
+    if not source.endswith(('.xlsx', '.xls')):
+        return ingest_product_feed(source, snapshot_dir)['rows_loaded']
+    
+    catalog = ProductCatalog.from_dataframe(pd.read_excel(source))
+    catalog.save_snapshot(snapshot_dir)
+    return len(catalog)
 
-print(f"Loaded {len(products)} products")
+def load_catalog(snapshot_dir: str = CATALOG_SNAPSHOT_DIR, source: str = 'Mock_Skincare_Dataset.xlsx',
+                 rebuild: bool = False) -> ProductCatalog:
+    """Open the memory-mapped catalog snapshot, importing `source` first if there is none"""
+    if rebuild or resolve_snapshot_dir(snapshot_dir) is None:
+        import_catalog(source, snapshot_dir)
+    return ProductCatalog.open_snapshot(snapshot_dir)
+
+# Initialize products from the catalog snapshot (imported from the dataset on first run)
+load_start = time.perf_counter()
+products = load_catalog()
+load_ms = (time.perf_counter() - load_start) * 1000
+
+print(f"Loaded {len(products)} products in {load_ms:.1f} ms ({products.nbytes / 1024:.1f} KB of columns)")
 print("Sample product metrics:")
 sample_product = products[0]
 print(f"Product: {sample_product.name}")
 print(f"Profit Margin: {sample_product.profit_margin:.2f}%")
 print(f"Conversion Rate: {sample_product.conversion_rate:.2f}%")
 print(f"Revenue Last Month: ${sample_product.revenue_last_month:.2f}")
-print(f"Sell-through Rate: {sample_product.sell_through_rate:.2f}%")
\ No newline at end of file
+print(f"Sell-through Rate: {sample_product.sell_through_rate:.2f}%")
+
+# Overlapping snapshot writers: the one that closes last is published and neither
+# removes the other's version
+with tempfile.TemporaryDirectory(prefix='catalog_snapshot_') as overlap_dir:
+    first_writer, second_writer = CatalogSnapshotWriter(overlap_dir), CatalogSnapshotWriter(overlap_dir)
+    first_writer.append(products)
+    second_writer.append(products)
+    second_writer.close()
+    first_writer.close()
+    published = resolve_snapshot_dir(overlap_dir)
+    print(f"Overlapping snapshot writers: last to close published: {os.path.basename(published) == first_writer.version}, "
+          f"opens with {len(ProductCatalog.open_snapshot(overlap_dir))} rows, "
+          f"previous version kept: {os.path.isdir(second_writer.version_dir)}")
\ No newline at end of file
@@ -0,0 +1,331 @@
+# 13. Async HTTP Service
+import asyncio
+import logging
+import os
+import socket
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import List, Literal, Optional
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, generate_latest, multiprocess
+from pydantic import BaseModel, Field
+
+class OverrideRequest(BaseModel):
+    product_name: str
+    position: int = Field(ge=1)
+
+class BlacklistRequest(BaseModel):
+    product_name: str
+
+class ProfilingRequest(BaseModel):
+    sample_rate: float = Field(ge=0, le=1)
+    max_profiles: Optional[int] = Field(default=None, ge=1)
+
+# Debug endpoints (runtime profiling) are only served when this is set
+DEBUG_ENDPOINTS_ENABLED = os.environ.get('SKINSEOUL_DEBUG_ENDPOINTS', '').lower() in ('1', 'true', 'yes')
+
+# Threads running blocking API calls; one per touchpoint lets rebuilds of different touchpoints overlap
+RANKING_WORKERS = int(os.environ.get('SKINSEOUL_RANKING_WORKERS', len(TOUCHPOINT_CONFIGS)))
+
+class BatchOperation(BaseModel):
+    action: Literal['override', 'remove_override', 'blacklist']
+    touchpoint: str
+    product_name: str
+    position: Optional[int] = Field(default=None, ge=1, strict=True)
+
+class BatchRequest(BaseModel):
+    operations: List[BatchOperation]
+
+def create_app(api: MerchandisingAPI, debug_endpoints: Optional[bool] = None,
+               ranking_workers: Optional[int] = None) -> FastAPI:
+    """ASGI app exposing the README endpoints on top of a MerchandisingAPI.
+    
+    Hits in the in-process cache tier are answered directly on the event
+    loop from the pre-encoded response: a dict lookup, an ETag compare (304 on If-None-Match) and a
+    pick of the stored identity or compressed body. Stale entries are
+    served the same way while MerchandisingAPI refreshes them in the
+    background; X-Cache-State and X-Refresh-In-Progress report this.
+    Anything that may block on a rebuild or mutate engine state runs on a
+    thread pool of ranking_workers (default RANKING_WORKERS, one per
+    touchpoint), so slow refreshes never stall concurrent reads and a
+    rebuild of one touchpoint does not queue work for the others;
+    MerchandisingAPI's per-touchpoint locks keep the engine consistent.
+    /api/debug/* is only mounted with debug_endpoints, which defaults to
+    DEBUG_ENDPOINTS_ENABLED.
+    """
+    if debug_endpoints is None:
+        debug_endpoints = DEBUG_ENDPOINTS_ENABLED
+    if ranking_workers is None:
+        ranking_workers = RANKING_WORKERS
+    ranking_executor = ThreadPoolExecutor(max_workers=ranking_workers, thread_name_prefix='ranking')
+    export_manager = ExportManager(api)
+    
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        yield
+        ranking_executor.shutdown(wait=True)
+    
+    app = FastAPI(title='SkinSeoul Merchandising API', lifespan=lifespan)
+    
+    async def run_blocking(func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(ranking_executor, func, *args)
+    
+    def resolve_touchpoint(touchpoint: str) -> TouchpointType:
+        try:
+            touchpoint_type = TouchpointType(touchpoint)
+        except ValueError:
+            touchpoint_type = None
+        if touchpoint_type not in api.engines:  # Also touchpoint types without a configuration
+            raise HTTPException(status_code=404, detail=f'Unknown touchpoint: {touchpoint}')
+        return touchpoint_type
+    
+    def check_result(result: dict, status_code: int = 400) -> dict:
+        if result.get('status') == 'error':
+            raise HTTPException(status_code=status_code, detail=result['message'])
+        return result
+    
+    def encoded_response(touchpoint: TouchpointType, encoded: EncodedResponse, request: Request) -> Response:
+        headers = {
+            'ETag': encoded.etag,
+            'Vary': 'Accept-Encoding',
+            'X-Cache-State': api.cache_state(touchpoint),
+            'X-Refresh-In-Progress': 'true' if api.is_refreshing(touchpoint) else 'false'
+        }
+        if encoded.matches(request.headers.get('if-none-match')):
+            return Response(status_code=304, headers=headers)
+        coding, body = encoded.negotiate(request.headers.get('accept-encoding'))
+        if coding:
+            headers['Content-Encoding'] = coding
+        return Response(body, media_type='application/json', headers=headers)
+    
+    @app.get('/health')
+    async def health():
+        return {
+            'status': 'ok',
+            'products': len(api.products),
+            'cache': {
+                touchpoint.value: {'state': api.cache_state(touchpoint), 'refreshing': api.is_refreshing(touchpoint)}
+                for touchpoint in api.engines
+            },
+            'cache_stats': api.cache.stats()
+        }
+    
+    @app.get('/metrics')
+    def metrics():
+        # Under multi-worker gunicorn each worker writes its samples to
+        # PROMETHEUS_MULTIPROC_DIR; any worker answering aggregates all of them
+        if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        else:
+            registry = REGISTRY
+        return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+    
+    @app.get('/api/rankings/{touchpoint}')
+    async def get_rankings(touchpoint: str, request: Request, refresh: bool = False, cursor: Optional[str] = None,
+                           limit: Optional[int] = Query(default=None, ge=1, le=1000), fields: Optional[str] = None,
+                           trace: bool = False):
+        touchpoint_type = resolve_touchpoint(touchpoint)
+        if trace:
+            return await run_blocking(api.get_traced_rankings, touchpoint_type, refresh)
+        if cursor is not None or limit is not None or fields is not None:
+            return await rankings_page(touchpoint_type, cursor, limit or 20, fields)
+        
+        encoded = None if refresh else api.get_cached_encoded_rankings(touchpoint_type, local_only=True)
+        if encoded is None:
+            encoded = await run_blocking(api.get_encoded_rankings, touchpoint_type, refresh)
+        return encoded_response(touchpoint_type, encoded, request)
+    
+    async def rankings_page(touchpoint: TouchpointType, cursor: Optional[str], limit: int, fields: Optional[str]) -> Response:
+        field_list = [field.strip() for field in fields.split(',') if field.strip()] if fields else None
+        try:
+            # Pages of cached snapshots are joined from pre-encoded fragments on the loop
+            body = api.get_rankings_page(touchpoint, cursor, limit, field_list, local_only=True)
+            if body is None:
+                body = await run_blocking(api.get_rankings_page, touchpoint, cursor, limit, field_list)
+        except CursorExpiredError as e:
+            raise HTTPException(status_code=410, detail=str(e))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return Response(body, media_type='application/json')
+    
+    @app.post('/api/override/{touchpoint}')
+    async def add_override(touchpoint: str, body: OverrideRequest):
+        touchpoint_type = resolve_touchpoint(touchpoint)
+        return check_result(await run_blocking(api.add_manual_override, touchpoint_type, body.product_name, body.position))
+    
+    @app.delete('/api/override/{touchpoint}/{product}')
+    async def remove_override(touchpoint: str, product: str):
+        touchpoint_type = resolve_touchpoint(touchpoint)
+        return check_result(await run_blocking(api.remove_manual_override, touchpoint_type, product), status_code=404)
+    
+    @app.post('/api/blacklist/{touchpoint}')
+    async def blacklist(touchpoint: str, body: BlacklistRequest):
+        touchpoint_type = resolve_touchpoint(touchpoint)
+        return check_result(await run_blocking(api.blacklist_product, touchpoint_type, body.product_name))
+    
+    @app.post('/api/batch')
+    async def batch(body: BatchRequest):
+        operations = [operation.model_dump() for operation in body.operations]
+        result = await run_blocking(api.apply_batch, operations)
+        if result['status'] == 'error':
+            raise HTTPException(status_code=400, detail={'message': result['message'], 'errors': result['errors']})
+        return result
+    
+    if debug_endpoints:
+        @app.put('/api/debug/profiling')
+        async def configure_profiling(body: ProfilingRequest):
+            api.profiler.configure(sample_rate=body.sample_rate, max_profiles=body.max_profiles)
+            return {
+                'sample_rate': api.profiler.sample_rate,
+                'max_profiles': api.profiler.max_profiles,
+                'output_dir': api.profiler.output_dir
+            }
+    
+    @app.get('/api/analytics/{touchpoint}')
+    async def analytics(touchpoint: str):
+        touchpoint_type = resolve_touchpoint(touchpoint)
+        return await run_blocking(api.get_analytics_summary, touchpoint_type)
+    
+    @app.get('/api/export/{touchpoint}/{export_format}')
+    async def export(touchpoint: str, export_format: str, scope: Literal['rankings', 'catalog'] = 'rankings'):
+        touchpoint_type = resolve_touchpoint(touchpoint)
+        streams = {
+            ('rankings', 'csv'): (export_manager.iter_rankings_csv, 'text/csv'),
+            ('rankings', 'ndjson'): (export_manager.iter_rankings_ndjson, 'application/x-ndjson'),
+            ('catalog', 'csv'): (export_manager.iter_scored_catalog_csv, 'text/csv'),
+            ('catalog', 'ndjson'): (export_manager.iter_scored_catalog_ndjson, 'application/x-ndjson')
+        }
+        if (scope, export_format) in streams:
+            # Fetch rankings off the loop; chunks are then generated in Starlette's threadpool
+            iter_export, media_type = streams[(scope, export_format)]
+            chunks = await run_blocking(iter_export, touchpoint_type)
+            return StreamingResponse(chunks, media_type=media_type)
+        if scope == 'catalog':
+            raise HTTPException(status_code=404, detail=f'Catalog exports support csv and ndjson, not {export_format}')
+        if export_format == 'json':
+            content = await run_blocking(export_manager.export_rankings_json, touchpoint_type)
+            return PlainTextResponse(content, media_type='application/json')
+        if export_format == 'frontend':
+            content = await run_blocking(export_manager.export_frontend_config, touchpoint_type)
+            return PlainTextResponse(content, media_type='application/json')
+        raise HTTPException(status_code=404, detail=f'Unknown export format: {export_format}')
+    
+    return app
+
+def serve(api: MerchandisingAPI, host: str = '0.0.0.0', port: int = 8000):
+    """Run the service in the foreground (single worker process)"""
+    uvicorn.run(create_app(api), host=host, port=port, log_level='info')
+
+class BackgroundServer:
+    """Run the service on a uvicorn server in a daemon thread"""
+    
+    def __init__(self, api: MerchandisingAPI, host: str = '127.0.0.1', port: int = 0):
+        if port == 0:
+            with socket.socket() as sock:
+                sock.bind((host, 0))
+                port = sock.getsockname()[1]
+        self.host = host
+        self.port = port
+        self.api = api
+        self.server = uvicorn.Server(uvicorn.Config(create_app(api), host=host, port=port, log_level='warning'))
+        self.thread = None
+    
+    @property
+    def url(self) -> str:
+        return f'http://{self.host}:{self.port}'
+    
+    def start(self, timeout: float = 10.0):
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+        self.thread.start()
+        deadline = time.monotonic() + timeout
+        while not self.server.started:
+            if not self.thread.is_alive() or time.monotonic() > deadline:
+                raise RuntimeError(f'Server failed to start on {self.url}')
+            time.sleep(0.01)
+    
+    def stop(self):
+        self.server.should_exit = True
+        if self.thread:
+            self.thread.join()
+    
+    def __enter__(self):
+        self.start()
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+# Exercise the service over HTTP
+print("Testing Async HTTP Service:")
+print("=" * 60)
+logging.getLogger('httpx').setLevel(logging.WARNING)
+
+with BackgroundServer(MerchandisingAPI()) as http_server, httpx.Client(base_url=http_server.url) as client:
+    print(f"   Health: {client.get('/health').json()}")
+    
+    response = client.get('/api/rankings/homepage_carousel')
+    print(f"   Homepage rankings: {response.status_code}, {response.json()['total_products']} products")
+    etag = response.headers['etag']
+    print(f"   Content-Encoding: {response.headers.get('content-encoding')}, ETag: {etag}")
+    print(f"   Conditional GET: {client.get('/api/rankings/homepage_carousel', headers={'If-None-Match': etag}).status_code}")
+    print(f"   Unknown touchpoint: {client.get('/api/rankings/nonexistent').status_code}")
+    
+    response = client.post('/api/override/homepage_carousel', json={'product_name': 'Fresh Snail Mucin Cleanser', 'position': 1})
+    print(f"   Override: {response.json()['message']}")
+    print(f"   Top product: {client.get('/api/rankings/homepage_carousel').json()['products'][0]['name']}")
+    print(f"   Remove missing override: {client.delete('/api/override/homepage_carousel/Nonexistent').status_code}")
+    
+    # Past the soft TTL the last good rankings are served while one refresh runs
+    for touchpoint in http_server.api.engines:
+        http_server.api.cache.mark_stale(http_server.api.cache_key(touchpoint))
+    response = client.get('/api/rankings/homepage_carousel')
+    print(f"   Expired read: {response.status_code} ({response.headers['x-cache-state']}, refresh in progress: {response.headers['x-refresh-in-progress']})")
+    time.sleep(0.2)
+    print(f"   After background refresh: {client.get('/api/rankings/homepage_carousel').headers['x-cache-state']}")
+    
+    # Infinite scroll: projected pages over one stable snapshot
+    page = client.get('/api/rankings/collection_page', params={'limit': 20, 'fields': 'name,brand,price,position,merchandising_score'}).json()
+    page_sizes = [len(page['products'])]
+    while page['next_cursor']:
+        page = client.get('/api/rankings/collection_page', params={'cursor': page['next_cursor'], 'limit': 20, 'fields': 'name,position'}).json()
+        page_sizes.append(len(page['products']))
+    print(f"   Paged collection: {page_sizes}, last position {page['products'][-1]['position']}")
+    print(f"   Unknown field: {client.get('/api/rankings/collection_page', params={'fields': 'name,secret'}).status_code}")
+    
+    response = client.post('/api/batch', json={'operations': [
+        {'action': 'override', 'touchpoint': 'homepage_carousel', 'product_name': 'Hydra Ginseng Serum', 'position': 2},
+        {'action': 'blacklist', 'touchpoint': 'collection_page', 'product_name': 'Calm Centella Serum'}
+    ]})
+    print(f"   Batch: {response.status_code}, {response.json()['message']}")
+    response = client.post('/api/batch', json={'operations': [{'action': 'blacklist', 'touchpoint': 'collection_page', 'product_name': 'No Such Product'}]})
+    print(f"   Invalid batch: {response.status_code}, {response.json()['detail']['message']}")
+    
+    analytics_data = client.get('/api/analytics/homepage_carousel').json()['analytics']
+    print(f"   Analytics: {analytics_data['total_products']} products, avg score {analytics_data['average_merchandising_score']:.1f}")
+    print(f"   CSV export lines: {len(client.get('/api/export/homepage_carousel/csv').text.splitlines())}")
+    with client.stream('GET', '/api/export/collection_page/ndjson', params={'scope': 'catalog'}) as response:
+        catalog_lines = sum(chunk.count('\n') for chunk in response.iter_text())
+    print(f"   Streamed scored catalog: {catalog_lines} NDJSON lines")
+    stage_series = [line for line in client.get('/metrics').text.splitlines() if line.startswith('skinseoul_ranking_stage_seconds_count')]
+    print(f"   Metrics: {len(stage_series)} ranking stage series")
+    traced = client.get('/api/rankings/homepage_carousel', params={'trace': 'true', 'refresh': 'true'}).json()['trace']
+    print(f"   Trace: {traced['duration_ms']} ms, steps {[child['name'] for child in traced['children']]}")
+    
+    # Cache-hit latency, full body and conditional
+    for label, headers in (('Cache-hit', {}), ('304', {'If-None-Match': etag})):
+        latencies = []
+        for _ in range(500):
+            start = time.perf_counter()
+            client.get('/api/rankings/homepage_carousel', headers=headers)
+            latencies.append((time.perf_counter() - start) * 1000)
+        latencies.sort()
+        print(f"   {label} latency: p50 {statistics.median(latencies):.2f} ms, p99 {latencies[int(len(latencies) * 0.99) - 1]:.2f} ms")
@@ -0,0 +1,327 @@
+# 14. Synthetic Catalogs and Benchmark Suite
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Callable, List, Optional
+
+import numpy as np
+
+# Column distributions modelled on the mock dataset. Each brand has one tier,
+# the brand's most common tier there; brands are drawn uniformly, giving a
+# tier mix close to the mock data's (A 32%, B 43%, C 25%)
+SYNTHETIC_BRAND_TIERS = {
+    'Dr. Jart+': 'A', 'Etude House': 'A', 'Innisfree': 'A', 'Missha': 'A', 'Neogen': 'A',
+    'COSRX': 'B', 'IOPE': 'B', 'Laneige': 'B', 'Skinfood': 'B', 'Sulwhasoo': 'B', 'The Face Shop': 'B',
+    'Benton': 'C', 'Hera': 'C', 'Mamonde': 'C', 'Tony Moly': 'C'
+}
+SYNTHETIC_CATALOG_VERSION = 2  # Bump when generation changes, so cached snapshots are regenerated
+SYNTHETIC_NAME_PARTS = (
+    ('Calm', 'Glow', 'Hydra', 'Radiant', 'Soothing', 'Youth'),
+    ('Centella', 'Collagen', 'Ginseng', 'Green Tea', 'Hyaluronic Acid', 'Mugwort', 'Niacinamide', 'Propolis', 'Snail Mucin'),
+    ('Ampoule', 'Cleanser', 'Cream', 'Emulsion', 'Essence', 'Lotion', 'Mask', 'Serum', 'Toner')
+)
+
+def synthetic_catalog_chunk(start: int, rows: int, seed: int) -> ProductCatalog:
+    """Rows [start, start + rows) of the synthetic catalog for `seed`.
+    
+    Each chunk draws from its own generator seeded with (seed, start), so the
+    catalog is the same however it is split into chunks of the same size.
+    Names carry a SKU number so they are unique, and the brand tier follows
+    the brand (SYNTHETIC_BRAND_TIERS).
+    """
+    rng = np.random.default_rng([seed, start])
+    prefixes, ingredients, product_types = (np.array(parts, dtype=object) for parts in SYNTHETIC_NAME_PARTS)
+    names = (
+        prefixes[rng.integers(0, len(prefixes), rows)] + ' ' +
+        ingredients[rng.integers(0, len(ingredients), rows)] + ' ' +
+        product_types[rng.integers(0, len(product_types), rows)] + ' #' +
+        np.arange(start, start + rows).astype(str).astype(object)
+    )
+    
+    brand_codes = rng.integers(0, len(SYNTHETIC_BRAND_TIERS), rows)
+    price = np.round(rng.uniform(10, 80, rows), 2)
+    margin = rng.uniform(30, 60, rows)
+    return ProductCatalog(
+        names=names,
+        brands=np.array(list(SYNTHETIC_BRAND_TIERS), dtype=object)[brand_codes],
+        brand_tiers=np.array(list(SYNTHETIC_BRAND_TIERS.values()), dtype=object)[brand_codes],
+        price=price,
+        cogs=np.round(price * (1 - margin / 100), 2),
+        days_inventory=rng.integers(1, 121, rows),
+        units_stock=rng.integers(0, 501, rows),
+        views_last_month=rng.integers(100, 5001, rows),
+        volume_sold_last_month=rng.integers(0, 401, rows)
+    )
+
+def write_synthetic_catalog(rows: int, snapshot_dir: str, seed: int = 0, chunk_rows: int = 1_000_000) -> str:
+    """Write a deterministic synthetic catalog snapshot, one chunk in memory at a time"""
+    with CatalogSnapshotWriter(snapshot_dir) as writer:
+        for start in range(0, rows, chunk_rows):
+            writer.append(synthetic_catalog_chunk(start, min(chunk_rows, rows - start), seed))
+    return snapshot_dir
+
+def synthetic_catalog(rows: int, seed: int = 0, cache_dir: str = 'data/benchmarks') -> ProductCatalog:
+    """Open (generating on first use) the synthetic catalog snapshot of a size"""
+    snapshot_dir = os.path.join(cache_dir, f'catalog_{rows}_seed{seed}_v{SYNTHETIC_CATALOG_VERSION}')
+    if resolve_snapshot_dir(snapshot_dir) is None:
+        write_synthetic_catalog(rows, snapshot_dir, seed)
+    return ProductCatalog.open_snapshot(snapshot_dir)
+
+class BenchmarkSuite:
+    """Times each engine stage, end-to-end refreshes and exports on synthetic catalogs.
+    
+    Every benchmark reports the best wall time of `repeats` runs and,
+    unless disabled, the peak of traced Python/NumPy allocations from one
+    extra run under tracemalloc (kept separate so tracing does not skew the
+    timings). Stages that build Product objects work on the first
+    OBJECT_SAMPLE_ROWS rows; streamed exports are skipped above
+    STREAM_EXPORT_MAX_ROWS.
+    """
+    
+    OBJECT_SAMPLE_ROWS = 100_000
+    STREAM_EXPORT_MAX_ROWS = 1_000_000
+    
+    def __init__(self, repeats: int = 3, measure_memory: bool = True,
+                 touchpoint: TouchpointType = TouchpointType.HOMEPAGE_CAROUSEL):
+        self.repeats = repeats
+        self.measure_memory = measure_memory
+        self.touchpoint = touchpoint
+    
+    def measure(self, name: str, catalog_rows: int, rows: int, func: Callable[[], object],
+                setup: Optional[Callable[[], None]] = None) -> dict:
+        """Time `func` (after `setup`, which is not timed) and record its allocation peak"""
+        best = float('inf')
+        for _ in range(self.repeats):
+            if setup is not None:
+                setup()
+            start = time.perf_counter()
+            func()
+            best = min(best, time.perf_counter() - start)
+        
+        peak_mb = None
+        if self.measure_memory:
+            if setup is not None:
+                setup()
+            tracemalloc.start()
+            try:
+                func()
+                peak_mb = tracemalloc.get_traced_memory()[1] / 2 ** 20
+            finally:
+                tracemalloc.stop()
+        
+        return {
+            'benchmark': name,
+            'catalog_rows': catalog_rows,
+            'rows': rows,
+            'seconds': best,
+            'rows_per_second': rows / best if best > 0 else None,
+            'peak_memory_mb': peak_mb
+        }
+    
+    def run_catalog(self, catalog: ProductCatalog) -> List[dict]:
+        """Run every benchmark on one catalog"""
+        n = len(catalog)
+        engine = MerchandisingEngine(TOUCHPOINT_CONFIGS[self.touchpoint])
+        results = []
+        
+        # Object-model stages on a sample
+        sample_rows = min(n, self.OBJECT_SAMPLE_ROWS)
+        sample = catalog.columns(slice(0, sample_rows))
+        feed_rows = [
+            {
+                'Product Name': name, 'Brand': brand, 'Brand Tier': brand_tier, 'Price (USD)': price,
+                'COGS (USD)': cogs, 'Days of Inventory': days, 'Units in Stock': stock,
+                'Views Last Month': views, 'Volume Sold Last Month': sold
+            }
+            for name, brand, brand_tier, price, cogs, days, stock, views, sold in zip(
+                sample['name'].tolist(), sample['brand'].tolist(), sample['brand_tier'].tolist(),
+                sample['price'].tolist(), sample['cogs'].tolist(), sample['days_inventory'].tolist(),
+                sample['units_stock'].tolist(), sample['views_last_month'].tolist(),
+                sample['volume_sold_last_month'].tolist()
+            )
+        ]
+        results.append(self.measure('product_construction', n, sample_rows, lambda: [Product(row) for row in feed_rows]))
+        product_objects = [Product(row) for row in feed_rows]
+        del feed_rows
+        results.append(self.measure('apply_filters', n, sample_rows, lambda: engine.apply_filters(product_objects)))
+        results.append(self.measure(
+            'calculate_composite_score', n, sample_rows,
+            lambda: [engine.calculate_composite_score(product) for product in product_objects]
+        ))
+        results.append(self.measure('generate_rankings_objects', n, sample_rows, lambda: engine.generate_rankings(product_objects)))
+        del product_objects
+        
+        # Columnar stages on the whole catalog
+        candidate_rows = np.flatnonzero(engine.filter_mask(catalog))
+        results.append(self.measure('filter_mask', n, n, lambda: engine.filter_mask(catalog)))
+        results.append(self.measure(
+            'composite_scores_batch', n, len(candidate_rows),
+            lambda: engine.calculate_composite_scores_batch(catalog.columns(candidate_rows, include_text=False))
+        ))
+        results.append(self.measure('generate_rankings', n, n, lambda: engine.generate_rankings(catalog)))
+        
+        # End-to-end refreshes through the API
+        api_state = {}
+        
+        def fresh_api():
+            previous = api_state.pop('api', None)
+            if previous is not None:
+                previous._refresh_executor.shutdown(wait=True)
+            api_state['api'] = MerchandisingAPI(catalog)
+        
+        results.append(self.measure(
+            'get_rankings_cold', n, n, lambda: api_state['api'].get_rankings(self.touchpoint), setup=fresh_api
+        ))
+        results.append(self.measure(
+            'refresh_all_rankings', n, n, lambda: api_state['api'].refresh_all_rankings(), setup=fresh_api
+        ))
+        warm_api = api_state['api']
+        warm_api.get_rankings(self.touchpoint)
+        results.append(self.measure(
+            'get_rankings_cached', n, 1_000, lambda: [warm_api.get_rankings(self.touchpoint) for _ in range(1_000)]
+        ))
+        
+        # Exports
+        exports = ExportManager(warm_api)
+        results.append(self.measure('export_rankings_json', n, n, lambda: exports.export_rankings_json(self.touchpoint)))
+        results.append(self.measure('export_rankings_csv', n, n, lambda: exports.export_rankings_csv(self.touchpoint)))
+        export_dir = tempfile.mkdtemp(prefix='benchmark_export_')
+        try:
+            results.append(self.measure(
+                'export_scored_catalog', n, n, lambda: exports.export_scored_catalog(os.path.join(export_dir, 'scored'))
+            ))
+        finally:
+            shutil.rmtree(export_dir, ignore_errors=True)
+        if n <= self.STREAM_EXPORT_MAX_ROWS:
+            results.append(self.measure(
+                'stream_scored_catalog_csv', n, n, lambda: sum(map(len, exports.iter_scored_catalog_csv(self.touchpoint)))
+            ))
+        warm_api._refresh_executor.shutdown(wait=True)
+        return results
+    
+    def run(self, sizes: List[int], seed: int = 0, cache_dir: str = 'data/benchmarks') -> dict:
+        """Benchmark synthetic catalogs of each size; returns the results document"""
+        results = []
+        for size in sizes:
+            generate_start = time.perf_counter()
+            catalog = synthetic_catalog(size, seed, cache_dir)
+            results.append({
+                'benchmark': 'open_synthetic_catalog',
+                'catalog_rows': size,
+                'rows': size,
+                'seconds': time.perf_counter() - generate_start,
+                'rows_per_second': None,
+                'peak_memory_mb': None
+            })
+            results.extend(self.run_catalog(catalog))
+        return {
+            'created_at': datetime.now().isoformat(),
+            'environment': benchmark_environment(),
+            'settings': {
+                'repeats': self.repeats, 'seed': seed, 'touchpoint': self.touchpoint.value,
+                'synthetic_catalog_version': SYNTHETIC_CATALOG_VERSION
+            },
+            'results': results
+        }
+
+def benchmark_environment() -> dict:
+    """Where the results came from, so they are only compared like for like"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'git_commit': commit,
+        'python': sys.version.split()[0],
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count()
+    }
+
+def save_benchmark_results(results: dict, path: str):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    temp_path = f'{path}.tmp'
+    with open(temp_path, 'w') as f:
+        json.dump(results, f, indent=2)
+    os.replace(temp_path, path)
+
+# Environment fields that must match for timings to be comparable
+COMPARABLE_ENVIRONMENT_FIELDS = ('python', 'numpy', 'cpu_count')
+
+def benchmark_differences(baseline: dict, current: dict) -> dict:
+    """Environment fields and generator settings that differ between two results documents"""
+    pairs = [(field, baseline['environment'].get(field), current['environment'].get(field))
+             for field in COMPARABLE_ENVIRONMENT_FIELDS]
+    pairs.append(('synthetic_catalog_version', baseline['settings'].get('synthetic_catalog_version'),
+                  current['settings'].get('synthetic_catalog_version')))
+    return {field: (before, after) for field, before, after in pairs if before != after}
+
+def compare_benchmark_results(baseline: dict, current: dict, threshold: float = 0.10,
+                              min_seconds: float = 0.001) -> List[dict]:
+    """Benchmarks that got more than `threshold` slower than the baseline.
+    
+    Results are matched on (benchmark, catalog_rows). Runs faster than
+    `min_seconds` in both documents are ignored; timer noise dominates them.
+    Raises ValueError if the runs differ in Python or NumPy version, CPU
+    count or synthetic catalog generator, since their timings are not
+    comparable.
+    """
+    differences = benchmark_differences(baseline, current)
+    if differences:
+        raise ValueError('Benchmark runs are not comparable: ' + ', '.join(
+            f'{field} {before} -> {after}' for field, (before, after) in differences.items()
+        ))
+    
+    baseline_seconds = {
+        (result['benchmark'], result['catalog_rows']): result['seconds'] for result in baseline['results']
+    }
+    regressions = []
+    for result in current['results']:
+        key = (result['benchmark'], result['catalog_rows'])
+        if key not in baseline_seconds or result['benchmark'] == 'open_synthetic_catalog':
+            continue  # Opening may include one-off generation
+        before, after = baseline_seconds[key], result['seconds']
+        if max(before, after) < min_seconds:
+            continue
+        if after > before * (1 + threshold):
+            regressions.append({
+                'benchmark': result['benchmark'],
+                'catalog_rows': result['catalog_rows'],
+                'baseline_seconds': before,
+                'seconds': after,
+                'slowdown': after / before
+            })
+    return regressions
+
+# Run at 1k and 100k SKUs by default; SKINSEOUL_BENCHMARK_SIZES=1000,100000,1000000,10000000 for the full suite
+BENCHMARK_RESULTS_PATH = 'data/benchmarks/results.json'
+benchmark_sizes = [int(size) for size in os.environ.get('SKINSEOUL_BENCHMARK_SIZES', '1000,100000').split(',')]
+benchmark_results = BenchmarkSuite(repeats=3).run(benchmark_sizes)
+
+print("Engine Benchmark Suite:")
+print("=" * 60)
+for result in benchmark_results['results']:
+    peak = f"{result['peak_memory_mb']:8.1f} MB" if result['peak_memory_mb'] is not None else ' ' * 11
+    print(f"   {result['benchmark']:<28} {result['catalog_rows']:>10,} SKUs {result['seconds'] * 1000:10.2f} ms {peak}")
+
+# Compare with the previous run before replacing it
+if os.path.exists(BENCHMARK_RESULTS_PATH):
+    with open(BENCHMARK_RESULTS_PATH) as f:
+        previous_results = json.load(f)
+    try:
+        regressions = compare_benchmark_results(previous_results, benchmark_results, threshold=0.10)
+    except ValueError as e:
+        print(f"\nNot compared with the previous run: {e}")
+    else:
+        print(f"\nRegressions (>10% slower than {previous_results['environment']['git_commit'] or 'previous run'}): {len(regressions)}")
+        for regression in regressions:
+            print(f"   {regression['benchmark']} at {regression['catalog_rows']:,} SKUs: {regression['slowdown']:.2f}x")
+save_benchmark_results(benchmark_results, BENCHMARK_RESULTS_PATH)
+print(f"Results written to {BENCHMARK_RESULTS_PATH}")
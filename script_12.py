@@ -0,0 +1,338 @@
+# 15. HTTP Load Testing
+import asyncio
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import random
+import socket
+import time
+import urllib.parse
+from dataclasses import asdict, dataclass, field, replace
+from typing import Dict, Iterable, List, Optional
+
+import httpx
+import numpy as np
+import uvicorn
+
+@dataclass
+class TraceRequest:
+    """One request of a load test, as recorded to and replayed from a trace file"""
+    offset: float  # Seconds after the start of the recording
+    kind: str
+    method: str
+    path: str
+    params: dict = field(default_factory=dict)
+    body: Optional[dict] = None
+
+@dataclass
+class LoadMix:
+    """Relative weights of the request kinds a load test sends.
+    
+    'read' is a plain rankings read (a cache hit once warm); 'refresh_read'
+    forces a re-rank with ?refresh=true; 'override' adds a manual override,
+    or removes one when the touchpoint already has `max_active_overrides`;
+    'blacklist' blacklists a product from `blacklist_pool`; 'export' fetches
+    a rankings export.
+    """
+    read: float = 1.0
+    refresh_read: float = 0.0
+    override: float = 0.0
+    blacklist: float = 0.0
+    export: float = 0.0
+    touchpoints: List[str] = field(default_factory=lambda: [touchpoint.value for touchpoint in TOUCHPOINT_CONFIGS])
+    export_formats: List[str] = field(default_factory=lambda: ['json', 'csv'])
+    max_active_overrides: int = 3
+    blacklist_pool: int = 5  # Products eligible for blacklisting, so a long run cannot empty the rankings
+    
+    KINDS = ('read', 'refresh_read', 'override', 'blacklist', 'export')
+    
+    def weights(self) -> Dict[str, float]:
+        weights = {kind: getattr(self, kind) for kind in self.KINDS if getattr(self, kind) > 0}
+        if not weights:
+            raise ValueError('LoadMix needs at least one request kind with a positive weight')
+        return weights
+
+class RequestGenerator:
+    """Seeded stream of requests following a LoadMix.
+    
+    Writes are tracked so overrides are added and removed in pairs and the
+    service state stays bounded however long the test runs.
+    """
+    
+    def __init__(self, mix: LoadMix, product_names: Iterable[str], seed: int = 0):
+        self.mix = mix
+        self.product_names = sorted(set(product_names))
+        self.rng = random.Random(seed)
+        weights = mix.weights()
+        self.kinds = list(weights)
+        self.cumulative_weights = list(itertools.accumulate(weights.values()))
+        self.blacklist_candidates = self.rng.sample(self.product_names, min(mix.blacklist_pool, len(self.product_names)))
+        self.active_overrides = {touchpoint: [] for touchpoint in mix.touchpoints}
+    
+    def next_request(self, offset: float) -> TraceRequest:
+        kind = self.rng.choices(self.kinds, cum_weights=self.cumulative_weights)[0]
+        touchpoint = self.rng.choice(self.mix.touchpoints)
+        
+        if kind == 'read':
+            return TraceRequest(offset, kind, 'GET', f'/api/rankings/{touchpoint}')
+        if kind == 'refresh_read':
+            return TraceRequest(offset, kind, 'GET', f'/api/rankings/{touchpoint}', {'refresh': 'true'})
+        if kind == 'export':
+            export_format = self.rng.choice(self.mix.export_formats)
+            return TraceRequest(offset, kind, 'GET', f'/api/export/{touchpoint}/{export_format}')
+        if kind == 'blacklist':
+            return TraceRequest(offset, kind, 'POST', f'/api/blacklist/{touchpoint}',
+                                body={'product_name': self.rng.choice(self.blacklist_candidates)})
+        
+        active = self.active_overrides[touchpoint]
+        if len(active) >= self.mix.max_active_overrides:
+            product_name = active.pop(self.rng.randrange(len(active)))
+            return TraceRequest(offset, 'remove_override', 'DELETE',
+                                f"/api/override/{touchpoint}/{urllib.parse.quote(product_name, safe='')}")
+        product_name = self.rng.choice([name for name in self.product_names if name not in active])
+        active.append(product_name)
+        return TraceRequest(offset, kind, 'POST', f'/api/override/{touchpoint}',
+                            body={'product_name': product_name, 'position': self.rng.randint(1, 5)})
+
+def save_trace(requests: List[TraceRequest], path: str):
+    """Write a traffic trace as NDJSON, one request per line"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w') as f:
+        for request in requests:
+            f.write(json.dumps(asdict(request)) + '\n')
+
+def load_trace(path: str) -> List[TraceRequest]:
+    """Read an NDJSON traffic trace, ordered by offset"""
+    with open(path) as f:
+        requests = [TraceRequest(**json.loads(line)) for line in f if line.strip()]
+    return sorted(requests, key=lambda request: request.offset)
+
+def summarize_latencies(latencies_ms: List[float], errors: int, elapsed: float) -> dict:
+    latencies = np.asarray(latencies_ms)
+    p50, p90, p99 = np.percentile(latencies, [50, 90, 99]) if len(latencies) else (0.0, 0.0, 0.0)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput_rps': len(latencies) / elapsed if elapsed > 0 else 0.0,
+        'p50_ms': float(p50),
+        'p90_ms': float(p90),
+        'p99_ms': float(p99),
+        'max_ms': float(latencies.max()) if len(latencies) else 0.0
+    }
+
+class LoadTester:
+    """Drives the ranking service over HTTP and reports throughput and latency percentiles.
+    
+    run() is closed-loop: `concurrency` clients each send their next request
+    as soon as the previous one returns, which measures the throughput a
+    worker sustains. replay() is open-loop: requests are sent at their
+    recorded offsets (scaled by `speed`) whether or not earlier ones have
+    returned, and latency is measured from the scheduled send time so that
+    queueing behind a slow server is not hidden; a write that followed an
+    earlier one in the recording, such as an override removal, can overtake
+    it and fail. Non-2xx responses and transport errors count as errors.
+    """
+    
+    def __init__(self, base_url: str, concurrency: int = 16, timeout: float = 30.0):
+        self.base_url = base_url
+        self.concurrency = concurrency
+        self.timeout = timeout
+    
+    def run(self, mix: LoadMix, product_names: Iterable[str], duration_seconds: float = 10.0,
+            max_requests: Optional[int] = None, seed: int = 0, record_path: Optional[str] = None) -> dict:
+        """Closed-loop load test; the issued requests are saved to `record_path` as a trace"""
+        generator = RequestGenerator(mix, product_names, seed)
+        report, issued = asyncio.run(self._run_closed_loop(generator, duration_seconds, max_requests))
+        if record_path:
+            save_trace(issued, record_path)
+        return report
+    
+    def replay(self, trace: List[TraceRequest], speed: float = 1.0) -> dict:
+        """Open-loop replay of a recorded trace; speed 2.0 sends it twice as fast"""
+        return asyncio.run(self._replay(trace, speed))
+    
+    def _client(self) -> httpx.AsyncClient:
+        limits = httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency)
+        return httpx.AsyncClient(base_url=self.base_url, timeout=self.timeout, limits=limits)
+    
+    async def _send(self, client: httpx.AsyncClient, request: TraceRequest) -> int:
+        """Send one request and read its body; returns the status code, 0 on transport errors"""
+        try:
+            response = await client.request(request.method, request.path, params=request.params or None, json=request.body)
+            await response.aread()
+            return response.status_code
+        except httpx.HTTPError:
+            return 0
+    
+    async def _run_closed_loop(self, generator: RequestGenerator, duration_seconds: float, max_requests: Optional[int]):
+        samples = []  # (kind, latency ms, status)
+        issued = []
+        started = time.perf_counter()
+        deadline = started + duration_seconds
+        
+        async def client_loop(client: httpx.AsyncClient):
+            while time.perf_counter() < deadline and (max_requests is None or len(issued) < max_requests):
+                sent = time.perf_counter()
+                request = generator.next_request(sent - started)
+                issued.append(request)
+                status = await self._send(client, request)
+                samples.append((request.kind, (time.perf_counter() - sent) * 1000, status))
+        
+        async with self._client() as client:
+            await asyncio.gather(*(client_loop(client) for _ in range(self.concurrency)))
+        return self._report(samples, time.perf_counter() - started, mode='closed_loop'), issued
+    
+    async def _replay(self, trace: List[TraceRequest], speed: float) -> dict:
+        samples = []
+        loop = asyncio.get_running_loop()
+        
+        async def send_at(client: httpx.AsyncClient, request: TraceRequest, scheduled: float):
+            delay = scheduled - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            status = await self._send(client, request)  # Waits for a free connection past `concurrency` in flight
+            samples.append((request.kind, (loop.time() - scheduled) * 1000, status))
+        
+        async with self._client() as client:
+            started = loop.time()
+            tasks = []
+            for request in trace:
+                scheduled = started + request.offset / speed
+                # Create tasks shortly before they are due so a long trace does not hold every request open
+                while scheduled - loop.time() > 0.05:
+                    await asyncio.sleep(min(scheduled - loop.time() - 0.05, 0.05))
+                tasks.append(asyncio.create_task(send_at(client, request, scheduled)))
+            await asyncio.gather(*tasks)
+        return self._report(samples, loop.time() - started, mode='replay', speed=speed)
+    
+    def _report(self, samples: list, elapsed: float, **settings) -> dict:
+        by_kind = {}
+        for kind, latency, status in samples:
+            by_kind.setdefault(kind, ([], []))
+            by_kind[kind][0].append(latency)
+            by_kind[kind][1].append(status)
+        
+        status_counts = {}
+        for _, _, status in samples:
+            status_counts[str(status)] = status_counts.get(str(status), 0) + 1
+        
+        def errors(statuses):
+            return sum(1 for status in statuses if not 200 <= status < 300)
+        
+        return {
+            'settings': {'base_url': self.base_url, 'concurrency': self.concurrency, **settings},
+            'elapsed_seconds': elapsed,
+            'overall': summarize_latencies([latency for _, latency, _ in samples],
+                                           errors([status for _, _, status in samples]), elapsed),
+            'by_kind': {
+                kind: summarize_latencies(latencies, errors(statuses), elapsed)
+                for kind, (latencies, statuses) in sorted(by_kind.items())
+            },
+            'status_counts': status_counts
+        }
+
+def _run_local_service(host: str, port: int, snapshot_dir: Optional[str], refresh_interval_seconds: Optional[float]):
+    """Child process entry point: build the API, optionally start the scheduler, and serve"""
+    api = MerchandisingAPI(ProductCatalog.open_snapshot(snapshot_dir) if snapshot_dir else None)
+    if refresh_interval_seconds:
+        for engine in api.engines.values():
+            engine.config = replace(engine.config, refresh_interval_hours=refresh_interval_seconds / 3600)
+        scheduler = AutomationScheduler(api)
+        scheduler.logger.setLevel(logging.WARNING)
+        for touchpoint in api.engines:
+            scheduler.schedule_touchpoint_refresh(touchpoint)
+        scheduler.start()
+    uvicorn.run(create_app(api), host=host, port=port, log_level='warning', access_log=False)
+
+class LocalService:
+    """Run the service in a separate process on this machine for load testing.
+    
+    Unlike BackgroundServer, the service does not share a GIL with the load
+    generator. With `refresh_interval_seconds` set, an AutomationScheduler
+    refreshes every touchpoint at that interval while the test runs.
+    `snapshot_dir` serves a catalog snapshot, e.g. a synthetic catalog,
+    instead of the default catalog.
+    """
+    
+    def __init__(self, snapshot_dir: Optional[str] = None, refresh_interval_seconds: Optional[float] = None,
+                 host: str = '127.0.0.1', port: int = 0):
+        if port == 0:
+            with socket.socket() as sock:
+                sock.bind((host, 0))
+                port = sock.getsockname()[1]
+        self.host = host
+        self.port = port
+        self.snapshot_dir = snapshot_dir
+        self.refresh_interval_seconds = refresh_interval_seconds
+        self.process = None
+    
+    @property
+    def url(self) -> str:
+        return f'http://{self.host}:{self.port}'
+    
+    def start(self, timeout: float = 60.0):
+        self.process = multiprocessing.get_context('fork').Process(
+            target=_run_local_service,
+            args=(self.host, self.port, self.snapshot_dir, self.refresh_interval_seconds),
+            daemon=True
+        )
+        self.process.start()
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                if httpx.get(f'{self.url}/health', timeout=1.0).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            if not self.process.is_alive() or time.monotonic() > deadline:
+                self.stop()
+                raise RuntimeError(f'Service failed to start on {self.url}')
+            time.sleep(0.05)
+    
+    def stop(self):
+        if self.process:
+            self.process.terminate()
+            self.process.join()
+            self.process = None
+    
+    def __enter__(self):
+        self.start()
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+def print_load_report(label: str, report: dict):
+    overall = report['overall']
+    print(f"   {label}: {overall['requests']:,} requests, {overall['throughput_rps']:,.0f} req/s, {overall['errors']} errors")
+    for kind, summary in report['by_kind'].items():
+        print(f"      {kind:<16} {summary['requests']:6,}  p50 {summary['p50_ms']:7.2f} ms  p90 {summary['p90_ms']:7.2f} ms  "
+              f"p99 {summary['p99_ms']:7.2f} ms  max {summary['max_ms']:7.2f} ms  errors {summary['errors']}")
+
+# Load test a local service; SKINSEOUL_LOADTEST_SECONDS sets the length of each scenario
+load_test_seconds = float(os.environ.get('SKINSEOUL_LOADTEST_SECONDS', '3'))
+LOAD_TRACE_PATH = 'data/loadtest/mixed_trace.ndjson'
+logging.getLogger('httpx').setLevel(logging.WARNING)
+
+print("HTTP Load Test:")
+print("=" * 60)
+scenarios = [
+    ('Cached reads', LoadMix(), None),
+    ('Forced re-rank reads', LoadMix(read=0.0, refresh_read=1.0), None),
+    ('Mixed reads/writes, 1s scheduled refreshes', LoadMix(read=0.85, override=0.08, blacklist=0.02, export=0.05), 1.0)
+]
+for label, mix, refresh_interval in scenarios:
+    with LocalService(refresh_interval_seconds=refresh_interval) as service:
+        record_path = LOAD_TRACE_PATH if mix.override else None
+        report = LoadTester(service.url, concurrency=8).run(
+            mix, products.names, duration_seconds=load_test_seconds, record_path=record_path
+        )
+    print_load_report(label, report)
+
+# Replay the recorded mixed trace against a fresh service at half the recorded rate
+with LocalService(refresh_interval_seconds=1.0) as service:
+    trace = load_trace(LOAD_TRACE_PATH)
+    report = LoadTester(service.url, concurrency=8).replay(trace, speed=0.5)
+print_load_report(f"Replayed trace at 0.5x ({len(trace):,} requests)", report)
@@ -32,7 +32,8 @@ class MerchandisingConfig:
     max_products: int
     scoring_weights: ScoringWeights
     filter_criteria: FilterCriteria
-    refresh_interval_hours: int = 1
+    refresh_interval_hours: int = 1  # Soft TTL: cached rankings are refreshed after this
+    cache_hard_ttl_hours: float = 24  # Stale rankings are served while refreshing until this
     allow_manual_overrides: bool = True
     seasonal_boost_enabled: bool = True
 
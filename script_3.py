@@ -1,15 +1,232 @@
 # 3. Core Merchandising Engine
+import bisect
+import contextvars
+import cProfile
+import heapq
 import math
+import os
+import random
+import threading
+import time
+import numpy as np
+import pandas as pd
+from contextlib import contextmanager
 from datetime import datetime, timedelta
-from typing import List, Tuple, Optional
+from typing import Dict, List, Tuple, Optional
+from prometheus_client import Counter, Gauge, Histogram
+
+# Component score names, in the same order as the ScoringWeights fields
+SCORE_COMPONENTS = ('sales_velocity', 'profit_margin', 'inventory_health', 'brand_tier', 'engagement_score')
+
+# Prometheus instruments for the ranking hot path. Under multi-worker
+# gunicorn, set PROMETHEUS_MULTIPROC_DIR and /metrics aggregates all workers.
+RANKING_STAGE_SECONDS = Histogram(
+    'skinseoul_ranking_stage_seconds', 'Time spent in each stage of generate_rankings',
+    ['touchpoint', 'stage'], buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+)
+RANKINGS_CACHE_REQUESTS = Counter(
+    'skinseoul_rankings_cache_requests', 'Cached rankings lookups by result (hit, stale, miss)',
+    ['touchpoint', 'result']
+)
+SCHEDULED_REFRESH_SECONDS = Histogram(
+    'skinseoul_scheduled_refresh_seconds', 'Duration of scheduled touchpoint refreshes by outcome',
+    ['touchpoint', 'outcome'], buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+)
+EXPORT_SECONDS = Histogram(
+    'skinseoul_export_seconds', 'Duration of exports', ['export', 'format'],
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+)
+EXPORT_BYTES = Histogram(
+    'skinseoul_export_bytes', 'Size of exports', ['export', 'format'],
+    buckets=(1e3, 1e4, 1e5, 1e6, 1e7, 1e8, 1e9)
+)
+CATALOG_PRODUCTS = Gauge(
+    'skinseoul_catalog_products', 'Products in the catalog being ranked', multiprocess_mode='livemostrecent'
+)
+RANKING_CANDIDATES = Gauge(
+    'skinseoul_ranking_candidates', 'Products passing the filters of a touchpoint',
+    ['touchpoint'], multiprocess_mode='livemostrecent'
+)
+
+class TraceSpan:
+    """One timed step of a traced ranking request, with counts and child steps"""
+    
+    __slots__ = ('name', 'attributes', 'children', 'started', 'duration')
+    
+    def __init__(self, name: str, attributes: dict):
+        self.name = name
+        self.attributes = attributes
+        self.children = []
+        self.started = time.perf_counter()
+        self.duration = None
+    
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+    
+    def to_dict(self) -> dict:
+        return {
+            'name': self.name,
+            'duration_ms': None if self.duration is None else round(self.duration * 1000, 3),
+            'attributes': self.attributes,
+            'children': [child.to_dict() for child in self.children]
+        }
+
+class _NullSpan:
+    """Returned when tracing or profiling is off: entering it and setting attributes do nothing"""
+    
+    def set(self, **attributes):
+        pass
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NULL_SPAN = _NullSpan()
+_active_trace = contextvars.ContextVar('ranking_trace', default=None)
+
+class RankingTrace:
+    """Span tree recorded while trace_rankings() is active in this context"""
+    
+    def __init__(self, name: str):
+        self.root = TraceSpan(name, {})
+        self._stack = [self.root]
+    
+    @contextmanager
+    def span(self, name: str, attributes: dict):
+        span = TraceSpan(name, attributes)
+        self._stack[-1].children.append(span)
+        self._stack.append(span)
+        try:
+            yield span
+        finally:
+            span.duration = time.perf_counter() - span.started
+            self._stack.pop()
+    
+    def to_dict(self) -> dict:
+        return self.root.to_dict()
+
+@contextmanager
+def trace_rankings(name: str = 'rankings'):
+    """Record a span tree of the traced steps run in this context (opt-in).
+    
+    Steps run on other threads, such as background refreshes, are not
+    included. Without an active trace, trace_span costs one context
+    variable lookup.
+    """
+    trace = RankingTrace(name)
+    token = _active_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        trace.root.duration = time.perf_counter() - trace.root.started
+        _active_trace.reset(token)
+
+def trace_span(name: str, **attributes):
+    """Context manager for a child span of the active trace (a no-op without one)"""
+    trace = _active_trace.get()
+    if trace is None:
+        return _NULL_SPAN
+    return trace.span(name, attributes)
+
+def current_span():
+    """Innermost open span of the active trace, or a no-op span"""
+    trace = _active_trace.get()
+    return _NULL_SPAN if trace is None else trace._stack[-1]
+
+def tracing_enabled() -> bool:
+    return _active_trace.get() is not None
+
+class SamplingProfiler:
+    """Runs a sampled fraction of wrapped calls under cProfile and dumps pstats files.
+    
+    The sample rate can be changed at runtime; at 0 the check is a single
+    comparison. Only one call is profiled at a time, so a concurrent call
+    is run unprofiled rather than mixed into another profile. Only the
+    newest max_profiles dumps are kept in output_dir.
+    """
+    
+    def __init__(self, sample_rate: float = 0.0, output_dir: str = 'profiles', max_profiles: int = 50):
+        self.sample_rate = sample_rate
+        self.output_dir = output_dir
+        self.max_profiles = max_profiles
+        self.last_profile = None  # Path of the most recent dump
+        self._guard = threading.Lock()
+    
+    def configure(self, sample_rate: Optional[float] = None, output_dir: Optional[str] = None,
+                  max_profiles: Optional[int] = None):
+        if sample_rate is not None:
+            if not 0 <= sample_rate <= 1:
+                raise ValueError(f'sample_rate must be between 0 and 1, got {sample_rate}')
+            self.sample_rate = sample_rate
+        if output_dir is not None:
+            self.output_dir = output_dir
+        if max_profiles is not None:
+            if max_profiles < 1:
+                raise ValueError(f'max_profiles must be positive, got {max_profiles}')
+            self.max_profiles = max_profiles
+    
+    def profile(self, name: str):
+        """Context manager profiling the enclosed block for a sampled fraction of calls"""
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return _NULL_SPAN
+        return self._profiled(name)
+    
+    @contextmanager
+    def _profiled(self, name: str):
+        if not self._guard.acquire(blocking=False):
+            yield
+            return
+        try:
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                yield
+            finally:
+                profiler.disable()
+            os.makedirs(self.output_dir, exist_ok=True)
+            path = os.path.join(self.output_dir, f"{name}-{datetime.now():%Y%m%dT%H%M%S%f}-{os.getpid()}.prof")
+            profiler.dump_stats(path)
+            self.last_profile = path
+            self._remove_old_profiles()
+        finally:
+            self._guard.release()
+    
+    def _remove_old_profiles(self):
+        """Delete the oldest dumps beyond max_profiles"""
+        dumps = sorted(
+            (entry for entry in os.scandir(self.output_dir) if entry.is_file() and entry.name.endswith('.prof')),
+            key=lambda entry: entry.stat().st_mtime
+        )
+        for entry in dumps[:max(0, len(dumps) - self.max_profiles)]:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass  # Pruned by another worker sharing the directory
 
 class MerchandisingEngine:
+    BRAND_TIER_SCORES = {
+        'A': 100,  # Premium brands
+        'B': 75,   # Mainstream brands
+        'C': 50    # Value brands
+    }
+    DEFAULT_BRAND_TIER_SCORE = 50
+    FILTER_FAILURE_FLAGS = {
+        'low_stock': 1,
+        'aged_inventory': 2,
+        'low_margin': 4,
+        'low_views': 8,
+        'blacklisted': 16
+    }
+    
     def __init__(self, config: MerchandisingConfig):
         self.config = config
         self.manual_overrides = {}  # product_name -> position
         self.blacklisted_products = set()
         self.seasonal_boosts = {}  # product_name -> boost_multiplier
-        
+        self._blacklist_cache = None  # (catalog, blacklist, bitmap)
+    
     def calculate_sales_velocity_score(self, product: Product) -> float:
         """Calculate sales velocity score (0-100)"""
         if product.views_last_month == 0:
@@ -46,12 +263,7 @@ class MerchandisingEngine:
     
     def calculate_brand_tier_score(self, product: Product) -> float:
         """Calculate brand tier score (0-100)"""
-        tier_scores = {
-            'A': 100,  # Premium brands
-            'B': 75,   # Mainstream brands  
-            'C': 50    # Value brands
-        }
-        return tier_scores.get(product.brand_tier, 50)
+        return self.BRAND_TIER_SCORES.get(product.brand_tier, self.DEFAULT_BRAND_TIER_SCORE)
     
     def calculate_engagement_score(self, product: Product) -> float:
         """Calculate engagement score (0-100)"""
@@ -85,8 +297,144 @@ class MerchandisingEngine:
         
         return min(composite_score, 100)  # Cap at 100
     
+    def calculate_component_scores_batch(self, columns: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """Calculate all five component scores (0-100) for a whole catalog at once.
+        
+        Vectorized counterpart of the per-product calculate_*_score methods, which
+        remain the reference implementation; both paths produce identical values.
+        `columns` maps Product attribute names to arrays (see products_to_columns).
+        """
+        views = columns['views_last_month']
+        volume = columns['volume_sold_last_month']
+        days_inventory = columns['days_inventory']
+        
+        # Sales velocity: conversion and volume blend, zero without any views
+        conversion_score = np.minimum(columns['conversion_rate'] * 10, 100)
+        volume_score = np.minimum((volume / 200) * 100, 100)
+        velocity_scores = np.where(views == 0, 0.0, conversion_score * 0.6 + volume_score * 0.4)
+        
+        # Profit margin: 50%+ margin gets full score
+        profit_scores = np.minimum(columns['profit_margin'] * 2, 100)
+        
+        # Inventory health: optimal 30-90 days, penalize low and excess stock
+        inventory_scores = np.where(
+            days_inventory < 30,
+            np.maximum(0, (days_inventory / 30) * 100),
+            np.where(
+                days_inventory <= 90,
+                100.0,
+                np.maximum(0, 100 - ((days_inventory - 90) / 100) * 50)
+            )
+        )
+        
+        # Brand tier: look up each distinct tier once
+        if 'brand_tier_codes' in columns:
+            tiers, tier_codes = columns['brand_tier_categories'], columns['brand_tier_codes']
+        else:
+            tiers, tier_codes = np.unique(np.asarray(columns['brand_tier']), return_inverse=True)
+        tier_lookup = np.array(
+            [self.BRAND_TIER_SCORES.get(tier, self.DEFAULT_BRAND_TIER_SCORE) for tier in tiers],
+            dtype=np.float64
+        )
+        brand_scores = tier_lookup[tier_codes]
+        
+        # Engagement: 5000+ views gets full score
+        engagement_scores = np.minimum((views / 5000) * 100, 100)
+        
+        return {
+            'sales_velocity': velocity_scores,
+            'profit_margin': profit_scores,
+            'inventory_health': inventory_scores,
+            'brand_tier': brand_scores,
+            'engagement_score': engagement_scores
+        }
+    
+    def calculate_composite_scores_batch(self, columns: Dict[str, np.ndarray],
+                                         components: Optional[Dict[str, np.ndarray]] = None) -> np.ndarray:
+        """Calculate final composite merchandising scores for a whole catalog"""
+        composite_scores = self.calculate_weighted_scores_batch(columns, components)
+        return self._apply_boosts_and_cap(composite_scores, columns.get('name'))
+    
+    def calculate_weighted_scores_batch(self, columns: Dict[str, np.ndarray],
+                                        components: Optional[Dict[str, np.ndarray]] = None) -> np.ndarray:
+        """Weighted sum of the component scores, before seasonal boosts and the cap"""
+        weights = self.config.scoring_weights
+        if components is None:
+            components = self.calculate_component_scores_batch(columns)
+        
+        # Same operation order as calculate_composite_score
+        return (
+            components['sales_velocity'] * weights.sales_velocity +
+            components['profit_margin'] * weights.profit_margin +
+            components['inventory_health'] * weights.inventory_health +
+            components['brand_tier'] * weights.brand_tier +
+            components['engagement_score'] * weights.engagement_score
+        )
+    
+    def _apply_boosts_and_cap(self, composite_scores: np.ndarray, names: np.ndarray) -> np.ndarray:
+        """Apply seasonal boosts (if enabled) and the 100 cap to weighted scores"""
+        if self.config.seasonal_boost_enabled and self.seasonal_boosts:
+            composite_scores = composite_scores * self._seasonal_boost_multipliers(names)
+        
+        return np.minimum(composite_scores, 100)  # Cap at 100
+    
+    def _seasonal_boost_multipliers(self, names: np.ndarray) -> np.ndarray:
+        """Per-row seasonal boost multiplier (1.0 for products without a boost)"""
+        multipliers = np.ones(len(names), dtype=np.float64)
+        for product_name, boost in self.seasonal_boosts.items():
+            multipliers[names == product_name] = boost
+        return multipliers
+    
+    def filter_mask(self, catalog: ProductCatalog, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Boolean mask of catalog rows (or of the given `rows`, an index array or slice) passing the filtering criteria"""
+        criteria = self.config.filter_criteria
+        if rows is None:
+            # Range lookups on the catalog's sorted indexes, minus the blacklist bitmap
+            return catalog.filter_index.candidates(criteria) & ~self._blacklist_bitmap(catalog)
+        
+        mask = (
+            (catalog.days_inventory[rows] <= criteria.max_days_inventory) &
+            (catalog.profit_margin[rows] >= criteria.min_profit_margin) &
+            (catalog.views_last_month[rows] >= criteria.min_views_threshold)
+        )
+        if criteria.exclude_out_of_stock:
+            mask &= catalog.units_stock[rows] >= criteria.min_stock_units
+        
+        # Skip blacklisted products
+        return mask & ~self._blacklist_bitmap(catalog)[rows]
+    
+    def filter_failures(self, catalog: ProductCatalog) -> np.ndarray:
+        """Bitmask of FILTER_FAILURE_FLAGS for the filters each catalog row fails (0 passes)"""
+        criteria = self.config.filter_criteria
+        flags = self.FILTER_FAILURE_FLAGS
+        failures = np.zeros(len(catalog), dtype=np.uint8)
+        if criteria.exclude_out_of_stock:
+            failures[catalog.units_stock < criteria.min_stock_units] |= flags['low_stock']
+        failures[catalog.days_inventory > criteria.max_days_inventory] |= flags['aged_inventory']
+        failures[catalog.profit_margin < criteria.min_profit_margin] |= flags['low_margin']
+        failures[catalog.views_last_month < criteria.min_views_threshold] |= flags['low_views']
+        failures[self._blacklist_bitmap(catalog)] |= flags['blacklisted']
+        return failures
+    
+    def _blacklist_bitmap(self, catalog: ProductCatalog) -> np.ndarray:
+        """Bitmap of blacklisted catalog rows, rebuilt only when the blacklist changes"""
+        blacklist = frozenset(self.blacklisted_products)
+        if self._blacklist_cache is not None:
+            cached_catalog, cached_blacklist, bitmap = self._blacklist_cache
+            if cached_catalog is catalog and cached_blacklist == blacklist:
+                return bitmap
+        
+        bitmap = np.zeros(len(catalog), dtype=bool)
+        for product_name in blacklist:
+            bitmap[catalog.rows_for_name(product_name)] = True
+        self._blacklist_cache = (catalog, blacklist, bitmap)
+        return bitmap
+    
     def apply_filters(self, products: List[Product]) -> List[Product]:
         """Apply filtering criteria to products"""
+        if isinstance(products, ProductCatalog):
+            return [products[row] for row in np.flatnonzero(self.filter_mask(products)).tolist()]
+        
         filtered_products = []
         criteria = self.config.filter_criteria
         
@@ -94,61 +442,151 @@ class MerchandisingEngine:
             # Skip blacklisted products
             if product.name in self.blacklisted_products:
                 continue
-                
+            
             # Apply stock filter
             if criteria.exclude_out_of_stock and product.units_stock < criteria.min_stock_units:
                 continue
-                
+            
             # Apply inventory days filter
             if product.days_inventory > criteria.max_days_inventory:
                 continue
-                
+            
             # Apply profit margin filter
             if product.profit_margin < criteria.min_profit_margin:
                 continue
-                
+            
             # Apply views threshold filter
             if product.views_last_month < criteria.min_views_threshold:
                 continue
-                
+            
             filtered_products.append(product)
         
         return filtered_products
     
     def generate_rankings(self, products: List[Product]) -> List[Tuple[Product, float]]:
         """Generate ranked product list with scores"""
+        if isinstance(products, ProductCatalog):
+            return self._generate_catalog_rankings(products)
+        
         # Apply filters
-        filtered_products = self.apply_filters(products)
+        with self.stage_timer('filter') as span:
+            filtered_products = self.apply_filters(products)
+            span.set(products_in=len(products), candidates=len(filtered_products))
         
         # Calculate scores for all products
-        scored_products = []
-        for product in filtered_products:
-            score = self.calculate_composite_score(product)
-            scored_products.append((product, score))
+        with self.stage_timer('score'):
+            scored_products = []
+            for product in filtered_products:
+                score = self.calculate_composite_score(product)
+                scored_products.append((product, score))
         
-        # Sort by score (descending)
-        scored_products.sort(key=lambda x: x[1], reverse=True)
+        with self.stage_timer('sort'):
+            # Resolve overrides through a name index: best-scoring filtered product per name
+            override_candidates = {}
+            for product, score in scored_products:
+                if product.name in self.manual_overrides:
+                    if product.name not in override_candidates or score > override_candidates[product.name][1]:
+                        override_candidates[product.name] = (product, score)
+            
+            # Only the top max_products non-overridden products can be placed (stable, like a full sort)
+            ranked_products = heapq.nlargest(
+                self.config.max_products,
+                (item for item in scored_products if item[0].name not in self.manual_overrides),
+                key=lambda x: x[1]
+            )
         
-        # Apply manual overrides
-        final_rankings = []
-        override_positions = {}
+        with self.stage_timer('merge') as span:
+            span.set(overrides_requested=len(self.manual_overrides), overrides_applied=len(override_candidates))
+            return self._merge_overrides(ranked_products, override_candidates)
+    
+    @contextmanager
+    def stage_timer(self, stage: str):
+        """Time one ranking stage into RANKING_STAGE_SECONDS, and as a span when tracing"""
+        with RANKING_STAGE_SECONDS.labels(self.config.touchpoint_type.value, stage).time(), trace_span(stage) as span:
+            yield span
+    
+    def filter_funnel(self, catalog: ProductCatalog) -> Dict[str, int]:
+        """Products left after applying each filter criterion in turn (for traces)"""
+        failures = self.filter_failures(catalog)
+        remaining = np.ones(len(catalog), dtype=bool)
+        funnel = {'products_in': len(catalog)}
+        for flag_name, flag in self.FILTER_FAILURE_FLAGS.items():
+            remaining &= (failures & flag) == 0
+            funnel[f'after_{flag_name}'] = int(remaining.sum())
+        return funnel
+    
+    def record_candidates(self, catalog: ProductCatalog, candidate_rows: np.ndarray):
+        """Update the catalog size and candidate count gauges"""
+        CATALOG_PRODUCTS.set(len(catalog))
+        RANKING_CANDIDATES.labels(self.config.touchpoint_type.value).set(len(candidate_rows))
+    
+    def _generate_catalog_rankings(self, catalog: ProductCatalog) -> List[Tuple[Product, float]]:
+        """Columnar ranking path: score only filtered rows and select the top-K"""
+        with self.stage_timer('filter') as span:
+            candidate_rows = np.flatnonzero(self.filter_mask(catalog))
+            if tracing_enabled():
+                span.set(**self.filter_funnel(catalog), candidates=len(candidate_rows))
+        self.record_candidates(catalog, candidate_rows)
+        with self.stage_timer('score'):
+            scores = self.calculate_composite_scores_batch(
+                catalog.columns(candidate_rows, include_text=bool(self.seasonal_boosts))
+            )
+        return self.rank_candidates(catalog, candidate_rows, scores)
+    
+    def rank_candidates(self, catalog: ProductCatalog, candidate_rows: np.ndarray,
+                        scores: np.ndarray) -> List[Tuple[Product, float]]:
+        """Top-K selection and override merge for already filtered and scored rows"""
+        with self.stage_timer('sort'):
+            # Split candidates into overridden and algorithmic rows
+            overridden = np.zeros(len(catalog), dtype=bool)
+            for product_name in self.manual_overrides:
+                overridden[catalog.rows_for_name(product_name)] = True
+            is_override = overridden[candidate_rows]
+            
+            override_candidates = {}
+            for i in np.flatnonzero(is_override).tolist():
+                product_name = catalog.names[candidate_rows[i]]
+                if product_name not in override_candidates or scores[i] > override_candidates[product_name][1]:
+                    override_candidates[product_name] = (catalog[int(candidate_rows[i])], float(scores[i]))
+            
+            algorithmic = np.flatnonzero(~is_override)
+            top = algorithmic[top_k_indices(scores[algorithmic], self.config.max_products)]
+            ranked_products = [(catalog[int(candidate_rows[i])], float(scores[i])) for i in top.tolist()]
         
-        # First, place manually overridden products
+        with self.stage_timer('merge') as span:
+            span.set(overrides_requested=len(self.manual_overrides), overrides_applied=len(override_candidates))
+            return self._merge_overrides(ranked_products, override_candidates)
+    
+    def _override_positions(self, override_candidates: Dict[str, Tuple[Product, float]]) -> Dict[int, Tuple[Product, float]]:
+        """Map 0-based positions to pinned products.
+        
+        Overrides are placed in the order they were added; if a position is
+        already taken, the later override moves to the next free position
+        instead of silently replacing the earlier one.
+        """
+        override_positions = {}
         for product_name, position in self.manual_overrides.items():
-            for product, score in scored_products:
-                if product.name == product_name:
-                    override_positions[position] = (product, score)
-                    break
+            if product_name not in override_candidates:
+                continue
+            while position in override_positions:
+                position += 1
+            override_positions[position] = override_candidates[product_name]
+        return override_positions
+    
+    def _merge_overrides(self, ranked_products: List[Tuple[Product, float]],
+                         override_candidates: Dict[str, Tuple[Product, float]]) -> List[Tuple[Product, float]]:
+        """Merge pinned products into the algorithmic ranking"""
+        final_rankings = []
+        override_positions = self._override_positions(override_candidates)
         
-        # Then fill remaining positions with algorithmic rankings
+        # Fill positions with algorithmic rankings, stopping at pinned positions
         position = 0
-        for product, score in scored_products:
-            if product.name not in self.manual_overrides:
-                while position in override_positions:
-                    final_rankings.append(override_positions[position])
-                    position += 1
-                final_rankings.append((product, score))
+        for product, score in ranked_products:
+            while position in override_positions:
+                final_rankings.append(override_positions[position])
                 position += 1
+            final_rankings.append((product, score))
+            position += 1
             
             if len(final_rankings) >= self.config.max_products:
                 break
@@ -160,6 +598,138 @@ class MerchandisingEngine:
         
         return final_rankings[:self.config.max_products]
 
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, descending, ties in index order.
+    
+    Uses argpartition so only the selected block is sorted; the result is the
+    same as the first k entries of a stable descending sort.
+    """
+    if k <= 0 or len(scores) == 0:
+        return np.empty(0, dtype=np.int64)
+    if k < len(scores):
+        kth_score = scores[np.argpartition(scores, len(scores) - k)[len(scores) - k]]
+        # Keep every row tied with the k-th score so ties resolve by index
+        selected = np.flatnonzero(scores >= kth_score)
+    else:
+        selected = np.arange(len(scores))
+    return selected[np.argsort(-scores[selected], kind='stable')][:k]
+
+class MultiTouchpointRanker:
+    """Rank every touchpoint in one pass over a catalog.
+    
+    Component scores depend only on the product, so they are computed once for
+    the union of all touchpoints' candidates. Each touchpoint then weighs them
+    with calculate_weighted_scores_batch, the same operation order as
+    calculate_composite_score, so scores are bit-identical to ranking each
+    touchpoint on its own and share its cache entries safely.
+    """
+    
+    def __init__(self, engines: Dict[TouchpointType, MerchandisingEngine]):
+        self.engines = engines
+    
+    def generate_all_rankings(self, catalog: ProductCatalog) -> Dict[TouchpointType, List[Tuple[Product, float]]]:
+        """Generate rankings for every configured touchpoint"""
+        touchpoints = list(self.engines)
+        masks = np.vstack([self.engines[touchpoint].filter_mask(catalog) for touchpoint in touchpoints])
+        
+        # Score the union of candidates once
+        rows = np.flatnonzero(masks.any(axis=0))
+        columns = catalog.columns(rows)
+        components = self.engines[touchpoints[0]].calculate_component_scores_batch(columns)
+        
+        rankings = {}
+        for j, touchpoint in enumerate(touchpoints):
+            engine = self.engines[touchpoint]
+            local = np.flatnonzero(masks[j, rows])
+            weighted = engine.calculate_weighted_scores_batch(columns, {
+                component: scores[local] for component, scores in components.items()
+            })
+            scores = engine._apply_boosts_and_cap(weighted, columns['name'][local])
+            rankings[touchpoint] = engine.rank_candidates(catalog, rows[local], scores)
+        
+        return rankings
+
+class IncrementalRanker:
+    """Keep one touchpoint's ranking current under per-product metric updates.
+    
+    Stores every eligible row's composite score and a sorted list of
+    (-score, row) keys. An update re-scores and re-filters only the touched
+    rows and moves their keys in the list: finding a key is a binary search,
+    but inserting or deleting it shifts the tail, so each moved row costs
+    O(N) pointer moves (a memmove, far cheaper than rescoring the catalog).
+    Reading the ranking walks just the head of the list.
+    Blacklist changes are applied with update_rows on the affected rows;
+    weight, filter or boost changes require rebuild(); override changes are
+    picked up on the next read.
+    """
+    KEY_CHUNK_ROWS = 16_384
+    
+    def __init__(self, engine: MerchandisingEngine, catalog: ProductCatalog,
+                 candidates: Optional[Tuple[np.ndarray, np.ndarray]] = None):
+        """`candidates` optionally gives the eligible rows and their composite
+        scores for the current catalog (e.g. staged scores), so nothing is rescored"""
+        self.engine = engine
+        self.catalog = catalog
+        if candidates is None:
+            self.rebuild()
+        else:
+            self._load(*candidates)
+    
+    def rebuild(self):
+        """Rescore the whole catalog"""
+        rows = np.flatnonzero(self.engine.filter_mask(self.catalog))
+        self._load(rows, self.engine.calculate_composite_scores_batch(self.catalog.columns(rows)))
+    
+    def _load(self, rows: np.ndarray, scores: np.ndarray):
+        self.eligible = np.zeros(len(self.catalog), dtype=bool)
+        self.eligible[rows] = True
+        self.scores = np.full(len(self.catalog), np.nan)
+        self.scores[rows] = scores
+        
+        # Score descending, then row: the order of the (-score, row) keys, sorted in
+        # NumPy. The list is built in chunks so other threads get the GIL in between.
+        order = np.lexsort((rows, -scores))
+        negative_scores, rows = -scores[order], rows[order]
+        self._keys = []
+        for start in range(0, len(rows), self.KEY_CHUNK_ROWS):
+            chunk = slice(start, start + self.KEY_CHUNK_ROWS)
+            self._keys.extend(zip(negative_scores[chunk].tolist(), rows[chunk].tolist()))
+    
+    def update_rows(self, rows: List[int]):
+        """Re-score and re-filter rows whose metrics changed in the catalog"""
+        rows = np.asarray(rows, dtype=np.int64)
+        eligible = self.engine.filter_mask(self.catalog, rows)
+        scores = self.engine.calculate_composite_scores_batch(self.catalog.columns(rows))
+        
+        for row, is_eligible, score in zip(rows.tolist(), eligible.tolist(), scores.tolist()):
+            if self.eligible[row]:
+                del self._keys[bisect.bisect_left(self._keys, (-self.scores[row], row))]
+            
+            self.eligible[row] = is_eligible
+            self.scores[row] = score if is_eligible else np.nan
+            if is_eligible:
+                bisect.insort(self._keys, (-score, row))
+    
+    def current_rankings(self) -> List[Tuple[Product, float]]:
+        """Current ranking, identical to engine.generate_rankings(catalog)"""
+        manual_overrides = self.engine.manual_overrides
+        
+        override_candidates = {}
+        for product_name in manual_overrides:
+            for row in self.catalog.rows_for_name(product_name):
+                score = self.scores[row]
+                if self.eligible[row] and (product_name not in override_candidates or score > override_candidates[product_name][1]):
+                    override_candidates[product_name] = (self.catalog[row], float(score))
+        
+        ranked_products = []
+        for negative_score, row in self._keys:
+            if len(ranked_products) >= self.engine.config.max_products:
+                break
+            if self.catalog.names[row] not in manual_overrides:
+                ranked_products.append((self.catalog[row], -negative_score))
+        
+        return self.engine._merge_overrides(ranked_products, override_candidates)
+
 # Test the merchandising engine
 engine = MerchandisingEngine(TOUCHPOINT_CONFIGS[TouchpointType.HOMEPAGE_CAROUSEL])
 
@@ -172,4 +742,41 @@ for i, (product, score) in enumerate(homepage_rankings[:10]):
     print(f"{i+1:2d}. {product.name:<35} | Score: {score:5.1f} | Brand: {product.brand:<12} | Tier: {product.brand_tier} | Margin: {product.profit_margin:5.1f}%")
 
 print(f"\nTotal qualified products: {len(homepage_rankings)}")
-print(f"Products filtered out: {len(products) - len(homepage_rankings)}")
\ No newline at end of file
+print(f"Products filtered out: {len(products) - len(homepage_rankings)}")
+
+# Validate the batch scoring path against the scalar reference
+columns = products_to_columns(products)
+batch_components = engine.calculate_component_scores_batch(columns)
+batch_scores = engine.calculate_composite_scores_batch(columns, batch_components)
+scalar_scores = np.array([engine.calculate_composite_score(product) for product in products])
+
+print("\nBatch Scoring Validation:")
+print(f"   Composite scores identical to scalar path: {np.array_equal(batch_scores, scalar_scores)}")
+
+reference_df = pd.read_csv('all_scored_products.csv', float_precision='round_trip')
+batch_df = pd.DataFrame({
+    'Product Name': columns['name'],
+    'Brand': columns['brand'],
+    'Composite Score': batch_scores,
+    'Sales Velocity Score': batch_components['sales_velocity'],
+    'Profit Margin Score': batch_components['profit_margin'],
+    'Inventory Health Score': batch_components['inventory_health'],
+    'Brand Tier Score': batch_components['brand_tier'],
+    'Engagement Score': batch_components['engagement_score']
+})
+comparison = reference_df.merge(batch_df, on=['Product Name', 'Brand'], suffixes=('', ' (batch)'))
+print(f"   Products matched in all_scored_products.csv: {len(comparison)}/{len(reference_df)}")
+for column_name in batch_df.columns[2:]:
+    max_diff = (comparison[column_name] - comparison[f'{column_name} (batch)']).abs().max()
+    print(f"   {column_name:<24} max difference: {max_diff:.2e}")
+
+# The one-pass multi-touchpoint ranking must match ranking each touchpoint alone
+touchpoint_engines = {touchpoint: MerchandisingEngine(config) for touchpoint, config in TOUCHPOINT_CONFIGS.items()}
+touchpoint_engines[TouchpointType.HOMEPAGE_CAROUSEL].seasonal_boosts[homepage_rankings[0][0].name] = 1.07
+multi_rankings = MultiTouchpointRanker(touchpoint_engines).generate_all_rankings(products)
+multi_identical = all(
+    [(product.name, score) for product, score in multi_rankings[touchpoint]] ==
+    [(product.name, score) for product, score in touchpoint_engines[touchpoint].generate_rankings(products)]
+    for touchpoint in touchpoint_engines
+)
+print(f"   Multi-touchpoint scores identical to per-touchpoint ranking: {multi_identical}")
\ No newline at end of file
@@ -1,30 +1,991 @@
 # 4. API Layer and Override Management
-from flask import Flask, jsonify, request
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+from dataclasses import asdict, replace
 from datetime import datetime
+from functools import wraps
+from typing import Dict, List, Optional, Tuple
+import base64
+import gzip
+import hashlib
+import json
+import logging
+import threading
+import time
 import uuid
 
-class MerchandisingAPI:
+try:
+    import brotli
+except ImportError:  # Brotli variants are optional; gzip is always available
+    brotli = None
+
+# Fields of each ranked product: Product.to_dict plus the ranking columns
+RANKED_PRODUCT_FIELDS = (
+    'name', 'brand', 'brand_tier', 'price', 'cogs', 'profit_margin', 'conversion_rate',
+    'revenue_last_month', 'sell_through_rate', 'days_inventory', 'units_stock',
+    'views_last_month', 'volume_sold_last_month', 'position', 'merchandising_score', 'is_manual_override'
+)
+
+class EncodedResponse:
+    """A cached JSON response in its final wire encodings.
+    
+    The body is encoded and compressed once when rankings are cached, so
+    serving a hit is a lookup plus an ETag compare; the ETag is a hash of
+    the identity body, weak because compressed variants share it.
+    """
+    
+    def __init__(self, payload: dict):
+        self._payload = payload
+        self.body = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+        self.etag = f'W/"{hashlib.blake2b(self.body, digest_size=16).hexdigest()}"'
+        self.encodings = {'gzip': gzip.compress(self.body, compresslevel=6, mtime=0)}
+        if brotli is not None:
+            self.encodings['br'] = brotli.compress(self.body)
+        self._pretty_json = None
+        self._field_fragments = None
+    
+    @classmethod
+    def from_encoded(cls, body: bytes, encodings: Dict[str, bytes], etag: str) -> 'EncodedResponse':
+        """Rebuild from stored bytes; the payload dict is decoded on first use"""
+        response = cls.__new__(cls)
+        response._payload = None
+        response.body = body
+        response.etag = etag
+        response.encodings = encodings
+        response._pretty_json = None
+        response._field_fragments = None
+        return response
+    
+    @property
+    def payload(self) -> dict:
+        if self._payload is None:
+            self._payload = json.loads(self.body)
+        return self._payload
+    
+    def matches(self, if_none_match: Optional[str]) -> bool:
+        """Weak comparison against an If-None-Match header value"""
+        if not if_none_match:
+            return False
+        if if_none_match.strip() == '*':
+            return True
+        opaque_tag = self.etag[2:]
+        return any(tag.strip().removeprefix('W/') == opaque_tag for tag in if_none_match.split(','))
+    
+    def negotiate(self, accept_encoding: Optional[str]) -> Tuple[Optional[str], bytes]:
+        """Pick the best available content coding for an Accept-Encoding header"""
+        accepted = {}
+        for item in (accept_encoding or '').split(','):
+            coding, _, params = item.strip().partition(';')
+            quality = 1.0
+            if params.strip().startswith('q='):
+                try:
+                    quality = float(params.strip()[2:])
+                except ValueError:
+                    quality = 0.0
+            accepted[coding.strip().lower()] = quality
+        for coding in ('br', 'gzip'):
+            if coding in self.encodings and accepted.get(coding, accepted.get('*', 0)) > 0:
+                return coding, self.encodings[coding]
+        return None, self.body
+    
+    @property
+    def snapshot_id(self) -> str:
+        """Content hash identifying this exact ranking snapshot"""
+        return self.etag[3:-1]
+    
+    def field_fragments(self) -> Dict[str, List[str]]:
+        """Every product field pre-encoded as a '"field":value' JSON fragment,
+        built on first use so pages are assembled by joining strings"""
+        if self._field_fragments is None:
+            ranked_products = self.payload['products']
+            fields = list(ranked_products[0]) if ranked_products else []
+            self._field_fragments = {
+                field: [f'{json.dumps(field)}:{json.dumps(product_data[field])}' for product_data in ranked_products]
+                for field in fields
+            }
+        return self._field_fragments
+    
+    def page(self, offset: int, limit: int, fields: Optional[List[str]] = None,
+             next_cursor: Optional[str] = None) -> bytes:
+        """JSON body for products[offset:offset + limit] with only `fields`"""
+        fragments = self.field_fragments()
+        fields = list(fragments) if fields is None else fields
+        unknown = [field for field in fields if field not in RANKED_PRODUCT_FIELDS]
+        if unknown:
+            raise ValueError(f'Unknown fields: {", ".join(unknown)}')
+        
+        columns = [fragments[field] for field in fields if field in fragments]
+        stop = min(offset + limit, len(self.payload['products']))
+        items = ['{' + ','.join(column[i] for column in columns) + '}' for i in range(offset, stop)]
+        
+        header = {key: value for key, value in self.payload.items() if key != 'products'}
+        header.update({'offset': offset, 'limit': limit})
+        return (
+            json.dumps(header, separators=(',', ':'))[:-1] +
+            ',"products":[' + ','.join(items) + '],"next_cursor":' + json.dumps(next_cursor) + '}'
+        ).encode('utf-8')
+    
+    def pretty_json(self) -> str:
+        """Indented JSON text for exports, built on first use"""
+        if self._pretty_json is None:
+            self._pretty_json = json.dumps(self.payload, indent=2)
+        return self._pretty_json
+
+class CacheEntry:
+    """A cached rankings response with its soft and hard expiry (epoch seconds)
+    and the input fingerprint of the state it was built from"""
+    
+    __slots__ = ('response', 'expires_at', 'hard_expires_at', 'fingerprint')
+    
+    def __init__(self, response: EncodedResponse, expires_at: float, hard_expires_at: float,
+                 fingerprint: Optional[str] = None):
+        self.response = response
+        self.expires_at = expires_at
+        self.hard_expires_at = hard_expires_at
+        self.fingerprint = fingerprint
+    
+    @property
+    def nbytes(self) -> int:
+        return len(self.response.body) + sum(len(data) for data in self.response.encodings.values())
+    
+    def state(self, now: Optional[float] = None) -> str:
+        """'fresh', 'stale' (servable, refresh due) or 'expired'"""
+        now = time.time() if now is None else now
+        if now < self.expires_at:
+            return 'fresh'
+        if now < self.hard_expires_at:
+            return 'stale'
+        return 'expired'
+    
+    def to_bytes(self) -> bytes:
+        """Serialize for the shared tier: a JSON header line, then the bodies"""
+        bodies = {'identity': self.response.body, **self.response.encodings}
+        header = {
+            'etag': self.response.etag,
+            'expires_at': self.expires_at,
+            'hard_expires_at': self.hard_expires_at,
+            'fingerprint': self.fingerprint,
+            'sizes': {coding: len(data) for coding, data in bodies.items()}
+        }
+        return json.dumps(header).encode('utf-8') + b'\n' + b''.join(bodies.values())
+    
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'CacheEntry':
+        newline = data.index(b'\n')
+        header = json.loads(data[:newline])
+        bodies = {}
+        offset = newline + 1
+        for coding, size in header['sizes'].items():
+            bodies[coding] = data[offset:offset + size]
+            offset += size
+        response = EncodedResponse.from_encoded(bodies.pop('identity'), bodies, header['etag'])
+        return cls(response, header['expires_at'], header['hard_expires_at'], header.get('fingerprint'))
+
+class LRUCache:
+    """In-process cache tier bounded by entry count and encoded bytes.
+    
+    Thread-safe; hard-expired entries are dropped on access. Stale entries
+    are returned like fresh ones, since they are still servable.
+    """
+    
+    def __init__(self, max_entries: int = 256, max_bytes: int = 32 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._nbytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+    
+    def get(self, key: str) -> Optional[CacheEntry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.state() == 'expired':
+                self._remove(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+    
+    def peek(self, key: str) -> Optional[CacheEntry]:
+        """Look up without touching recency or counters"""
+        return self._entries.get(key)
+    
+    def set(self, key: str, entry: CacheEntry):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._nbytes += entry.nbytes
+            # Keep the newest entry even if it alone exceeds max_bytes
+            while len(self._entries) > 1 and (len(self._entries) > self.max_entries or self._nbytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+    
+    def mark_stale(self, key: str) -> bool:
+        entry = self._entries.get(key)
+        if entry is None:
+            return False
+        entry.expires_at = 0.0
+        return True
+    
+    def delete(self, key: str):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+    
+    def _remove(self, key: str):
+        self._nbytes -= self._entries.pop(key).nbytes
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    def stats(self) -> dict:
+        return {
+            'entries': len(self._entries),
+            'bytes': self._nbytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations
+        }
+
+class InMemoryRedis:
+    """Local stand-in for a Redis client, implementing the commands the
+    shared cache tier uses (GET, SET with PX/NX, DELETE, PTTL) with the
+    same signatures and return types as redis-py."""
+    
     def __init__(self):
+        self._data = {}
+        self._expiry = {}
+        self._lock = threading.Lock()
+    
+    def _expire(self, name: str):
+        if name in self._expiry and time.monotonic() >= self._expiry[name]:
+            del self._data[name]
+            del self._expiry[name]
+    
+    def get(self, name: str) -> Optional[bytes]:
+        with self._lock:
+            self._expire(name)
+            return self._data.get(name)
+    
+    def set(self, name: str, value: bytes, ex: Optional[int] = None, px: Optional[int] = None, nx: bool = False) -> Optional[bool]:
+        with self._lock:
+            self._expire(name)
+            if nx and name in self._data:
+                return None
+            self._data[name] = value
+            self._expiry.pop(name, None)
+            if ex is not None:
+                self._expiry[name] = time.monotonic() + ex
+            elif px is not None:
+                self._expiry[name] = time.monotonic() + px / 1000
+            return True
+    
+    def delete(self, *names: str) -> int:
+        with self._lock:
+            deleted = 0
+            for name in names:
+                self._expire(name)
+                if name in self._data:
+                    del self._data[name]
+                    self._expiry.pop(name, None)
+                    deleted += 1
+            return deleted
+    
+    def pttl(self, name: str) -> int:
+        with self._lock:
+            self._expire(name)
+            if name not in self._data:
+                return -2
+            if name not in self._expiry:
+                return -1
+            return int((self._expiry[name] - time.monotonic()) * 1000)
+
+class SharedCache:
+    """Cache tier shared by worker processes through a Redis-compatible client.
+    
+    Entries are stored serialized with a Redis TTL matching their hard
+    expiry, so one worker's rebuild serves every worker.
+    """
+    
+    def __init__(self, client, prefix: str = 'skinseoul:rankings:'):
+        self.client = client
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+    
+    def get(self, key: str) -> Optional[CacheEntry]:
+        try:
+            data = self.client.get(self.prefix + key)
+        except Exception:
+            self.errors += 1
+            return None
+        if data is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return CacheEntry.from_bytes(data)
+    
+    def set(self, key: str, entry: CacheEntry):
+        ttl_ms = int((entry.hard_expires_at - time.time()) * 1000)
+        if ttl_ms <= 0:
+            return
+        try:
+            self.client.set(self.prefix + key, entry.to_bytes(), px=ttl_ms)
+        except Exception:
+            self.errors += 1
+    
+    def mark_stale(self, key: str):
+        entry = self.get(key)
+        if entry is not None:
+            entry.expires_at = 0.0
+            self.set(key, entry)
+    
+    def delete(self, key: str):
+        try:
+            self.client.delete(self.prefix + key)
+        except Exception:
+            self.errors += 1
+    
+    def stats(self) -> dict:
+        return {'hits': self.hits, 'misses': self.misses, 'errors': self.errors}
+
+def connect_shared_cache(url: str, prefix: str = 'skinseoul:rankings:') -> SharedCache:
+    """Shared cache tier on a Redis server; requires the redis package"""
+    import redis
+    return SharedCache(redis.Redis.from_url(url), prefix=prefix)
+
+class TieredCache:
+    """In-process LRU tier in front of an optional shared tier.
+    
+    Local lookups never leave the process. A full lookup falls through to
+    the shared tier on a local miss or when the local copy is no longer
+    fresh, and keeps whichever entry expires later. Given a `fingerprint`,
+    a shared entry built from different inputs is never promoted.
+    """
+    
+    def __init__(self, local: Optional[LRUCache] = None, shared: Optional[SharedCache] = None):
+        self.local = local or LRUCache()
+        self.shared = shared
+    
+    def get(self, key: str, local_only: bool = False, fingerprint: Optional[str] = None) -> Optional[CacheEntry]:
+        entry = self.local.get(key)
+        if local_only or self.shared is None or (entry is not None and entry.state() == 'fresh'):
+            return entry
+        shared_entry = self.shared.get(key)
+        if shared_entry is not None and fingerprint is not None and shared_entry.fingerprint != fingerprint:
+            return entry
+        if shared_entry is not None and shared_entry.state() != 'expired':
+            if entry is None or shared_entry.expires_at > entry.expires_at:
+                self.local.set(key, shared_entry)
+                return shared_entry
+        return entry
+    
+    def peek(self, key: str) -> Optional[CacheEntry]:
+        return self.local.peek(key)
+    
+    def set(self, key: str, entry: CacheEntry):
+        self.local.set(key, entry)
+        if self.shared is not None:
+            self.shared.set(key, entry)
+    
+    def mark_stale(self, key: str) -> bool:
+        """Mark an entry stale in every tier; True if this process had it cached"""
+        if self.shared is not None:
+            self.shared.mark_stale(key)
+        return self.local.mark_stale(key)
+    
+    def delete(self, key: str):
+        self.local.delete(key)
+        if self.shared is not None:
+            self.shared.delete(key)
+    
+    def __len__(self):
+        return len(self.local)
+    
+    def stats(self) -> dict:
+        return {
+            'local': self.local.stats(),
+            'shared': self.shared.stats() if self.shared is not None else None
+        }
+
+class CursorExpiredError(ValueError):
+    """A pagination cursor refers to a ranking snapshot that is no longer kept"""
+
+def encode_cursor(snapshot_id: str, offset: int) -> str:
+    return base64.urlsafe_b64encode(f'{snapshot_id}:{offset}'.encode('ascii')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    try:
+        snapshot_id, offset = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('ascii').split(':')
+        offset = int(offset)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError(f'Invalid cursor: {cursor}')
+    if offset < 0:
+        raise ValueError(f'Invalid cursor offset: {offset}')
+    return snapshot_id, offset
+
+def _synchronized(method):
+    """Run a MerchandisingAPI method with exclusive access: every touchpoint
+    lock, then the catalog lock"""
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._exclusive():
+            return method(self, *args, **kwargs)
+    return wrapper
+
+def _touchpoint_synchronized(method):
+    """Run a MerchandisingAPI method under the lock of its touchpoint argument only"""
+    @wraps(method)
+    def wrapper(self, touchpoint, *args, **kwargs):
+        with self._touchpoint_locks[touchpoint]:
+            return method(self, touchpoint, *args, **kwargs)
+    return wrapper
+
+class MerchandisingAPI:
+    STATE_FACETS = ('weights', 'filters', 'overrides', 'blacklist', 'boosts')
+    
+    def __init__(self, catalog: Optional[ProductCatalog] = None, cache: Optional[TieredCache] = None):
+        self.products = products if catalog is None else catalog
         self.engines = {}
-        self.cache = {}
-        self.cache_expiry = {}
+        self.cache = cache if cache is not None else TieredCache()  # cache key -> CacheEntry with soft and hard TTLs
+        self.rankers = {}  # touchpoint -> IncrementalRanker, built from staged scores once metric updates arrive
+        self._metric_updates = False  # Set by the first update_product_metrics
+        
+        # Versioned touchpoint state: each facet's counter is bumped when it
+        # changes, and their sum is the config_version reported in responses
+        self.state_versions = {
+            touchpoint_type: dict.fromkeys(self.STATE_FACETS, 0) for touchpoint_type in TOUCHPOINT_CONFIGS
+        }
+        self._latest_cache_keys = {}  # touchpoint -> key of the newest cached response, served stale across versions
+        self._component_scores = None  # Component scores of every catalog row, shared by all touchpoints
+        self._data_version = 0  # Bumped when product metrics change
+        self._row_fingerprints = None  # Per-row content hashes of the data derived state was built from
+        self._row_digest_sum = 0  # Sum of the per-row digest terms, patched as rows change
+        self._catalog_digest = None  # Kept current by every catalog write, so readers never hash
+        self._input_fingerprints = {}  # touchpoint -> ((catalog digest, state versions), fingerprint)
+        self._scored_candidates = {}  # touchpoint -> (stage key, candidate rows, scores)
+        self._snapshots = OrderedDict()  # snapshot id -> EncodedResponse, recent rankings that cursors page through
+        self._snapshots_guard = threading.Lock()
+        
+        # A touchpoint's rebuilds and state changes hold its lock, so touchpoints
+        # rebuild concurrently. The catalog lock guards catalog-wide derived
+        # state and is only held briefly; catalog changes take every lock.
+        # Lock order: touchpoint locks in TOUCHPOINT_CONFIGS order, then the
+        # catalog lock. Cache reads take none.
+        self._touchpoint_locks = {touchpoint_type: threading.RLock() for touchpoint_type in TOUCHPOINT_CONFIGS}
+        self._lock = threading.RLock()
+        self._refreshing = set()  # Touchpoints with a background refresh queued or running
+        self._refresh_guard = threading.Lock()
+        self._refresh_executor = ThreadPoolExecutor(max_workers=len(TOUCHPOINT_CONFIGS), thread_name_prefix='rankings-refresh')
+        self.logger = logging.getLogger('MerchandisingAPI')
+        self.profiler = SamplingProfiler()  # Profiles a configurable fraction of rebuilds
         
         # Initialize engines for each touchpoint
         for touchpoint_type, config in TOUCHPOINT_CONFIGS.items():
             self.engines[touchpoint_type] = MerchandisingEngine(config)
+        self._set_row_fingerprints(self.products.row_fingerprints())
     
     def get_rankings(self, touchpoint: TouchpointType, force_refresh: bool = False) -> dict:
-        """Get rankings for a specific touchpoint with caching"""
-        cache_key = f"{touchpoint.value}_rankings"
+        """Get rankings for a specific touchpoint with caching.
+        
+        Stale rankings (past the soft TTL) are returned immediately while a
+        single background refresh runs. Only a missing or hard-expired entry,
+        or force_refresh, makes the caller wait, and concurrent waiters share
+        one rebuild.
+        """
+        return self.get_encoded_rankings(touchpoint, force_refresh).payload
+    
+    def get_encoded_rankings(self, touchpoint: TouchpointType, force_refresh: bool = False) -> EncodedResponse:
+        """Rankings for a touchpoint as a pre-encoded response (see get_rankings)"""
+        if not force_refresh:
+            with trace_span('cache_lookup'):
+                response = self.get_cached_encoded_rankings(touchpoint)
+            if response is not None:
+                return response
+        
+        touchpoint_lock = self._touchpoint_locks[touchpoint]
+        with trace_span('lock_wait'):
+            touchpoint_lock.acquire()
+        try:
+            # Another caller, or another worker through the shared tier, may
+            # have rebuilt while this one waited for the lock
+            if not force_refresh:
+                _, entry = self._cache_lookup(touchpoint)
+                if entry is not None and entry.state() == 'fresh':
+                    return entry.response
+            return self._rebuild_rankings(touchpoint, force_refresh)
+        finally:
+            touchpoint_lock.release()
+    
+    def _rebuild_rankings(self, touchpoint: TouchpointType, force_refresh: bool = False) -> EncodedResponse:
+        """Generate and cache fresh rankings; the caller holds the touchpoint's lock"""
+        with self.profiler.profile(f'rebuild-{touchpoint.value}'), trace_span('rebuild', forced=force_refresh) as span:
+            # A forced refresh also rescores incrementally maintained rankings
+            if force_refresh:
+                self.rankers.pop(touchpoint, None)
+                self._scored_candidates.pop(touchpoint, None)
+                with self._lock:
+                    self._component_scores = None
+                    fingerprints = self.products.row_fingerprints()
+                    if not np.array_equal(fingerprints, self._row_fingerprints):
+                        self._set_row_fingerprints(fingerprints)
+                        self._data_version += 1
+            if touchpoint in self.rankers:
+                span.set(path='incremental')
+                rankings = self.rankers[touchpoint].current_rankings()
+            else:
+                span.set(path='staged')
+                rankings = self._staged_rankings(touchpoint)
+                if self._metric_updates:
+                    # Keep re-ranking incrementally from the scores just staged
+                    _, candidate_rows, scores = self._scored_candidates[touchpoint]
+                    self.rankers[touchpoint] = IncrementalRanker(self.engines[touchpoint], self.products, (candidate_rows, scores))
+            return self._cache_rankings(touchpoint, rankings)
+    
+    def _staged_rankings(self, touchpoint: TouchpointType) -> List[Tuple[Product, float]]:
+        """Rank a touchpoint, redoing only the stages its state changes invalidated.
+        
+        Component scores are kept for the whole catalog and shared by every
+        touchpoint. Filtered candidates and their composite scores are kept per
+        touchpoint, keyed by the state versions they depend on, so an override
+        change only redoes the top-K selection and merge. Same result as
+        engine.generate_rankings(catalog).
+        """
+        engine = self.engines[touchpoint]
+        versions = self.state_versions[touchpoint]
+        stage_key = (versions['weights'], versions['filters'], versions['blacklist'], versions['boosts'], self._data_version)
+        
+        cached = self._scored_candidates.get(touchpoint)
+        if cached is not None and cached[0] == stage_key:
+            _, candidate_rows, scores = cached
+            current_span().set(reused_scores=True, candidates=len(candidate_rows))
+        else:
+            with engine.stage_timer('filter') as span:
+                candidate_rows = np.flatnonzero(engine.filter_mask(self.products))
+                if tracing_enabled():
+                    span.set(**engine.filter_funnel(self.products), candidates=len(candidate_rows))
+            engine.record_candidates(self.products, candidate_rows)
+            with engine.stage_timer('score'):
+                components = {
+                    component: scores[candidate_rows] for component, scores in self._catalog_component_scores().items()
+                }
+                weighted_scores = engine.calculate_weighted_scores_batch(None, components)
+                names = self.products.names[candidate_rows] if engine.seasonal_boosts else None
+                scores = engine._apply_boosts_and_cap(weighted_scores, names)
+            self._scored_candidates[touchpoint] = (stage_key, candidate_rows, scores)
+        
+        return engine.rank_candidates(self.products, candidate_rows, scores)
+    
+    def _catalog_component_scores(self) -> Dict[str, np.ndarray]:
+        """Component scores of every catalog row, computed once and patched on updates"""
+        component_scores = self._component_scores
+        if component_scores is not None:
+            return component_scores
+        with self._lock:
+            if self._component_scores is None:
+                engine = next(iter(self.engines.values()))
+                self._component_scores = engine.calculate_component_scores_batch(self.products.columns(include_text=False))
+            return self._component_scores
+    
+    def catalog_fingerprint(self) -> str:
+        """Content hash of the catalog data the current rankings are built from.
+        
+        A plain attribute read: catalog writes keep the digest current under
+        the locks they hold, so cache readers never hash or wait.
+        """
+        return self._catalog_digest
+    
+    @staticmethod
+    def _row_digest_terms(rows: np.ndarray, fingerprints: np.ndarray) -> np.ndarray:
+        """Each row's term of the catalog digest: its fingerprint mixed with its position"""
+        terms = fingerprints ^ (rows.astype(np.uint64) * np.uint64(0x9e3779b97f4a7c15))
+        terms ^= terms >> np.uint64(30)
+        terms *= np.uint64(0xbf58476d1ce4e5b9)
+        terms ^= terms >> np.uint64(27)
+        terms *= np.uint64(0x94d049bb133111eb)
+        terms ^= terms >> np.uint64(31)
+        return terms
+    
+    def _set_row_fingerprints(self, fingerprints: np.ndarray):
+        """Rebuild the catalog digest from scratch; the caller holds the catalog lock or has exclusive access"""
+        self._row_fingerprints = fingerprints
+        self._row_digest_sum = int(self._row_digest_terms(np.arange(len(fingerprints)), fingerprints).sum())
+        self._publish_catalog_digest()
+    
+    def _update_row_fingerprints(self, rows: np.ndarray):
+        """Patch the fingerprints and digest for changed rows in O(len(rows)); the caller has exclusive access"""
+        rows = np.asarray(rows, dtype=np.int64)
+        fingerprints = self.products.row_fingerprints(rows)
+        removed = int(self._row_digest_terms(rows, self._row_fingerprints[rows]).sum())
+        added = int(self._row_digest_terms(rows, fingerprints).sum())
+        self._row_fingerprints[rows] = fingerprints
+        self._row_digest_sum = (self._row_digest_sum - removed + added) % 2 ** 64
+        self._publish_catalog_digest()
+    
+    def _publish_catalog_digest(self):
+        digest = hashlib.blake2b(self._row_digest_sum.to_bytes(8, 'little'), digest_size=16)
+        digest.update(json.dumps([
+            len(self._row_fingerprints), self.products.brand_categories.tolist(), self.products.brand_tier_categories.tolist()
+        ]).encode())
+        self._catalog_digest = digest.hexdigest()  # One assignment, so readers see the old or the new digest
+    
+    def input_fingerprint(self, touchpoint: TouchpointType) -> str:
+        """Content hash of everything a touchpoint's rankings depend on: catalog
+        data, touchpoint config, overrides, blacklist and seasonal boosts.
+        
+        Unlike config_version it is derived from content, so it is the same
+        in every worker and survives restarts; it is part of the cache key.
+        Memoized until the catalog digest or a state version changes.
+        """
+        memo_key = (self.catalog_fingerprint(), tuple(self.state_versions[touchpoint].values()))
+        memo = self._input_fingerprints.get(touchpoint)
+        if memo is not None and memo[0] == memo_key:
+            return memo[1]
+        
+        engine = self.engines[touchpoint]
+        inputs = {
+            'catalog': self.catalog_fingerprint(),
+            'config': asdict(engine.config),
+            'overrides': dict(engine.manual_overrides),  # Copies, as lock-free readers call this too
+            'blacklist': sorted(engine.blacklisted_products),
+            'boosts': dict(engine.seasonal_boosts)
+        }
+        fingerprint = hashlib.blake2b(json.dumps(inputs, sort_keys=True, default=str).encode(), digest_size=16).hexdigest()
+        self._input_fingerprints[touchpoint] = (memo_key, fingerprint)
+        return fingerprint
+    
+    def refresh_if_changed(self, touchpoint: TouchpointType) -> dict:
+        """Rebuild a touchpoint's rankings only if their inputs changed.
+        
+        The catalog is re-fingerprinted first, so edits made directly on the
+        catalog are picked up and only the changed rows are re-scored. If
+        rankings for the current input fingerprint are cached, they just get
+        a new TTL. Otherwise the newest cached response tells whether the
+        catalog data or the touchpoint state changed. Only the touchpoint's own lock is held
+        while it rebuilds, so a slow touchpoint does not hold up refreshes of
+        the others. Returns what was done and why.
+        """
+        changed_rows = self._sync_catalog_changes()
+        with self._touchpoint_locks[touchpoint]:
+            return self._refresh_touchpoint_if_changed(touchpoint, changed_rows)
+    
+    def _refresh_touchpoint_if_changed(self, touchpoint: TouchpointType, changed_rows: np.ndarray) -> dict:
+        """refresh_if_changed after the catalog sync; the caller holds the touchpoint's lock"""
+        self._input_fingerprints.pop(touchpoint, None)  # Recompute in case state was edited directly
+        fingerprint = self.input_fingerprint(touchpoint)
+        
+        # The cache key holds the input fingerprint, so a hit means nothing changed
+        _, entry = self._cache_lookup(touchpoint)
+        if entry is not None:
+            self._store_response(touchpoint, entry.response)
+            return {
+                'status': 'skipped',
+                'reason': 'inputs unchanged',
+                'changed_products': 0,
+                'input_fingerprint': fingerprint
+            }
+        
+        previous_key = self._latest_cache_keys.get(touchpoint)
+        previous = self.cache.get(previous_key) if previous_key is not None else None
+        if previous is None:
+            reason = 'no cached rankings'
+        elif previous.response.payload.get('catalog_fingerprint') != self.catalog_fingerprint():
+            reason = f'{len(changed_rows)} catalog rows changed' if len(changed_rows) else 'catalog data changed'
+        else:
+            reason = 'touchpoint state changed'
+        
+        self._rebuild_rankings(touchpoint)
+        return {
+            'status': 'refreshed',
+            'reason': reason,
+            'changed_products': len(changed_rows),
+            'input_fingerprint': fingerprint
+        }
+    
+    def _sync_catalog_changes(self) -> np.ndarray:
+        """Re-fingerprint the catalog and patch derived state for rows that
+        changed since it was built.
         
-        # Check cache validity
-        if not force_refresh and cache_key in self.cache:
-            if datetime.now() < self.cache_expiry.get(cache_key, datetime.min):
-                return self.cache[cache_key]
+        The comparison holds only the catalog lock; exclusive access is taken
+        when rows did change. Must not be called with a touchpoint lock held.
+        """
+        with self._lock:
+            if np.array_equal(self._row_fingerprints, self.products.row_fingerprints()):
+                return np.empty(0, dtype=np.int64)
         
-        # Generate fresh rankings
+        with self._exclusive():
+            return self._apply_catalog_changes()
+    
+    def _apply_catalog_changes(self) -> np.ndarray:
+        """Patch derived state for changed catalog rows; the caller has exclusive access"""
+        current = self.products.row_fingerprints()
+        previous = self._row_fingerprints
+        if len(previous) == len(current):
+            changed_rows = np.flatnonzero(previous != current)
+            if len(changed_rows):
+                self._apply_row_changes(changed_rows)
+            return changed_rows
+        
+        # The catalog was resized or replaced: nothing derived can be reused
+        self._component_scores = None
+        self._scored_candidates.clear()
+        self.rankers.clear()
+        self._data_version += 1
+        self._set_row_fingerprints(current)
+        return np.arange(len(current))
+    
+    def _apply_row_changes(self, rows):
+        """Patch shared scores, fingerprints and incremental rankers for catalog
+        rows whose metrics changed; the caller has exclusive access"""
+        if self._component_scores is not None:
+            engine = next(iter(self.engines.values()))
+            updated = engine.calculate_component_scores_batch(self.products.columns(rows, include_text=False))
+            for component, scores in updated.items():
+                self._component_scores[component][rows] = scores
+        self._update_row_fingerprints(rows)
+        self._data_version += 1  # Staged candidates depend on the data
+        
+        # Re-ranking row by row only pays off for small change sets
+        if len(rows) > max(1, len(self.products) // 8):
+            self.rankers.clear()
+        for ranker in self.rankers.values():
+            ranker.update_rows(rows)
+    
+    @_synchronized
+    def update_product_metrics(self, product_name: str, **changes) -> dict:
+        """Apply a metric update (stock, views, sales, price, COGS) to one product
+        and re-rank it incrementally on every touchpoint.
+        
+        Responses are not re-encoded here: cached touchpoints are refreshed in
+        the background from their incremental rankers, and readers get the
+        previous version until then. A touchpoint without a ranker gets one
+        at that refresh, from its staged scores and under its own lock only."""
+        rows = self.products.rows_for_name(product_name)
+        if not rows:
+            return {
+                'status': 'error',
+                'message': f'Product not found: {product_name}'
+            }
+        
+        try:
+            for row in rows:
+                self.products.update_product(row, **changes)
+        except ValueError as e:
+            return {
+                'status': 'error',
+                'message': str(e)
+            }
+        
+        self._apply_row_changes(rows)
+        self._metric_updates = True
+        for touchpoint in self.engines:
+            if touchpoint in self._latest_cache_keys:
+                self._schedule_refresh(touchpoint)
+        
+        return {
+            'status': 'success',
+            'message': f'Metrics updated for {product_name}',
+            'updated_fields': sorted(changes)
+        }
+    
+    def get_cached_rankings(self, touchpoint: TouchpointType, local_only: bool = False) -> Optional[dict]:
+        """Cached rankings if fresh or stale, without ever waiting for a rebuild.
+        Serving a stale entry schedules its background refresh."""
+        response = self.get_cached_encoded_rankings(touchpoint, local_only)
+        return None if response is None else response.payload
+    
+    def get_cached_encoded_rankings(self, touchpoint: TouchpointType, local_only: bool = False) -> Optional[EncodedResponse]:
+        """Pre-encoded counterpart of get_cached_rankings; with local_only the
+        shared tier is not consulted, so the lookup never leaves the process"""
+        cache_key, entry = self._cache_lookup(touchpoint, local_only)
+        if entry is None:
+            # After a state change, the previous version is served until the new one is built
+            previous_key = self._latest_cache_keys.get(touchpoint)
+            if previous_key is not None and previous_key != cache_key:
+                entry = self.cache.get(previous_key, local_only=local_only)
+            if entry is None or entry.state() == 'expired':
+                self._count_lookup(touchpoint, 'miss')
+                return None
+            state = 'stale'
+        else:
+            state = entry.state()
+        
+        if state == 'expired':
+            self._count_lookup(touchpoint, 'miss')
+            return None
+        self._count_lookup(touchpoint, 'hit' if state == 'fresh' else 'stale')
+        if state == 'stale':
+            self._schedule_refresh(touchpoint)
+        return entry.response
+    
+    def _count_lookup(self, touchpoint: TouchpointType, result: str):
+        RANKINGS_CACHE_REQUESTS.labels(touchpoint.value, result).inc()
+        current_span().set(result=result)
+    
+    def cache_state(self, touchpoint: TouchpointType) -> str:
+        """'fresh', 'stale' (servable, refresh due), 'expired' or 'missing'
+        for this process's cached copy"""
+        cache_key = self.cache_key(touchpoint)
+        entry = self.cache.peek(cache_key)
+        if entry is not None:
+            return entry.state()
+        
+        previous_key = self._latest_cache_keys.get(touchpoint)
+        previous_entry = self.cache.peek(previous_key) if previous_key not in (None, cache_key) else None
+        if previous_entry is not None and previous_entry.state() != 'expired':
+            return 'stale'
+        return 'missing'
+    
+    MAX_SNAPSHOTS = 32
+    SNAPSHOT_TTL_SECONDS = 3600  # How long the shared tier keeps snapshots for cursors from other workers
+    
+    def get_rankings_page(self, touchpoint: TouchpointType, cursor: Optional[str] = None, limit: int = 20,
+                          fields: Optional[List[str]] = None, local_only: bool = False) -> Optional[bytes]:
+        """One page of rankings as JSON bytes, with only the requested product fields.
+        
+        Without a cursor the page starts at the current rankings; the returned
+        next_cursor pins that snapshot, so later pages stay consistent even if
+        rankings are rebuilt meanwhile. Snapshots are also kept in the shared
+        cache tier, so a cursor can be followed on any worker. Pages are
+        assembled from pre-encoded field fragments. Raises ValueError for bad
+        fields or cursors and CursorExpiredError once a snapshot has aged out
+        of every tier. With local_only, returns None instead of waiting for a
+        rebuild or a shared-tier lookup.
+        """
+        if limit < 1:
+            raise ValueError(f'Limit must be positive, got {limit}')
+        if cursor is None:
+            snapshot, offset = self.get_cached_encoded_rankings(touchpoint, local_only), 0
+            if snapshot is None:
+                if local_only:
+                    return None
+                snapshot = self.get_encoded_rankings(touchpoint)
+            self._remember_snapshot(snapshot)
+        else:
+            snapshot_id, offset = decode_cursor(cursor)
+            snapshot = self._snapshots.get(snapshot_id)
+            if snapshot is None:
+                if local_only:
+                    return None
+                snapshot = self._shared_snapshot(snapshot_id)
+            if snapshot is None:
+                raise CursorExpiredError(f'Rankings snapshot {snapshot_id} has expired; restart from the first page')
+        
+        next_offset = offset + limit
+        next_cursor = encode_cursor(snapshot.snapshot_id, next_offset) if next_offset < len(snapshot.payload['products']) else None
+        return snapshot.page(offset, limit, fields, next_cursor)
+    
+    def _remember_snapshot(self, encoded: EncodedResponse, share: bool = False):
+        """Keep a snapshot for cursors; with share, also publish it to the shared tier"""
+        with self._snapshots_guard:
+            self._snapshots[encoded.snapshot_id] = encoded
+            self._snapshots.move_to_end(encoded.snapshot_id)
+            while len(self._snapshots) > self.MAX_SNAPSHOTS:
+                self._snapshots.popitem(last=False)
+        if share and self.cache.shared is not None:
+            expires_at = time.time() + self.SNAPSHOT_TTL_SECONDS
+            self.cache.shared.set(f'snapshot_{encoded.snapshot_id}', CacheEntry(encoded, expires_at, expires_at))
+    
+    def _shared_snapshot(self, snapshot_id: str) -> Optional[EncodedResponse]:
+        """A snapshot another worker published, or None"""
+        if self.cache.shared is None:
+            return None
+        entry = self.cache.shared.get(f'snapshot_{snapshot_id}')
+        if entry is None or entry.response.snapshot_id != snapshot_id:
+            return None
+        self._remember_snapshot(entry.response)
+        return entry.response
+    
+    @contextmanager
+    def _exclusive(self):
+        """Every touchpoint lock, in a fixed order, then the catalog lock"""
+        with ExitStack() as stack:
+            for touchpoint_lock in self._touchpoint_locks.values():
+                stack.enter_context(touchpoint_lock)
+            stack.enter_context(self._lock)
+            yield
+    
+    def config_version(self, touchpoint: TouchpointType) -> int:
+        """Monotonically increasing version of a touchpoint's effective state"""
+        return sum(self.state_versions[touchpoint].values())
+    
+    def cache_key(self, touchpoint: TouchpointType) -> str:
+        """Cache key for a touchpoint's current state. It embeds the input
+        fingerprint, so workers share an entry only if their inputs match"""
+        return self._fingerprint_key(touchpoint, self.input_fingerprint(touchpoint))
+    
+    @staticmethod
+    def _fingerprint_key(touchpoint: TouchpointType, fingerprint: str) -> str:
+        return f"{touchpoint.value}_rankings_{fingerprint}"
+    
+    def _cache_lookup(self, touchpoint: TouchpointType, local_only: bool = False) -> Tuple[str, Optional[CacheEntry]]:
+        """Cache key and entry for a touchpoint's current state"""
+        fingerprint = self.input_fingerprint(touchpoint)
+        cache_key = self._fingerprint_key(touchpoint, fingerprint)
+        return cache_key, self.cache.get(cache_key, local_only=local_only, fingerprint=fingerprint)
+    
+    def is_refreshing(self, touchpoint: TouchpointType) -> bool:
+        """Whether a background refresh is queued or running for a touchpoint"""
+        return touchpoint in self._refreshing
+    
+    def _schedule_refresh(self, touchpoint: TouchpointType):
+        """Queue a background refresh unless one is already pending (single-flight)"""
+        with self._refresh_guard:
+            if touchpoint in self._refreshing:
+                return
+            self._refreshing.add(touchpoint)
+        self._refresh_executor.submit(self._background_refresh, touchpoint)
+    
+    def _background_refresh(self, touchpoint: TouchpointType):
+        try:
+            with self._touchpoint_locks[touchpoint]:
+                _, entry = self._cache_lookup(touchpoint)
+                if entry is None or entry.state() != 'fresh':
+                    self._rebuild_rankings(touchpoint)
+        except Exception:
+            self.logger.exception(f"Background refresh failed for {touchpoint.value}")
+        finally:
+            with self._refresh_guard:
+                self._refreshing.discard(touchpoint)
+    
+    def get_traced_rankings(self, touchpoint: TouchpointType, force_refresh: bool = False) -> dict:
+        """get_rankings with a span tree of where the time went (cache lookup,
+        lock wait, filter funnel, scoring, override merge, serialization)"""
+        with trace_rankings(f'get_rankings:{touchpoint.value}') as trace:
+            rankings = self.get_encoded_rankings(touchpoint, force_refresh).payload
+        return {'trace': trace.to_dict(), 'rankings': rankings}
+    
+    @_synchronized
+    def refresh_all_rankings(self) -> Dict[TouchpointType, dict]:
+        """Regenerate and cache rankings for every touchpoint in one scoring pass"""
+        all_rankings = MultiTouchpointRanker(self.engines).generate_all_rankings(self.products)
+        return {
+            touchpoint: self._cache_rankings(touchpoint, rankings).payload
+            for touchpoint, rankings in all_rankings.items()
+        }
+    
+    def _cache_rankings(self, touchpoint: TouchpointType, rankings: List[Tuple[Product, float]]) -> EncodedResponse:
+        """Build the rankings response for a touchpoint, encode it and cache it"""
+        with trace_span('serialize', products=len(rankings)) as span:
+            encoded = self._encode_rankings(touchpoint, rankings)
+            span.set(bytes=len(encoded.body))
+        self._store_response(touchpoint, encoded)
+        return encoded
+    
+    def _encode_rankings(self, touchpoint: TouchpointType, rankings: List[Tuple[Product, float]]) -> EncodedResponse:
+        """Rankings response for a touchpoint in its wire encodings"""
         engine = self.engines[touchpoint]
-        rankings = engine.generate_rankings(products)
         
         # Prepare response
         response = {
@@ -32,6 +993,9 @@ class MerchandisingAPI:
             'generated_at': datetime.now().isoformat(),
             'total_products': len(rankings),
             'max_products': engine.config.max_products,
+            'config_version': self.config_version(touchpoint),
+            'input_fingerprint': self.input_fingerprint(touchpoint),
+            'catalog_fingerprint': self.catalog_fingerprint(),
             'products': []
         }
         
@@ -44,22 +1008,37 @@ class MerchandisingAPI:
             })
             response['products'].append(product_data)
         
-        # Cache the response
-        cache_duration = timedelta(hours=engine.config.refresh_interval_hours)
-        self.cache[cache_key] = response
-        self.cache_expiry[cache_key] = datetime.now() + cache_duration
-        
-        return response
+        return EncodedResponse(response)
+    
+    def _store_response(self, touchpoint: TouchpointType, encoded: EncodedResponse):
+        """Cache an encoded response; the entry lives until the hard TTL so it can be served stale"""
+        config = self.engines[touchpoint].config
+        soft_ttl = config.refresh_interval_hours * 3600
+        hard_ttl = max(soft_ttl, config.cache_hard_ttl_hours * 3600)
+        now = time.time()
+        fingerprint = encoded.payload['input_fingerprint']
+        cache_key = self._fingerprint_key(touchpoint, fingerprint)  # Keyed by the state the response was built from
+        self.cache.set(cache_key, CacheEntry(encoded, now + soft_ttl, now + hard_ttl, fingerprint))
+        self._latest_cache_keys[touchpoint] = cache_key
+        self._remember_snapshot(encoded, share=True)
+    
+    def _invalidate_rankings(self, touchpoint: TouchpointType, *facets: str):
+        """Bump the versions of changed facets of a touchpoint's state and rebuild
+        in the background; readers keep getting the previous version meanwhile,
+        and the rebuild reuses every stage the facets do not affect"""
+        for facet in facets:
+            self.state_versions[touchpoint][facet] += 1
+        if touchpoint in self._latest_cache_keys:
+            self._schedule_refresh(touchpoint)
     
+    @_touchpoint_synchronized
     def add_manual_override(self, touchpoint: TouchpointType, product_name: str, position: int) -> dict:
         """Add manual override for product positioning"""
         engine = self.engines[touchpoint]
         engine.manual_overrides[product_name] = position - 1  # Convert to 0-based index
         
-        # Clear cache to force refresh
-        cache_key = f"{touchpoint.value}_rankings"
-        if cache_key in self.cache:
-            del self.cache[cache_key]
+        # New config version; scored candidates are reused, only the merge is redone
+        self._invalidate_rankings(touchpoint, 'overrides')
         
         return {
             'status': 'success',
@@ -67,16 +1046,15 @@ class MerchandisingAPI:
             'touchpoint': touchpoint.value
         }
     
+    @_touchpoint_synchronized
     def remove_manual_override(self, touchpoint: TouchpointType, product_name: str) -> dict:
         """Remove manual override for product"""
         engine = self.engines[touchpoint]
         if product_name in engine.manual_overrides:
             del engine.manual_overrides[product_name]
             
-            # Clear cache to force refresh
-            cache_key = f"{touchpoint.value}_rankings"
-            if cache_key in self.cache:
-                del self.cache[cache_key]
+            # New config version; scored candidates are reused, only the merge is redone
+            self._invalidate_rankings(touchpoint, 'overrides')
             
             return {
                 'status': 'success',
@@ -90,15 +1068,16 @@ class MerchandisingAPI:
                 'touchpoint': touchpoint.value
             }
     
+    @_touchpoint_synchronized
     def blacklist_product(self, touchpoint: TouchpointType, product_name: str) -> dict:
         """Blacklist a product from appearing in rankings"""
         engine = self.engines[touchpoint]
         engine.blacklisted_products.add(product_name)
         
-        # Clear cache to force refresh
-        cache_key = f"{touchpoint.value}_rankings"
-        if cache_key in self.cache:
-            del self.cache[cache_key]
+        # New config version; incremental rankings only drop the product's rows
+        self._invalidate_rankings(touchpoint, 'blacklist')
+        if touchpoint in self.rankers:
+            self.rankers[touchpoint].update_rows(self.products.rows_for_name(product_name))
         
         return {
             'status': 'success',
@@ -106,6 +1085,7 @@ class MerchandisingAPI:
             'touchpoint': touchpoint.value
         }
     
+    @_touchpoint_synchronized
     def update_scoring_weights(self, touchpoint: TouchpointType, weights: dict) -> dict:
         """Update scoring weights for a touchpoint"""
         engine = self.engines[touchpoint]
@@ -118,15 +1098,13 @@ class MerchandisingAPI:
                 'message': f'Weights must sum to 1.0, got {total_weight}'
             }
         
-        # Update weights
-        for key, value in weights.items():
-            if hasattr(engine.config.scoring_weights, key):
-                setattr(engine.config.scoring_weights, key, value)
+        # Update weights on a copy: the config and its ScoringWeights may be shared
+        known_weights = {key: value for key, value in weights.items() if hasattr(engine.config.scoring_weights, key)}
+        engine.config = replace(engine.config, scoring_weights=replace(engine.config.scoring_weights, **known_weights))
         
-        # Clear cache to force refresh
-        cache_key = f"{touchpoint.value}_rankings"
-        if cache_key in self.cache:
-            del self.cache[cache_key]
+        # New config version; component scores are reused, composites are redone
+        self._invalidate_rankings(touchpoint, 'weights')
+        self.rankers.pop(touchpoint, None)
         
         return {
             'status': 'success',
@@ -134,6 +1112,150 @@ class MerchandisingAPI:
             'touchpoint': touchpoint.value,
             'new_weights': weights
         }
+    
+    @_touchpoint_synchronized
+    def update_filter_criteria(self, touchpoint: TouchpointType, criteria: dict) -> dict:
+        """Update filter criteria for a touchpoint"""
+        engine = self.engines[touchpoint]
+        unknown = sorted(set(criteria) - set(vars(engine.config.filter_criteria)))
+        if unknown:
+            return {
+                'status': 'error',
+                'message': f'Unknown filter criteria: {", ".join(unknown)}'
+            }
+        
+        engine.config = replace(engine.config, filter_criteria=replace(engine.config.filter_criteria, **criteria))
+        
+        # New config version; component scores are reused, candidates are refiltered
+        self._invalidate_rankings(touchpoint, 'filters')
+        self.rankers.pop(touchpoint, None)
+        
+        return {
+            'status': 'success',
+            'message': 'Filter criteria updated',
+            'touchpoint': touchpoint.value,
+            'new_criteria': criteria
+        }
+    
+    @_touchpoint_synchronized
+    def set_seasonal_boost(self, touchpoint: TouchpointType, product_name: str, boost: float) -> dict:
+        """Set a product's seasonal boost multiplier for a touchpoint (1.0 removes it)"""
+        engine = self.engines[touchpoint]
+        if boost == 1.0:
+            engine.seasonal_boosts.pop(product_name, None)
+        else:
+            engine.seasonal_boosts[product_name] = boost
+        
+        # New config version; component scores are reused, composites are redone
+        self._invalidate_rankings(touchpoint, 'boosts')
+        self.rankers.pop(touchpoint, None)
+        
+        return {
+            'status': 'success',
+            'message': f'Seasonal boost for {product_name} set to {boost}',
+            'touchpoint': touchpoint.value
+        }
+    
+    BATCH_ACTIONS = ('override', 'remove_override', 'blacklist')
+    
+    @_synchronized
+    def apply_batch(self, operations: List[dict]) -> dict:
+        """Apply many overrides, override removals and blacklist entries atomically.
+        
+        Each operation is a dict with 'action' (one of BATCH_ACTIONS),
+        'touchpoint' (TouchpointType or its value), 'product_name' and, for
+        overrides, a 1-based 'position'. Every operation is validated against
+        the catalog first; if any fails nothing is applied. Otherwise all are
+        applied under one lock hold and each affected touchpoint gets a single
+        version bump and re-rank.
+        """
+        errors = []
+        resolved = []
+        pending_overrides = {touchpoint: set(engine.manual_overrides) for touchpoint, engine in self.engines.items()}
+        for i, operation in enumerate(operations):
+            action = operation.get('action')
+            product_name = operation.get('product_name')
+            position = operation.get('position')
+            try:
+                touchpoint = TouchpointType(operation.get('touchpoint'))
+            except ValueError:
+                errors.append({'index': i, 'message': f"Unknown touchpoint: {operation.get('touchpoint')}"})
+                continue
+            
+            if touchpoint not in self.engines:
+                errors.append({'index': i, 'message': f'Touchpoint not configured: {touchpoint.value}'})
+            elif action not in self.BATCH_ACTIONS:
+                errors.append({'index': i, 'message': f'Unknown action: {action}'})
+            elif action != 'remove_override' and not self.products.rows_for_name(product_name or ''):
+                errors.append({'index': i, 'message': f'Product not found: {product_name}'})
+            elif action == 'override' and (isinstance(position, bool) or not isinstance(position, int) or position < 1):
+                errors.append({'index': i, 'message': f'Position must be a positive integer, got {position}'})
+            elif action == 'remove_override' and product_name not in pending_overrides[touchpoint]:
+                errors.append({'index': i, 'message': f'No manual override found for {product_name}'})
+            else:
+                if action == 'override':
+                    pending_overrides[touchpoint].add(product_name)
+                elif action == 'remove_override':
+                    pending_overrides[touchpoint].discard(product_name)
+                resolved.append((action, touchpoint, product_name, position))
+        
+        if errors:
+            return {
+                'status': 'error',
+                'message': f'{len(errors)} of {len(operations)} operations are invalid; nothing was applied',
+                'errors': errors
+            }
+        
+        changed_facets = {}
+        blacklisted_rows = {}
+        for action, touchpoint, product_name, position in resolved:
+            engine = self.engines[touchpoint]
+            if action == 'override':
+                engine.manual_overrides[product_name] = position - 1  # Convert to 0-based index
+                changed_facets.setdefault(touchpoint, set()).add('overrides')
+            elif action == 'remove_override':
+                del engine.manual_overrides[product_name]
+                changed_facets.setdefault(touchpoint, set()).add('overrides')
+            else:
+                engine.blacklisted_products.add(product_name)
+                changed_facets.setdefault(touchpoint, set()).add('blacklist')
+                blacklisted_rows.setdefault(touchpoint, []).extend(self.products.rows_for_name(product_name))
+        
+        # One version bump and one re-rank per touchpoint
+        for touchpoint, facets in changed_facets.items():
+            self._invalidate_rankings(touchpoint, *sorted(facets))
+            if touchpoint in self.rankers and touchpoint in blacklisted_rows:
+                self.rankers[touchpoint].update_rows(sorted(set(blacklisted_rows[touchpoint])))
+        
+        return {
+            'status': 'success',
+            'message': f'Applied {len(resolved)} operations',
+            'config_versions': {touchpoint.value: self.config_version(touchpoint) for touchpoint in changed_facets}
+        }
+    
+    def get_analytics_summary(self, touchpoint: TouchpointType) -> dict:
+        """Summarize the current rankings for a touchpoint"""
+        rankings = self.get_rankings(touchpoint)
+        ranked_products = rankings['products']
+        
+        brand_tier_distribution = {}
+        for product_data in ranked_products:
+            brand_tier = product_data['brand_tier']
+            brand_tier_distribution[brand_tier] = brand_tier_distribution.get(brand_tier, 0) + 1
+        
+        total_products = len(ranked_products)
+        return {
+            'touchpoint': touchpoint.value,
+            'generated_at': rankings['generated_at'],
+            'analytics': {
+                'total_products': total_products,
+                'total_revenue_last_month': sum(p['revenue_last_month'] for p in ranked_products),
+                'average_merchandising_score': sum(p['merchandising_score'] for p in ranked_products) / total_products if total_products else 0,
+                'average_profit_margin': sum(p['profit_margin'] for p in ranked_products) / total_products if total_products else 0,
+                'brand_tier_distribution': brand_tier_distribution,
+                'manual_overrides_count': sum(1 for p in ranked_products if p['is_manual_override'])
+            }
+        }
 
 # Initialize API
 api = MerchandisingAPI()
@@ -171,4 +1293,59 @@ weight_update_result = api.update_scoring_weights(
         'engagement_score': 0.10
     }
 )
-print(f"Weight update result: {weight_update_result['status']}")
\ No newline at end of file
+print(f"Weight update result: {weight_update_result['status']}")
+print(f"Homepage config version: {api.config_version(TouchpointType.HOMEPAGE_CAROUSEL)} {api.state_versions[TouchpointType.HOMEPAGE_CAROUSEL]}")
+
+# Inventory event: stock drop for the current top homepage product
+top_product = updated_homepage_data['products'][0]
+update_result = api.update_product_metrics(top_product['name'], units_stock=3)
+print(f"Metric update result: {update_result['message']}")
+while api.is_refreshing(TouchpointType.HOMEPAGE_CAROUSEL):
+    time.sleep(0.01)  # Rankings are re-encoded in the background
+print(f"Top product after stock drop: {api.get_rankings(TouchpointType.HOMEPAGE_CAROUSEL)['products'][0]['name']}")
+api.update_product_metrics(top_product['name'], units_stock=top_product['units_stock'])  # Restock
+
+# Refresh every touchpoint from a single scoring pass
+all_rankings = api.refresh_all_rankings()
+for touchpoint, touchpoint_data in all_rankings.items():
+    print(f"Refreshed {touchpoint.value}: {touchpoint_data['total_products']} products")
+
+# Conditional refreshes report why they rebuilt
+collection_refresh = api.refresh_if_changed(TouchpointType.COLLECTION_PAGE)
+print(f"Conditional refresh, nothing changed: {collection_refresh['status']} ({collection_refresh['reason']})")
+edited_row = api.products.rows_for_name(top_product['name'])[0]
+api.products.update_product(edited_row, views_last_month=int(api.products.views_last_month[edited_row]) + 1)  # Edit outside the API
+collection_refresh = api.refresh_if_changed(TouchpointType.COLLECTION_PAGE)
+print(f"Conditional refresh after a catalog edit: {collection_refresh['status']} ({collection_refresh['reason']})")
+
+# Shared cache tier: a second worker serves rankings computed by the first
+shared_client = InMemoryRedis()
+worker_a = MerchandisingAPI(cache=TieredCache(LRUCache(max_entries=64), SharedCache(shared_client)))
+worker_b = MerchandisingAPI(cache=TieredCache(LRUCache(max_entries=64), SharedCache(shared_client)))
+rankings_a = worker_a.get_rankings(TouchpointType.HOMEPAGE_CAROUSEL)
+rankings_b = worker_b.get_rankings(TouchpointType.HOMEPAGE_CAROUSEL)
+print(f"Shared tier hit on second worker: {rankings_a['generated_at'] == rankings_b['generated_at']}")
+print(f"Second worker cache stats: {worker_b.cache.stats()}")
+worker_a.blacklist_product(TouchpointType.HOMEPAGE_CAROUSEL, rankings_a['products'][0]['name'])
+worker_b.set_seasonal_boost(TouchpointType.HOMEPAGE_CAROUSEL, rankings_a['products'][-1]['name'], 1.1)
+print(f"Diverged workers share a cache key: {worker_a.cache_key(TouchpointType.HOMEPAGE_CAROUSEL) == worker_b.cache_key(TouchpointType.HOMEPAGE_CAROUSEL)}")
+
+# Campaign launch: pin and blacklist in one atomic batch
+batch_result = api.apply_batch([
+    {'action': 'override', 'touchpoint': 'homepage_carousel', 'product_name': 'Hydra Ginseng Serum', 'position': 1},
+    {'action': 'override', 'touchpoint': 'collection_page', 'product_name': 'Hydra Ginseng Serum', 'position': 1},
+    {'action': 'blacklist', 'touchpoint': 'collection_page', 'product_name': 'Calm Centella Serum'},
+    {'action': 'remove_override', 'touchpoint': 'homepage_carousel', 'product_name': 'Fresh Snail Mucin Cleanser'}
+])
+print(f"Batch result: {batch_result['message']}, versions {batch_result['config_versions']}")
+invalid_batch = api.apply_batch([{'action': 'override', 'touchpoint': 'homepage_carousel', 'product_name': 'No Such Product', 'position': 1}])
+print(f"Invalid batch: {invalid_batch['message']}")
+bool_position_batch = api.apply_batch([{'action': 'override', 'touchpoint': 'homepage_carousel', 'product_name': 'Hydra Ginseng Serum', 'position': True}])
+print(f"Boolean position: {bool_position_batch['errors'][0]['message']}")
+# Where does a homepage refresh spend its time?
+def print_span(span, depth=1):
+    print(f"{'  ' * depth}{span['name']}: {span['duration_ms']} ms {span['attributes'] or ''}")
+    for child in span['children']:
+        print_span(child, depth + 1)
+
+print_span(api.get_traced_rankings(TouchpointType.HOMEPAGE_CAROUSEL, force_refresh=True)['trace'])
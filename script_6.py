@@ -1,18 +1,56 @@
 # 5. Automation and Scheduling System
+import csv
+import heapq
+import io
+import itertools
+import random
+import tempfile
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Callable, List
+from functools import wraps
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 import logging
 
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet/Arrow exports are optional; the snapshot format needs only NumPy
+    pa = None
+
 class AutomationScheduler:
-    def __init__(self, api: MerchandisingAPI):
+    """Timer-heap scheduler for touchpoint refreshes.
+    
+    The scheduler thread sleeps until the earliest heap entry is due (or it
+    is woken by a new schedule or stop()) and hands due refreshes to a
+    bounded worker pool, so one slow touchpoint never delays the others;
+    MerchandisingAPI rebuilds each touchpoint under its own lock.
+    Runs keep a fixed cadence plus up to `jitter` x interval of random delay
+    to spread out touchpoints sharing an interval. A run that falls due while
+    the previous one is still going, and any slots missed entirely, are
+    coalesced into the next slot. Runs exceeding their timeout are logged and
+    counted; threads cannot be cancelled, so they keep their worker until
+    they return. A run whose inputs are unchanged (see
+    MerchandisingAPI.refresh_if_changed) is skipped and the reason recorded.
+    """
+    
+    def __init__(self, api: MerchandisingAPI, max_workers: int = 4,
+                 task_timeout_seconds: float = 300, jitter: float = 0.05):
         self.api = api
         self.scheduled_tasks = {}
         self.running = False
         self.thread = None
+        self.max_workers = max_workers
+        self.task_timeout_seconds = task_timeout_seconds
+        self.jitter = jitter
         self.logger = self._setup_logger()
-        
+        self._heap = []  # (due, sequence, kind, touchpoint, generation, run_started)
+        self._sequence = itertools.count()
+        self._wakeup = threading.Condition()
+        self._pool = None
+    
     def _setup_logger(self):
         logging.basicConfig(
             level=logging.INFO,
@@ -20,29 +58,59 @@ class AutomationScheduler:
         )
         return logging.getLogger('MerchandisingAutomation')
     
-    def schedule_touchpoint_refresh(self, touchpoint: TouchpointType):
-        """Schedule automatic refresh for a touchpoint"""
+    def schedule_touchpoint_refresh(self, touchpoint: TouchpointType, timeout_seconds: Optional[float] = None):
+        """Schedule automatic refresh for a touchpoint (first run is due immediately)"""
         config = self.api.engines[touchpoint].config
         refresh_interval = config.refresh_interval_hours
         
         def refresh_task():
+            started = time.perf_counter()
+            status = 'failed'
             try:
-                self.logger.info(f"Auto-refreshing rankings for {touchpoint.value}")
-                rankings = self.api.get_rankings(touchpoint, force_refresh=True)
-                self.logger.info(f"Successfully refreshed {rankings['total_products']} products for {touchpoint.value}")
+                outcome = self.api.refresh_if_changed(touchpoint)
+                status = outcome['status']
+                self.scheduled_tasks[touchpoint]['last_outcome'] = outcome
+                if outcome['status'] == 'skipped':
+                    self.scheduled_tasks[touchpoint]['skipped'] += 1
+                    self.logger.info(f"Skipped refresh for {touchpoint.value}: {outcome['reason']}")
+                    return
+                
+                rankings = self.api.get_rankings(touchpoint)
+                self.logger.info(f"Refreshed {rankings['total_products']} products for {touchpoint.value} ({outcome['reason']})")
                 
                 # Check for inventory alerts
                 self._check_inventory_alerts(touchpoint, rankings)
-                
+            
             except Exception as e:
                 self.logger.error(f"Failed to refresh {touchpoint.value}: {str(e)}")
+            finally:
+                SCHEDULED_REFRESH_SECONDS.labels(touchpoint.value, status).observe(time.perf_counter() - started)
         
-        self.scheduled_tasks[touchpoint] = {
-            'task': refresh_task,
-            'interval_hours': refresh_interval,
-            'last_run': datetime.min,
-            'next_run': datetime.now()
-        }
+        with self._wakeup:
+            previous = self.scheduled_tasks.get(touchpoint)
+            now = time.monotonic()
+            task_info = {
+                'task': refresh_task,
+                'interval_hours': refresh_interval,
+                'timeout_seconds': self.task_timeout_seconds if timeout_seconds is None else timeout_seconds,
+                'last_run': datetime.min,
+                'next_run': datetime.now(),
+                'generation': previous['generation'] + 1 if previous else 0,
+                'slot': now,
+                'running_since': previous['running_since'] if previous else None,
+                'runs': 0,
+                'skipped': 0,
+                'last_outcome': None,
+                'timeouts': 0,
+                'coalesced': 0
+            }
+            self.scheduled_tasks[touchpoint] = task_info
+            self._push(now, 'run', touchpoint, task_info['generation'])
+    
+    def _push(self, due: float, kind: str, touchpoint: TouchpointType, generation: int, run_started: float = None):
+        """Add a heap entry and wake the scheduler thread (caller holds _wakeup)"""
+        heapq.heappush(self._heap, (due, next(self._sequence), kind, touchpoint, generation, run_started))
+        self._wakeup.notify()
     
     def _check_inventory_alerts(self, touchpoint: TouchpointType, rankings: dict):
         """Check for inventory alerts and log warnings"""
@@ -65,63 +133,329 @@ class AutomationScheduler:
     
     def start(self):
         """Start the automation scheduler"""
-        if self.running:
-            return
-        
-        self.running = True
-        self.thread = threading.Thread(target=self._run_scheduler, daemon=True)
-        self.thread.start()
+        with self._wakeup:
+            if self.running:
+                return
+            
+            self.running = True
+            self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='merchandising-refresh')
+            self.thread = threading.Thread(target=self._run_scheduler, daemon=True)
+            self.thread.start()
         self.logger.info("Automation scheduler started")
     
     def stop(self):
-        """Stop the automation scheduler"""
-        self.running = False
+        """Stop the automation scheduler without waiting for in-flight refreshes"""
+        with self._wakeup:
+            self.running = False
+            self._wakeup.notify_all()
         if self.thread:
             self.thread.join()
+            self.thread = None
+        if self._pool:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
         self.logger.info("Automation scheduler stopped")
     
     def _run_scheduler(self):
-        """Main scheduler loop"""
-        while self.running:
-            current_time = datetime.now()
-            
-            for touchpoint, task_info in self.scheduled_tasks.items():
-                if current_time >= task_info['next_run']:
-                    # Run the task
-                    task_info['task']()
-                    
-                    # Schedule next run
-                    task_info['last_run'] = current_time
-                    task_info['next_run'] = current_time + timedelta(hours=task_info['interval_hours'])
-            
-            # Sleep for 1 minute before next check
-            time.sleep(60)
+        """Main scheduler loop: sleep until the next heap entry is due, then handle it"""
+        with self._wakeup:
+            while self.running:
+                if not self._heap:
+                    self._wakeup.wait()
+                    continue
+                
+                delay = self._heap[0][0] - time.monotonic()
+                if delay > 0:
+                    self._wakeup.wait(delay)
+                    continue
+                
+                _, _, kind, touchpoint, generation, run_started = heapq.heappop(self._heap)
+                task_info = self.scheduled_tasks.get(touchpoint)
+                if task_info is None or task_info['generation'] != generation:
+                    continue  # Rescheduled since this entry was pushed
+                
+                if kind == 'run':
+                    self._dispatch(touchpoint, task_info)
+                elif task_info['running_since'] == run_started:
+                    task_info['timeouts'] += 1
+                    self.logger.error(f"Refresh for {touchpoint.value} exceeded {task_info['timeout_seconds']}s and is still running")
+    
+    def _dispatch(self, touchpoint: TouchpointType, task_info: dict):
+        """Submit a due run to the worker pool and push the next one (caller holds _wakeup)"""
+        now = time.monotonic()
+        interval = task_info['interval_hours'] * 3600
+        
+        if task_info['running_since'] is not None:
+            task_info['coalesced'] += 1
+            self.logger.warning(f"Previous refresh for {touchpoint.value} still running; skipping this run")
+        else:
+            run_started = now
+            task_info['running_since'] = run_started
+            task_info['last_run'] = datetime.now()
+            task_info['runs'] += 1
+            future = self._pool.submit(task_info['task'])
+            future.add_done_callback(lambda _: self._run_finished(touchpoint, run_started))
+            self._push(now + task_info['timeout_seconds'], 'timeout', touchpoint, task_info['generation'], run_started)
+        
+        # Fixed cadence from the slot that just fired; slots already missed collapse into the next one
+        slot = task_info['slot'] + interval
+        if slot <= now:
+            missed = int((now - slot) // interval) + 1
+            task_info['coalesced'] += missed
+            slot += missed * interval
+        task_info['slot'] = slot
+        
+        due = slot + random.uniform(0, self.jitter * interval)
+        task_info['next_run'] = datetime.now() + timedelta(seconds=due - now)
+        self._push(due, 'run', touchpoint, task_info['generation'])
+    
+    def _run_finished(self, touchpoint: TouchpointType, run_started: float):
+        """Worker-pool callback: mark the touchpoint idle again"""
+        with self._wakeup:
+            task_info = self.scheduled_tasks.get(touchpoint)
+            if task_info is not None and task_info['running_since'] == run_started:
+                task_info['running_since'] = None
+
+def _observe_export(export: str, format: str, started: float, size: int):
+    EXPORT_SECONDS.labels(export, format).observe(time.perf_counter() - started)
+    EXPORT_BYTES.labels(export, format).observe(size)
+
+def _measured_stream(export: str, format: str, started: float, chunks: Iterator[str]) -> Iterator[str]:
+    """Pass chunks through, recording the export once the stream ends or is closed"""
+    size = 0
+    try:
+        for chunk in chunks:
+            size += len(chunk.encode())
+            yield chunk
+    finally:
+        _observe_export(export, format, started, size)
+
+def _measured_export(export: str, format: str):
+    """Record duration and size of an ExportManager method returning text or
+    a stream of text chunks (streams are measured until fully consumed)"""
+    def decorator(method):
+        @wraps(method)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            result = method(*args, **kwargs)
+            if isinstance(result, str):
+                _observe_export(export, format, started, len(result.encode()))
+                return result
+            return _measured_stream(export, format, started, result)
+        return wrapper
+    return decorator
 
-# 6. Export and Integration System
 class ExportManager:
+    RANKINGS_CSV_COLUMNS = [
+        'position', 'name', 'brand', 'brand_tier', 'price', 'profit_margin', 'merchandising_score',
+        'units_stock', 'days_inventory', 'views_last_month', 'volume_sold_last_month', 'is_manual_override'
+    ]
+    CATALOG_EXPORT_COLUMNS = [
+        'name', 'brand', 'brand_tier', 'price', 'cogs', 'profit_margin', 'conversion_rate',
+        'revenue_last_month', 'sell_through_rate', 'days_inventory', 'units_stock',
+        'views_last_month', 'volume_sold_last_month'
+    ]
+    EXPORT_CHUNK_ROWS = 10_000
+    
     def __init__(self, api: MerchandisingAPI):
         self.api = api
     
+    @_measured_export('rankings', 'json')
     def export_rankings_json(self, touchpoint: TouchpointType, limit: int = None) -> str:
         """Export rankings as JSON for API integration"""
-        rankings = self.api.get_rankings(touchpoint)
-        
-        if limit:
-            rankings['products'] = rankings['products'][:limit]
+        if not limit:
+            return self.api.get_encoded_rankings(touchpoint).pretty_json()
         
-        return json.dumps(rankings, indent=2)
+        # Copy before truncating: the rankings dict is the cached response
+        rankings = self.api.get_rankings(touchpoint)
+        return json.dumps(dict(rankings, products=rankings['products'][:limit]), indent=2)
     
     def export_rankings_csv(self, touchpoint: TouchpointType) -> str:
         """Export rankings as CSV for analysis"""
+        return ''.join(self.iter_rankings_csv(touchpoint))
+    
+    @_measured_export('rankings', 'csv')
+    def iter_rankings_csv(self, touchpoint: TouchpointType) -> Iterator[str]:
+        """Stream rankings as CSV text chunks"""
+        rankings = self.api.get_rankings(touchpoint)
+        rows = (
+            [
+                product['position'], product['name'], product['brand'], product['brand_tier'], product['price'],
+                f"{product['profit_margin']:.2f}", product['merchandising_score'], product['units_stock'],
+                product['days_inventory'], product['views_last_month'], product['volume_sold_last_month'],
+                product['is_manual_override']
+            ]
+            for product in rankings['products']
+        )
+        return self._csv_chunks(self.RANKINGS_CSV_COLUMNS, rows)
+    
+    @_measured_export('rankings', 'ndjson')
+    def iter_rankings_ndjson(self, touchpoint: TouchpointType) -> Iterator[str]:
+        """Stream rankings as newline-delimited JSON, one product per line"""
         rankings = self.api.get_rankings(touchpoint)
+        return self._ndjson_chunks(rankings['products'])
+    
+    @_measured_export('scored_catalog', 'csv')
+    def iter_scored_catalog_csv(self, touchpoint: TouchpointType) -> Iterator[str]:
+        """Stream every catalog product with its scores for a touchpoint as CSV"""
+        header = self.CATALOG_EXPORT_COLUMNS + list(SCORE_COMPONENTS) + ['merchandising_score', 'passes_filters']
+        for i, chunk in enumerate(self._scored_catalog_chunks(touchpoint)):
+            rows = zip(*(chunk[column].tolist() for column in header))
+            yield from self._csv_chunks(header if i == 0 else None, rows)
+    
+    @_measured_export('scored_catalog', 'ndjson')
+    def iter_scored_catalog_ndjson(self, touchpoint: TouchpointType) -> Iterator[str]:
+        """Stream every catalog product with its scores for a touchpoint as NDJSON"""
+        header = self.CATALOG_EXPORT_COLUMNS + list(SCORE_COMPONENTS) + ['merchandising_score', 'passes_filters']
+        for chunk in self._scored_catalog_chunks(touchpoint):
+            records = (dict(zip(header, values)) for values in zip(*(chunk[column].tolist() for column in header)))
+            yield from self._ndjson_chunks(records)
+    
+    def _scored_catalog_chunks(self, touchpoint: TouchpointType) -> Iterator[Dict[str, np.ndarray]]:
+        """Catalog columns plus component, composite and filter results, EXPORT_CHUNK_ROWS rows at a time"""
+        engine = self.api.engines[touchpoint]
+        catalog = self.api.products
+        for start in range(0, len(catalog), self.EXPORT_CHUNK_ROWS):
+            rows = slice(start, min(start + self.EXPORT_CHUNK_ROWS, len(catalog)))
+            chunk = catalog.columns(rows)
+            components = engine.calculate_component_scores_batch(chunk)
+            chunk.update(components)
+            chunk['merchandising_score'] = engine.calculate_composite_scores_batch(chunk, components)
+            chunk['passes_filters'] = engine.filter_mask(catalog, rows)
+            yield chunk
+    
+    def scored_catalog_columns(self, touchpoints: Optional[List[TouchpointType]] = None) -> Dict[str, np.ndarray]:
+        """Typed columns of the full scored catalog.
         
-        csv_data = "position,name,brand,brand_tier,price,profit_margin,merchandising_score,units_stock,days_inventory,views_last_month,volume_sold_last_month,is_manual_override\n"
+        Raw and derived metrics, the five component scores (named with a
+        single _score suffix, e.g. sales_velocity_score) and, per
+        touchpoint, the composite score, the FILTER_FAILURE_FLAGS bitmask and
+        the algorithmic rank among eligible products (1-based, 0 when filtered
+        out; manual overrides are not applied). Metric columns are the
+        catalog's own arrays, not copies.
+        """
+        catalog = self.api.products
+        touchpoints = list(self.api.engines) if touchpoints is None else touchpoints
+        columns = catalog.columns(include_text=False)
+        components = self.api.engines[touchpoints[0]].calculate_component_scores_batch(columns)
         
-        for product in rankings['products']:
-            csv_data += f"{product['position']},{product['name']},{product['brand']},{product['brand_tier']},{product['price']},{product['profit_margin']:.2f},{product['merchandising_score']},{product['units_stock']},{product['days_inventory']},{product['views_last_month']},{product['volume_sold_last_month']},{product['is_manual_override']}\n"
+        scored = {
+            **{column: getattr(catalog, column) for column in ProductCatalog.STORED_COLUMNS},
+            **{component if component.endswith('_score') else f'{component}_score': scores
+               for component, scores in components.items()}
+        }
+        for touchpoint in touchpoints:
+            engine = self.api.engines[touchpoint]
+            scoring_columns = catalog.columns(include_text=bool(engine.seasonal_boosts))
+            scores = engine.calculate_composite_scores_batch(scoring_columns, components)
+            failures = engine.filter_failures(catalog)
+            
+            eligible_rows = np.flatnonzero(failures == 0)
+            ranked_rows = eligible_rows[np.lexsort((eligible_rows, -scores[eligible_rows]))]
+            ranks = np.zeros(len(catalog), dtype=np.int64)
+            ranks[ranked_rows] = np.arange(1, len(ranked_rows) + 1)
+            
+            scored[f'{touchpoint.value}_merchandising_score'] = scores
+            scored[f'{touchpoint.value}_filter_failures'] = failures
+            scored[f'{touchpoint.value}_rank'] = ranks
+        return scored
+    
+    def export_scored_catalog(self, output_path: str, format: str = 'snapshot',
+                              touchpoints: Optional[List[TouchpointType]] = None) -> str:
+        """Write the full scored catalog as a typed columnar file.
+        
+        'snapshot' (always available) writes a catalog snapshot directory with
+        one raw little-endian file per score column and scores.json in the
+        same version, so scores are published together with the catalog
+        they belong to; open_scored_catalog reads them back memory-mapped. 'parquet' and 'arrow'
+        (Arrow IPC / Feather v2) need pyarrow. Floats are stored as float64,
+        so values round-trip exactly.
+        """
+        started = time.perf_counter()
+        catalog = self.api.products
+        touchpoints = list(self.api.engines) if touchpoints is None else touchpoints
+        scored = self.scored_catalog_columns(touchpoints)
+        
+        if format in ('parquet', 'arrow'):
+            if pa is None:
+                raise ImportError(f'pyarrow is required for {format} exports; use format="snapshot"')
+            table = pa.table({
+                'name': pa.array(catalog.names),
+                'brand': pa.DictionaryArray.from_arrays(scored.pop('brand_codes'), catalog.brand_categories.tolist()),
+                'brand_tier': pa.DictionaryArray.from_arrays(scored.pop('brand_tier_codes'), catalog.brand_tier_categories.tolist()),
+                **{column: pa.array(values) for column, values in scored.items()}
+            })
+            if format == 'parquet':
+                pq.write_table(table, output_path)
+            else:
+                feather.write_feather(table, output_path)
+            _observe_export('scored_catalog', format, started, os.path.getsize(output_path))
+            return output_path
+        if format != 'snapshot':
+            raise ValueError(f'Unknown scored catalog format: {format}')
+        
+        with CatalogSnapshotWriter(output_path) as writer:
+            writer.append(catalog)
+            
+            # The version is unpublished until the writer closes, so files go straight in
+            score_columns = {}
+            for column, values in scored.items():
+                if column in ProductCatalog.STORED_COLUMNS:
+                    continue
+                dtype = values.dtype.newbyteorder('<').str
+                np.ascontiguousarray(values, dtype=dtype).tofile(os.path.join(writer.version_dir, f'{column}.bin'))
+                score_columns[column] = {'file': f'{column}.bin', 'dtype': dtype}
+            
+            manifest = {
+                'format_version': 1,
+                'rows': len(catalog),
+                'generated_at': datetime.now().isoformat(),
+                'columns': score_columns,
+                'touchpoints': {
+                    touchpoint.value: {
+                        'config_version': self.api.config_version(touchpoint),
+                        'scoring_weights': vars(self.api.engines[touchpoint].config.scoring_weights)
+                    }
+                    for touchpoint in touchpoints
+                },
+                'filter_failure_flags': MerchandisingEngine.FILTER_FAILURE_FLAGS
+            }
+            
+            with open(os.path.join(writer.version_dir, 'scores.json'), 'w') as f:
+                json.dump(manifest, f, indent=2)
         
-        return csv_data
+        size = sum(entry.stat().st_size for entry in os.scandir(writer.version_dir))
+        _observe_export('scored_catalog', format, started, size)
+        return output_path
+    
+    def _csv_chunks(self, header: Optional[List[str]], rows: Iterable[list]) -> Iterator[str]:
+        """Properly quoted CSV text, yielded every EXPORT_CHUNK_ROWS rows"""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator='\n')
+        if header:
+            writer.writerow(header)
+        rows = iter(rows)
+        while True:
+            batch = list(itertools.islice(rows, self.EXPORT_CHUNK_ROWS))
+            if not batch:
+                break
+            writer.writerows(batch)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
     
+    def _ndjson_chunks(self, records: Iterable[dict]) -> Iterator[str]:
+        """One JSON object per line, yielded every EXPORT_CHUNK_ROWS records"""
+        records = iter(records)
+        while True:
+            batch = list(itertools.islice(records, self.EXPORT_CHUNK_ROWS))
+            if not batch:
+                break
+            yield ''.join(json.dumps(record) + '\n' for record in batch)
+    
+    @_measured_export('frontend_config', 'json')
     def export_frontend_config(self, touchpoint: TouchpointType) -> str:
         """Export configuration for frontend integration"""
         rankings = self.api.get_rankings(touchpoint)
@@ -147,24 +481,226 @@ class ExportManager:
         
         return json.dumps(frontend_config, indent=2)
 
+def open_scored_catalog(export_dir: str) -> Dict[str, np.ndarray]:
+    """Memory-map a scored catalog written by export_scored_catalog(format='snapshot')"""
+    version_dir = resolve_snapshot_dir(export_dir)  # Catalog and scores come from one version
+    if version_dir is None:
+        raise FileNotFoundError(f'No scored catalog published in {export_dir}')
+    catalog = ProductCatalog.open_snapshot(version_dir, mode='r')
+    with open(os.path.join(version_dir, 'scores.json')) as f:
+        manifest = json.load(f)
+    
+    columns = catalog.columns()
+    for column, spec in manifest['columns'].items():
+        path = os.path.join(version_dir, spec['file'])
+        columns[column] = np.memmap(path, dtype=spec['dtype'], mode='r', shape=(manifest['rows'],)) if manifest['rows'] else np.empty(0, dtype=spec['dtype'])
+    return columns
+
 # 7. Monitoring and Performance Tracking
+class RollupRing:
+    """Fixed-capacity ring of time buckets at one resolution.
+    
+    Each bucket keeps the count, sum, min and max of every field, and its
+    value is the mean of its samples. Running prefix sums of the bucket means
+    (and of bucket time and time x mean) over every bucket ever added make
+    window means and least-squares trends O(1); window min/max reduce over
+    the window's buckets only.
+    """
+    
+    def __init__(self, fields: int, capacity: int, bucket_seconds: Optional[float], origin: float):
+        self.capacity = capacity
+        self.bucket_seconds = bucket_seconds  # None keeps one bucket per sample
+        self.origin = origin  # Trend time is measured in hours from here
+        self.buckets = 0  # Buckets ever opened; bucket i lives in slot i % capacity
+        self.starts = np.zeros(capacity)
+        self.counts = np.zeros(capacity)
+        self.sums = np.zeros((capacity, fields))
+        self.mins = np.zeros((capacity, fields))
+        self.maxs = np.zeros((capacity, fields))
+        self.cum_x = np.zeros(capacity)
+        self.cum_xx = np.zeros(capacity)
+        self.cum_y = np.zeros((capacity, fields))
+        self.cum_xy = np.zeros((capacity, fields))
+    
+    def add(self, timestamp: float, values: np.ndarray):
+        """Fold a sample into the open bucket, or open a new one"""
+        start = timestamp if self.bucket_seconds is None else timestamp - timestamp % self.bucket_seconds
+        slot = (self.buckets - 1) % self.capacity
+        if self.bucket_seconds is None or self.buckets == 0 or start > self.starts[slot]:
+            slot = self.buckets % self.capacity
+            self.buckets += 1
+            self.starts[slot] = start
+            self.counts[slot] = 0
+            self.sums[slot] = 0
+            self.mins[slot] = values
+            self.maxs[slot] = values
+        # Late samples are folded into the open bucket
+        
+        self.counts[slot] += 1
+        self.sums[slot] += values
+        np.minimum(self.mins[slot], values, out=self.mins[slot])
+        np.maximum(self.maxs[slot], values, out=self.maxs[slot])
+        
+        # Only the open bucket's prefix sums change
+        x = (self.starts[slot] - self.origin) / 3600
+        mean = self.sums[slot] / self.counts[slot]
+        prev_x, prev_xx, prev_y, prev_xy = self._prefix(self.buckets - 2)
+        self.cum_x[slot] = prev_x + x
+        self.cum_xx[slot] = prev_xx + x * x
+        self.cum_y[slot] = prev_y + mean
+        self.cum_xy[slot] = prev_xy + x * mean
+    
+    def _prefix(self, index: int):
+        """Prefix sums over buckets [0, index]"""
+        if index < 0:
+            return 0.0, 0.0, 0.0, 0.0
+        slot = index % self.capacity
+        return self.cum_x[slot], self.cum_xx[slot], self.cum_y[slot], self.cum_xy[slot]
+    
+    def __len__(self) -> int:
+        return min(self.buckets, self.capacity)
+    
+    def bucket(self, back: int = 0) -> Tuple[float, np.ndarray]:
+        """(start, mean values) of the newest bucket, or `back` buckets before it"""
+        slot = (self.buckets - 1 - back) % self.capacity
+        return self.starts[slot], self.sums[slot] / self.counts[slot]
+    
+    def aggregate(self, window: int, since: Optional[float] = None) -> Optional[dict]:
+        """Mean, min, max and trend (change per hour) over the newest `window`
+        buckets, leaving out buckets that ended before `since` (epoch seconds)"""
+        # The prefix sum just before the window must still be in the ring
+        retained = self.buckets if self.buckets <= self.capacity else self.capacity - 1
+        points = min(window, retained)
+        last = self.buckets - 1
+        if since is not None and points:
+            # Bucket starts only grow, so the buckets in time form a suffix
+            starts = self.starts[np.arange(last - points + 1, last + 1) % self.capacity]
+            ends = starts + (self.bucket_seconds or 0)
+            points -= int(np.searchsorted(ends, since, side='left' if self.bucket_seconds is None else 'right'))
+        if points == 0:
+            return None
+        first = last - points + 1
+        
+        end_x, end_xx, end_y, end_xy = self._prefix(last)
+        start_x, start_xx, start_y, start_xy = self._prefix(first - 1)
+        sum_x, sum_xx = end_x - start_x, end_xx - start_xx
+        sum_y, sum_xy = end_y - start_y, end_xy - start_xy
+        
+        denominator = points * sum_xx - sum_x * sum_x
+        trend = (points * sum_xy - sum_x * sum_y) / denominator if denominator > 0 else np.zeros_like(sum_y)
+        slots = np.arange(first, last + 1) % self.capacity
+        return {
+            'points': points,
+            'since': self.starts[first % self.capacity],
+            'mean': sum_y / points,
+            'min': self.mins[slots].min(axis=0),
+            'max': self.maxs[slots].max(axis=0),
+            'trend_per_hour': trend
+        }
+
+class MetricsTimeSeries:
+    """Per-refresh metrics of one touchpoint at raw, hourly and daily resolution.
+    
+    Storage is preallocated, so months of history cost a fixed amount of
+    memory. With a `path`, every sample is also appended to a binary file
+    (little-endian float64 records: timestamp, then fields in order) that is
+    replayed when the series is opened again.
+    """
+    
+    RESOLUTIONS = {
+        'raw': (None, 4096),
+        'hourly': (3600, 24 * 90),
+        'daily': (86400, 730)
+    }
+    
+    def __init__(self, fields: Tuple[str, ...], path: Optional[str] = None):
+        self.fields = tuple(fields)
+        self.path = path
+        self.rings = {}  # Created with the first sample, which is the trend origin
+        self._lock = threading.Lock()
+        
+        if path is not None and os.path.exists(path):
+            record_size = 1 + len(self.fields)
+            records = np.fromfile(path, dtype='<f8')
+            records = records[:len(records) - len(records) % record_size].reshape(-1, record_size)  # Drop a torn last record
+            for record in records:
+                self._add(record[0], record[1:])
+    
+    def _add(self, timestamp: float, values: np.ndarray):
+        if not self.rings:
+            self.rings = {
+                resolution: RollupRing(len(self.fields), capacity, bucket_seconds, timestamp)
+                for resolution, (bucket_seconds, capacity) in self.RESOLUTIONS.items()
+            }
+        for ring in self.rings.values():
+            ring.add(timestamp, values)
+    
+    def append(self, timestamp: float, metrics: Dict[str, float]):
+        """Record one sample (epoch seconds, field -> value)"""
+        values = np.array([metrics[field] for field in self.fields], dtype=np.float64)
+        with self._lock:
+            self._add(timestamp, values)
+            if self.path is not None:
+                with open(self.path, 'ab') as f:
+                    f.write(np.concatenate(([timestamp], values)).astype('<f8').tobytes())
+    
+    def __len__(self) -> int:
+        return len(self.rings['raw']) if self.rings else 0
+    
+    def latest(self, back: int = 0) -> Optional[dict]:
+        """The newest raw sample (or `back` samples before it) as a metrics dict"""
+        with self._lock:
+            if back >= len(self):
+                return None
+            timestamp, values = self.rings['raw'].bucket(back)
+        return {'timestamp': datetime.fromtimestamp(timestamp).isoformat(), **dict(zip(self.fields, values.tolist()))}
+    
+    def aggregate(self, resolution: str, window: int, since: Optional[float] = None) -> Optional[dict]:
+        """Rolling aggregates per field over the newest `window` buckets of a
+        resolution, limited to buckets still open at or after `since` (epoch seconds)"""
+        with self._lock:
+            if not self.rings:
+                return None
+            result = self.rings[resolution].aggregate(window, since)
+        if result is None:
+            return None
+        return {
+            'points': result['points'],
+            'since': datetime.fromtimestamp(result['since']).isoformat(),
+            'metrics': {
+                field: {
+                    statistic: float(result[statistic][i]) for statistic in ('mean', 'min', 'max', 'trend_per_hour')
+                }
+                for i, field in enumerate(self.fields)
+            }
+        }
+
 class PerformanceMonitor:
-    def __init__(self, api: MerchandisingAPI):
+    METRIC_FIELDS = (
+        'total_products', 'total_revenue', 'average_score', 'brand_tier_a_count',
+        'brand_tier_b_count', 'brand_tier_c_count', 'manual_overrides'
+    )
+    
+    def __init__(self, api: MerchandisingAPI, history_dir: Optional[str] = None):
         self.api = api
-        self.metrics_history = {}
-        
+        self.history_dir = history_dir  # Append-only metric files per touchpoint, if set
+        self.metrics_history = {}  # touchpoint -> MetricsTimeSeries
+        self._series_guard = threading.Lock()
+    
+    def _series(self, touchpoint: TouchpointType) -> MetricsTimeSeries:
+        with self._series_guard:
+            if touchpoint not in self.metrics_history:
+                path = None if self.history_dir is None else os.path.join(self.history_dir, f'{touchpoint.value}.metrics')
+                self.metrics_history[touchpoint] = MetricsTimeSeries(self.METRIC_FIELDS, path)
+            return self.metrics_history[touchpoint]
+    
     def record_performance_metrics(self, touchpoint: TouchpointType):
         """Record performance metrics for analysis"""
-        rankings = self.api.get_rankings(touchpoint)
         analytics = self.api.get_analytics_summary(touchpoint)
         
-        timestamp = datetime.now().isoformat()
-        
-        if touchpoint not in self.metrics_history:
-            self.metrics_history[touchpoint] = []
-        
+        now = datetime.now()
         metrics = {
-            'timestamp': timestamp,
+            'timestamp': now.isoformat(),
             'total_products': analytics['analytics']['total_products'],
             'total_revenue': analytics['analytics']['total_revenue_last_month'],
             'average_score': analytics['analytics']['average_merchandising_score'],
@@ -174,36 +710,37 @@ class PerformanceMonitor:
             'manual_overrides': analytics['analytics']['manual_overrides_count']
         }
         
-        self.metrics_history[touchpoint].append(metrics)
-        
-        # Keep only last 100 records
-        if len(self.metrics_history[touchpoint]) > 100:
-            self.metrics_history[touchpoint] = self.metrics_history[touchpoint][-100:]
-        
+        self._series(touchpoint).append(now.timestamp(), metrics)
         return metrics
     
     def get_performance_report(self, touchpoint: TouchpointType) -> dict:
         """Generate performance report"""
-        if touchpoint not in self.metrics_history or not self.metrics_history[touchpoint]:
+        history = self.metrics_history.get(touchpoint)
+        if history is None or not len(history):
             return {'error': 'No performance data available'}
         
-        history = self.metrics_history[touchpoint]
-        latest = history[-1]
+        latest = history.latest()
         
         # Calculate trends if we have at least 2 data points
         trends = {}
-        if len(history) >= 2:
-            previous = history[-2]
+        previous = history.latest(back=1)
+        if previous is not None:
             trends = {
                 'revenue_change': ((latest['total_revenue'] - previous['total_revenue']) / previous['total_revenue'] * 100) if previous['total_revenue'] > 0 else 0,
                 'score_change': latest['average_score'] - previous['average_score'],
                 'product_count_change': latest['total_products'] - previous['total_products']
             }
         
+        # Windows are bounded in time too, so gaps in the samples do not stretch them
+        now = time.time()
         return {
             'touchpoint': touchpoint.value,
             'current_metrics': latest,
             'trends': trends,
+            'rolling': {
+                'last_24_hours': history.aggregate('hourly', 24, since=now - 24 * 3600),
+                'last_30_days': history.aggregate('daily', 30, since=now - 30 * 86400)
+            },
             'data_points': len(history),
             'generated_at': datetime.now().isoformat()
         }
@@ -226,6 +763,15 @@ print(f"   Scheduled tasks: {len(scheduler.scheduled_tasks)}")
 for touchpoint, task_info in scheduler.scheduled_tasks.items():
     print(f"   - {touchpoint.value}: refresh every {task_info['interval_hours']} hours")
 
+scheduler.start()
+time.sleep(0.5)  # First runs are due immediately
+stop_started = time.perf_counter()
+scheduler.stop()
+print(f"   Runs completed: {sum(task_info['runs'] for task_info in scheduler.scheduled_tasks.values())}, "
+      f"stopped in {(time.perf_counter() - stop_started) * 1000:.1f} ms")
+for touchpoint, task_info in scheduler.scheduled_tasks.items():
+    print(f"   - {touchpoint.value}: {task_info['last_outcome']['status']} ({task_info['last_outcome']['reason']})")
+
 # Test exports
 print("\n2. Export Manager:")
 json_export = export_manager.export_rankings_json(TouchpointType.HOMEPAGE_CAROUSEL, limit=5)
@@ -234,6 +780,19 @@ print(f"   JSON export sample (first 200 chars): {json_export[:200]}...")
 csv_export = export_manager.export_rankings_csv(TouchpointType.HOMEPAGE_CAROUSEL)
 print(f"   CSV export lines: {len(csv_export.split(chr(10)))}")
 
+with tempfile.TemporaryDirectory(prefix='scored_catalog_') as export_dir:
+    scored_catalog = open_scored_catalog(export_manager.export_scored_catalog(os.path.join(export_dir, 'snapshot')))
+    print(f"   Scored catalog export: {len(scored_catalog)} columns, {int((scored_catalog['homepage_carousel_rank'] > 0).sum())} ranked on homepage")
+    
+    if pa is None:
+        print("   Parquet/Arrow exports skipped (pip install -r requirements-optional.txt)")
+    else:
+        for export_format, read_table in (('parquet', pq.read_table), ('arrow', feather.read_table)):
+            table = read_table(export_manager.export_scored_catalog(os.path.join(export_dir, f'scored_catalog.{export_format}'), format=export_format))
+            round_trip = all(np.array_equal(table[column].to_numpy(), scored_catalog[column]) for column in table.column_names)
+            print(f"   {export_format} export: {table.num_rows} rows, identical to the snapshot export: {round_trip}")
+    del scored_catalog  # Release the memory maps before the directory is removed
+
 # Test performance monitoring
 print("\n3. Performance Monitor:")
 metrics = performance_monitor.record_performance_metrics(TouchpointType.HOMEPAGE_CAROUSEL)
@@ -241,6 +800,18 @@ print(f"   Recorded metrics: Revenue=${metrics['total_revenue']:,.2f}, Avg Score
 
 report = performance_monitor.get_performance_report(TouchpointType.HOMEPAGE_CAROUSEL)
 print(f"   Performance report generated at: {report['generated_at']}")
+last_day = report['rolling']['last_24_hours']['metrics']['average_score']
+print(f"   Avg score over the last 24h: mean {last_day['mean']:.1f}, range {last_day['min']:.1f}-{last_day['max']:.1f}")
+
+# Sparse history: samples 45 days, 3 days and 2 hours ago, then now
+sparse_series = MetricsTimeSeries(('average_score',))
+sample_time = time.time()
+for age_hours, score in ((45 * 24, 50.0), (3 * 24, 60.0), (2, 70.0), (0, 80.0)):
+    sparse_series.append(sample_time - age_hours * 3600, {'average_score': score})
+sparse_day = sparse_series.aggregate('hourly', 24, since=sample_time - 24 * 3600)
+sparse_month = sparse_series.aggregate('daily', 30, since=sample_time - 30 * 86400)
+print(f"   Gapped history: lowest score in the 24h window {sparse_day['metrics']['average_score']['min']:.0f} (expected 70), "
+      f"in the 30-day window {sparse_month['metrics']['average_score']['min']:.0f} (expected 60)")
 
 print("\n4. System Status:")
 print(f"   API cache entries: {len(api.cache)}")
@@ -538,14 +538,52 @@ EXPOSE 8000
 HEALTHCHECK --interval=30s --timeout=30s --start-period=60s --retries=3 \\
     CMD curl -f http://localhost:8000/health || exit 1
 
+# Prometheus multiprocess mode: gunicorn workers share metrics through this directory
+ENV PROMETHEUS_MULTIPROC_DIR=/tmp/prometheus_multiproc
+
 # Run the application
-CMD ["gunicorn", "--bind", "0.0.0.0:8000", "--workers", "4", "app:app"]
+CMD ["gunicorn", "--config", "gunicorn.conf.py", "--bind", "0.0.0.0:8000", "--workers", "4", "app:app"]
+"""
+
+# Gunicorn hooks for Prometheus multiprocess metrics
+gunicorn_config = """import os
+import shutil
+
+from prometheus_client import multiprocess
+
+# The service is an ASGI app (app.py); run it on uvicorn workers
+worker_class = 'uvicorn.workers.UvicornWorker'
+
+def on_starting(server):
+    # Start every deployment with an empty metrics directory; without one, each worker reports its own metrics
+    multiproc_dir = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if not multiproc_dir:
+        return
+    shutil.rmtree(multiproc_dir, ignore_errors=True)
+    os.makedirs(multiproc_dir)
+
+def child_exit(server, worker):
+    # Drop live gauges of workers that exited
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        multiprocess.mark_process_dead(worker.pid)
+"""
+
+# Prometheus scrape configuration
+prometheus_config = """global:
+  scrape_interval: 15s
+
+scrape_configs:
+  - job_name: skinseoul-merchandising
+    metrics_path: /metrics
+    static_configs:
+      - targets: ['app:8000']
 """
 
 # Requirements file
 requirements_content = """fastapi==0.104.1
 uvicorn==0.24.0
 gunicorn==21.2.0
+httpx==0.25.2
 pandas==2.1.3
 numpy==1.24.3
 redis==5.0.1
@@ -562,6 +600,11 @@ prometheus-client==0.19.0
 structlog==23.2.0
 """
 
+optional_requirements_content = """# Optional extras: pip install -r requirements-optional.txt
+-r requirements.txt
+pyarrow==14.0.1  # Parquet and Arrow IPC scored catalog exports
+"""
+
 # Environment configuration
 env_config = """# SkinSeoul AI Merchandising System Configuration
 
@@ -686,17 +729,29 @@ with open('Dockerfile', 'w') as f:
 with open('requirements.txt', 'w') as f:
     f.write(requirements_content)
 
+with open('requirements-optional.txt', 'w') as f:
+    f.write(optional_requirements_content)
+
 with open('.env.example', 'w') as f:
     f.write(env_config)
 
 with open('docker-compose.yml', 'w') as f:
     f.write(docker_compose_content)
 
+with open('gunicorn.conf.py', 'w') as f:
+    f.write(gunicorn_config)
+
+with open('prometheus.yml', 'w') as f:
+    f.write(prometheus_config)
+
 print("\n✅ Deployment Configuration Files created:")
 print("   - Dockerfile (containerization)")
 print("   - requirements.txt (Python dependencies)")
+print("   - requirements-optional.txt (pyarrow for Parquet/Arrow exports)")
 print("   - .env.example (environment configuration)")
 print("   - docker-compose.yml (multi-service deployment)")
+print("   - gunicorn.conf.py (uvicorn workers, multiprocess metrics hooks)")
+print("   - prometheus.yml (scrape configuration)")
 print("   - merchandising_dashboard.html (management interface)")
 
 print(f"\n📁 Complete codebase files generated:")
@@ -705,8 +760,11 @@ files_created = [
     "merchandising_dashboard.html", 
     "Dockerfile",
     "requirements.txt",
+    "requirements-optional.txt",
     ".env.example",
-    "docker-compose.yml"
+    "docker-compose.yml",
+    "gunicorn.conf.py",
+    "prometheus.yml"
 ]
 
 for file in files_created:
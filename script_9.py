@@ -0,0 +1,164 @@
+# 12. Sharded Multi-Process Ranking
+import os
+import tempfile
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple
+
+# Catalog snapshot opened once per worker process
+_shard_catalog = None
+
+def _open_shard_catalog(snapshot_dir: str):
+    """Pool initializer: memory-map the catalog snapshot in the worker"""
+    global _shard_catalog
+    _shard_catalog = ProductCatalog.open_snapshot(snapshot_dir, mode='r')
+
+def _rank_shard(config: MerchandisingConfig, start: int, stop: int, excluded_rows: np.ndarray,
+                boost_rows: np.ndarray, boost_values: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Filtered top-k of catalog rows [start, stop) in one worker.
+    
+    Name-based state (blacklist, overrides, seasonal boosts) is resolved to
+    rows by the parent, so workers never need to decode product names.
+    """
+    engine = MerchandisingEngine(config)
+    
+    mask = engine.filter_mask(_shard_catalog, slice(start, stop))
+    mask[excluded_rows[(excluded_rows >= start) & (excluded_rows < stop)] - start] = False
+    candidate_rows = start + np.flatnonzero(mask)
+    
+    scores = engine.calculate_weighted_scores_batch(_shard_catalog.columns(candidate_rows, include_text=False))
+    if len(boost_rows):
+        multipliers = np.ones(len(candidate_rows))
+        positions = np.minimum(np.searchsorted(boost_rows, candidate_rows), len(boost_rows) - 1)
+        boosted = boost_rows[positions] == candidate_rows
+        multipliers[boosted] = boost_values[positions[boosted]]
+        scores = scores * multipliers
+    scores = np.minimum(scores, 100)  # Cap at 100
+    
+    top = top_k_indices(scores, k)
+    return candidate_rows[top], scores[top]
+
+class ShardedRanker:
+    """Sharded generate_rankings over a catalog snapshot using a process pool.
+    
+    Each worker memory-maps the snapshot, so column data is shared through
+    the OS page cache instead of pickling products. The catalog is split into
+    contiguous row ranges; every shard returns its filtered top-K and the
+    parent merges them (score descending, row ascending) into the global
+    top-K before applying manual overrides, giving the same result as
+    engine.generate_rankings on the same snapshot. Updates made in the
+    parent's copy-on-write catalog are not visible to workers.
+    """
+    
+    def __init__(self, snapshot_dir: str, shards: int = None):
+        self.snapshot_dir = snapshot_dir
+        self.shards = shards or os.cpu_count() or 1
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.shards,
+            mp_context=multiprocessing.get_context('fork'),
+            initializer=_open_shard_catalog,
+            initargs=(snapshot_dir,)
+        )
+    
+    def shard_bounds(self, total_rows: int) -> List[Tuple[int, int]]:
+        """Contiguous [start, stop) row ranges, one per shard"""
+        edges = np.linspace(0, total_rows, self.shards + 1).astype(np.int64)
+        return [(int(start), int(stop)) for start, stop in zip(edges[:-1], edges[1:]) if stop > start]
+    
+    def generate_rankings(self, engine: MerchandisingEngine, catalog: ProductCatalog) -> List[Tuple[Product, float]]:
+        """Rank `catalog` (opened from the same snapshot) for `engine`'s touchpoint"""
+        excluded = set()
+        for product_name in engine.blacklisted_products | set(engine.manual_overrides):
+            excluded.update(catalog.rows_for_name(product_name))
+        excluded_rows = np.array(sorted(excluded), dtype=np.int64)
+        
+        boosts = {}
+        if engine.config.seasonal_boost_enabled:
+            for product_name, boost in engine.seasonal_boosts.items():
+                for row in catalog.rows_for_name(product_name):
+                    boosts[row] = boost
+        boost_rows = np.array(sorted(boosts), dtype=np.int64)
+        boost_values = np.array([boosts[row] for row in boost_rows.tolist()], dtype=np.float64)
+        
+        k = engine.config.max_products
+        futures = [
+            self._pool.submit(_rank_shard, engine.config, start, stop, excluded_rows, boost_rows, boost_values, k)
+            for start, stop in self.shard_bounds(len(catalog))
+        ]
+        shard_results = [future.result() for future in futures]
+        
+        # Merge shard top-Ks: score descending, ties by row like a stable sort
+        rows = np.concatenate([shard_rows for shard_rows, _ in shard_results])
+        scores = np.concatenate([shard_scores for _, shard_scores in shard_results])
+        order = np.lexsort((rows, -scores))[:k]
+        ranked_products = [(catalog[int(row)], float(score)) for row, score in zip(rows[order], scores[order])]
+        
+        # Overridden products are scored in the parent; there are only a few
+        override_rows = np.array(sorted(
+            row for product_name in engine.manual_overrides for row in catalog.rows_for_name(product_name)
+        ), dtype=np.int64)
+        override_candidates = {}
+        if len(override_rows):
+            eligible = override_rows[engine.filter_mask(catalog, override_rows)]
+            override_scores = engine.calculate_composite_scores_batch(catalog.columns(eligible))
+            for row, score in zip(eligible.tolist(), override_scores.tolist()):
+                product_name = catalog.names[row]
+                if product_name not in override_candidates or score > override_candidates[product_name][1]:
+                    override_candidates[product_name] = (catalog[row], score)
+        
+        return engine._merge_overrides(ranked_products, override_candidates)
+    
+    def close(self, cancel_futures: bool = False):
+        """Shut down the worker processes, dropping queued shards if asked"""
+        self._pool.shutdown(cancel_futures=cancel_futures)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close(cancel_futures=exc_type is not None)
+
+def benchmark_sharded_ranking(engine: MerchandisingEngine, snapshot_dir: str,
+                              shard_counts: List[int], repeats: int = 3) -> List[dict]:
+    """Time single-process and sharded ranking of a snapshot for each shard count"""
+    catalog = ProductCatalog.open_snapshot(snapshot_dir)
+    reference = engine.generate_rankings(catalog)
+    
+    start = time.perf_counter()
+    for _ in range(repeats):
+        engine.generate_rankings(catalog)
+    baseline = (time.perf_counter() - start) / repeats
+    
+    results = [{'shards': 0, 'seconds': baseline, 'speedup': 1.0, 'identical': True}]
+    for shard_count in shard_counts:
+        with ShardedRanker(snapshot_dir, shards=shard_count) as ranker:
+            rankings = ranker.generate_rankings(engine, catalog)  # Warm up worker processes
+            start = time.perf_counter()
+            for _ in range(repeats):
+                ranker.generate_rankings(engine, catalog)
+            seconds = (time.perf_counter() - start) / repeats
+        
+        results.append({
+            'shards': shard_count,
+            'seconds': seconds,
+            'speedup': baseline / seconds,
+            'identical': [(p.row, s) for p, s in rankings] == [(p.row, s) for p, s in reference]
+        })
+    return results
+
+# Benchmark on an enlarged copy of the catalog; the snapshot is removed afterwards,
+# and each ShardedRanker shuts its pool down even if the benchmark fails
+benchmark_engine = MerchandisingEngine(TOUCHPOINT_CONFIGS[TouchpointType.COLLECTION_PAGE])
+shard_counts = sorted({1, 2, 4, os.cpu_count() or 1})
+with tempfile.TemporaryDirectory(prefix='catalog_benchmark_') as benchmark_dir:
+    with CatalogSnapshotWriter(benchmark_dir) as writer:
+        for _ in range(max(1, 1_000_000 // len(products))):
+            writer.append(products)
+    results = benchmark_sharded_ranking(benchmark_engine, benchmark_dir, shard_counts)
+
+print(f"Sharded Ranking Benchmark ({writer.rows:,} products):")
+print("-" * 60)
+for result in results:
+    label = 'single process' if result['shards'] == 0 else f"{result['shards']} shards"
+    print(f"   {label:<16} {result['seconds'] * 1000:8.1f} ms  speedup {result['speedup']:4.2f}x  identical: {result['identical']}")